@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE_CLASSES = [
+    'pugorugh.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -53,10 +54,14 @@ MIDDLEWARE_CLASSES = [
     'django.contrib.auth.middleware.SessionAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'pugorugh.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
 
+# keeps the files the tests write out of the deployment's directories
+TEST_RUNNER = 'pugorugh.tests.runner.TestRunner'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -111,12 +116,96 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'pugorugh.authentication.CachedTokenAuthentication',
         # 'rest_framework.authentication.BasicAuthentication',
         # 'rest_framework.authentication.SessionAuthentication',
-    )
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'pugorugh.fragments.FragmentJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
 }
 
+# Default and largest number of dogs per page of GET /api/dog/, clients
+# pick a size in between with ?page_size=
+DOG_PAGE_SIZE = 100
+DOG_MAX_PAGE_SIZE = 500
+
+# Default and largest number of dogs per batch of
+# GET /api/dog/<feeling>/queue/, clients pick a size with ?count=
+DOG_QUEUE_SIZE = 10
+DOG_MAX_QUEUE_SIZE = 50
+
+# Largest number of decisions accepted by POST /api/dog/decisions/
+DOG_MAX_DECISIONS = 500
+
+# Number of authenticated token/user/preference principals kept in each
+# process, and the seconds a process may keep serving one changed by
+# another process
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL = 60
+
+# Cache through which a process saving preferences tells the others to
+# reload the principals holding older ones
+PREFS_VERSION_CACHE = 'default'
+
+# Whether responses carry the SQL, view and total time of the request in
+# a Server-Timing header
+SERVER_TIMING_HEADER = True
+
+# Directory of the metrics files the worker processes count into, served
+# at /api/metrics/; when METRICS_TOKEN is set, scrapes must send it in an
+# "Authorization: Bearer <token>" header, otherwise only staff signed in
+# to the admin may read them
+METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Requests with an X-Profile header from "manage.py profile_token", valid
+# for PROFILE_TOKEN_MAX_AGE seconds, and a PROFILE_SAMPLE_RATE share of
+# all requests are profiled; the latest PROFILE_KEEP profiles are kept in
+# PROFILE_DIR for "manage.py profile_report"
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_KEEP = 500
+PROFILE_TOKEN_MAX_AGE = 3600
+
+# Caches shared by the worker processes; use memcached or redis in
+# production so that all processes see the same entries
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # one entry per dog, so a page of DOG_MAX_PAGE_SIZE dogs doesn't cull
+    # the entries of the previous page
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+# Cache of the per-user sets of decided dogs that the undecided feed
+# skips, and the seconds a set is kept
+SEEN_DOGS_CACHE = 'default'
+SEEN_DOGS_TTL = 24 * 60 * 60
+
+# Cache of the encoded JSON of each dog version that dog responses are
+# joined from, and the seconds an encoding is kept
+DOG_FRAGMENT_CACHE = 'fragments'
+DOG_FRAGMENT_TTL = 24 * 60 * 60
+
+# Seconds before a process rebuilds its index of the dogs per preference
+# segment, picking up the dogs added or changed by other processes
+SEGMENT_INDEX_TTL = 60
+
+# Statements slower than SLOW_QUERY_THRESHOLD_MS, None for none, are
+# logged with their query plan; each process keeps the last
+# SLOW_QUERY_LOG_SIZE fingerprints in a file in SLOW_QUERY_DIR, listed by
+# "manage.py slow_queries" and at /api/slow-queries/ for staff
+SLOW_QUERY_THRESHOLD_MS = 100
+SLOW_QUERY_LOG_SIZE = 100
+SLOW_QUERY_DIR = os.path.join(BASE_DIR, 'slow-queries')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.9/topics/i18n/
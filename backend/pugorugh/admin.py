@@ -1,9 +1,69 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
 
-from .models import Dog, UserDog, UserPref
-# Register your models here.
+from .db import estimated_count
+from .models import Dog, UserDog, UserPref, mask_to_letters
 
 
-admin.site.register(Dog)
-admin.site.register(UserDog)
-admin.site.register(UserPref)
+class EstimatedCountPaginator(Paginator):
+    """Paginator of changelists that takes the row count of an unfiltered
+    table from the database's statistics once they put it over
+    ESTIMATE_OVER rows, instead of counting every row
+    """
+    ESTIMATE_OVER = 100000
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and not query.distinct:
+            estimate = estimated_count(self.object_list.model)
+            if estimate is not None and estimate > self.ESTIMATE_OVER:
+                return estimate
+        return super(EstimatedCountPaginator, self).count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist of a large table: counts estimated, no second count of
+    the unfiltered table and related rows picked with raw ids
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-id',)
+
+
+@admin.register(Dog)
+class DogAdmin(LargeTableAdmin):
+    # the counters are stored on the dog, so listing them takes no
+    # aggregate; gender and size filter on the (gender, size, birthday,
+    # id) index
+    list_display = ('name', 'breed', 'age', 'gender', 'size', 'birthday',
+                    'likes_count', 'dislikes_count')
+    list_filter = ('gender', 'size')
+    search_fields = ('^name',)
+    readonly_fields = ('likes_count', 'dislikes_count', 'version')
+
+
+@admin.register(UserDog)
+class UserDogAdmin(LargeTableAdmin):
+    # UserDog.__str__ reads the user and the dog
+    list_display = ('id', 'user', 'status', 'dog')
+    list_select_related = ('user', 'dog')
+    list_filter = ('status',)
+    raw_id_fields = ('user', 'dog')
+
+
+@admin.register(UserPref)
+class UserPrefAdmin(LargeTableAdmin):
+    list_display = ('user', 'ages', 'genders', 'sizes')
+    list_select_related = ('user',)
+    raw_id_fields = ('user',)
+
+    def ages(self, prefs):
+        return ','.join(mask_to_letters(prefs.age_mask, UserPref.AGES))
+
+    def genders(self, prefs):
+        return ','.join(mask_to_letters(prefs.gender_mask, UserPref.GENDERS))
+
+    def sizes(self, prefs):
+        return ','.join(mask_to_letters(prefs.size_mask, UserPref.SIZES))
@@ -3,3 +3,11 @@ from django.apps import AppConfig
 
 class PugorughConfig(AppConfig):
     name = 'pugorugh'
+
+    def ready(self):
+        # connect the signal receivers that keep caches up to date
+        from . import authentication, fragments, seen, segments  # noqa
+        # wrap the cursors of new database connections
+        from . import instrumentation  # noqa
+        # log the slow statements
+        from . import slowqueries  # noqa
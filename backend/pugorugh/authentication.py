@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .metrics import metrics
+from .models import UserPref
+
+
+class PrincipalCache(object):
+    """Thread-safe LRU cache of (user, token) principals keyed by token key.
+    Holds at most maxsize principals, each for at most ttl seconds.
+
+    Entries are dropped by the signal receivers below when a token,
+    user or preference changes in this process; the ttl bounds how long
+    other processes keep serving a principal changed elsewhere, except
+    for preferences, whose versions are shared through the
+    PREFS_VERSION_CACHE cache.
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._user_keys = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached principal of key, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, principal):
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = (time.monotonic() + self.ttl, principal)
+            self._user_keys.setdefault(principal[0].pk, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._pop(next(iter(self._entries)))
+
+    def discard(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def discard_user(self, user_id):
+        """Drop every principal of the user"""
+        with self._lock:
+            for key in list(self._user_keys.get(user_id, ())):
+                self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_keys.clear()
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            user_id = entry[1][0].pk
+            keys = self._user_keys[user_id]
+            keys.discard(key)
+            if not keys:
+                del self._user_keys[user_id]
+
+
+principal_cache = PrincipalCache(
+    maxsize=getattr(settings, 'PRINCIPAL_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'PRINCIPAL_CACHE_TTL', 60),
+)
+
+
+def _prefs_versions():
+    return caches[getattr(settings, 'PREFS_VERSION_CACHE', 'default')]
+
+
+def _prefs_version_key(user_id):
+    return 'pugorugh:prefs-version:{}'.format(user_id)
+
+
+def _prefs_current(user):
+    """Return False when another process has saved a newer version of
+    the preferences of a cached user"""
+    prefs = getattr(user, 'prefs', None)
+    if prefs is None:
+        return True
+    version = _prefs_versions().get(_prefs_version_key(user.pk))
+    return version is None or version <= prefs.version
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Token authentication that loads the token, its user and the user's
+    preferences in one joined query and keeps the result in
+    principal_cache, so most requests authenticate without a query. A
+    cached principal whose preferences were saved since, in any process,
+    is loaded again.
+    """
+    def authenticate_credentials(self, key):
+        principal = principal_cache.get(key)
+        if principal is not None and not _prefs_current(principal[0]):
+            principal_cache.discard(key)
+            principal = None
+        metrics.count_cache('principal', principal is not None)
+        if principal is not None:
+            return principal
+
+        model = self.get_model()
+        try:
+            token = model.objects.select_related(
+                'user', 'user__prefs').get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+
+        principal = (token.user, token)
+        principal_cache.set(key, principal)
+        return principal
+
+
+@receiver(post_delete, sender=Token)
+def discard_deleted_token(sender, instance, **kwargs):
+    """Listens for the deletion of a token and stops accepting it"""
+    principal_cache.discard(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def discard_changed_user(sender, instance, **kwargs):
+    """Listens for changes to a user, e.g. deactivation, and drops the
+    principals holding the old instance
+    """
+    principal_cache.discard_user(instance.pk)
+    if kwargs.get('created', True):
+        # the preferences versions of a deleted user don't carry over to
+        # a new user given the same id
+        _prefs_versions().delete(_prefs_version_key(instance.pk))
+
+
+@receiver(post_save, sender=UserPref)
+def discard_changed_prefs(sender, instance, **kwargs):
+    """Listens for saved preferences, drops the principals holding the
+    old preferences and shares the new version with the other processes,
+    for as long as their principals may hold an older one
+    """
+    principal_cache.discard_user(instance.user_id)
+    _prefs_versions().set(_prefs_version_key(instance.user_id),
+                          instance.version, principal_cache.ttl)
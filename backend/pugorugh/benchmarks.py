@@ -0,0 +1,236 @@
+"""In-process benchmarks of the API endpoints.
+
+Every case issues one request through the test client, or calls a
+function in process, and is timed together with the SQL it runs. The
+results of a run can be checked against per-case budgets and compared
+with the results of an earlier run, so a change that adds queries or
+slows an endpoint fails the run.
+"""
+import json
+import math
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.db.models import Max, Min
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .authentication import principal_cache
+from .instrumentation import collecting
+from .models import Dog
+from .serializers import DogSerializer, dog_rows
+from .synthetic import PASSWORD
+
+# dataset sizes of the named scales
+SCALES = {
+    'tiny': {'dogs': 200, 'users': 20, 'decisions': 20},
+    'small': {'dogs': 10000, 'users': 1000, 'decisions': 50},
+    'medium': {'dogs': 100000, 'users': 10000, 'decisions': 50},
+    'large': {'dogs': 1000000, 'users': 100000, 'decisions': 50},
+}
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Return the nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+
+class Context(object):
+    """What the cases need to know about the seeded database: the
+    benchmarking user, a dog in the middle of the catalog, a sample of
+    dog ids to swipe and a counter that keeps created names unique
+    """
+    def __init__(self, random_seed=0):
+        self.random = random.Random(random_seed)
+        self.user = User.objects.filter(
+            userdog__status='l').order_by('pk').first()
+        if self.user is None:
+            raise ValueError("The database holds no users with decisions.")
+        self.token = Token.objects.get_or_create(user=self.user)[0]
+        self.middle_id = Dog.objects.order_by('pk').values_list(
+            'pk', flat=True)[Dog.objects.count() // 2]
+        bounds = Dog.objects.aggregate(Min('pk'), Max('pk'))
+        self.dog_ids = list(Dog.objects.filter(pk__in=self.random.sample(
+            range(bounds['pk__min'], bounds['pk__max'] + 1),
+            min(500, bounds['pk__max'] - bounds['pk__min'] + 1)
+        )).values_list('pk', flat=True))
+        self.run_id = int(time.time()) % 100000
+        self.counter = 0
+
+    def unique(self, prefix):
+        """Return a name no other run of the cases has used"""
+        self.counter += 1
+        return '{}-{}-{}'.format(prefix, self.run_id, self.counter)
+
+    def created_dog_id(self):
+        return Dog.objects.create(
+            name=self.unique('bench'),
+            image_filename=self.unique('bench') + '.jpg',
+            age=12, gender='f', size='s',
+        ).pk
+
+
+# dogs serialized by the serializer cases, a default page of the listing
+SERIALIZED_DOGS = 100
+
+
+def serialize_rows(context):
+    dogs = Dog.objects.order_by('pk')[:SERIALIZED_DOGS]
+    return [dog_rows.to_representation(row) for row in dog_rows.rows(dogs)]
+
+
+def serialize_instances(context):
+    dogs = Dog.objects.order_by('pk')[:SERIALIZED_DOGS]
+    return DogSerializer(dogs, many=True).data
+
+
+# name -> (method, path, data), path and data being either values or
+# functions of the Context; a method of None times the function path
+# instead of a request
+CASES = [
+    ('index', 'get', '/', None),
+    ('login', 'post', '/api/user/login/',
+     lambda context: {'username': context.user.username,
+                      'password': PASSWORD}),
+    ('register', 'post', '/api/user/',
+     lambda context: {'username': context.unique('bench'),
+                      'password': PASSWORD}),
+    ('dog-list', 'get', '/api/dog/', None),
+    ('dog-list-page-size', 'get', '/api/dog/?page_size=500', None),
+    ('dog-list-filtered', 'get',
+     '/api/dog/?gender=f&size=s,m&min_age=9&max_age=84', None),
+    ('dog-list-breed-fields', 'get',
+     '/api/dog/?breed=Beagle&fields=id,name,likes', None),
+    ('dog-create', 'post', '/api/dog/',
+     lambda context: {'name': context.unique('bench'),
+                      'image_filename': context.unique('bench') + '.jpg',
+                      'age': 12, 'gender': 'f', 'size': 's'}),
+    ('dog-delete', 'delete',
+     lambda context: '/api/dog/{}/'.format(context.created_dog_id()), None),
+    ('next-liked', 'get', '/api/dog/-1/liked/next/', None),
+    ('next-disliked', 'get', '/api/dog/-1/disliked/next/', None),
+    ('next-undecided', 'get',
+     lambda context: '/api/dog/{}/undecided/next/'.format(
+         context.middle_id), None),
+    ('queue-undecided', 'get', '/api/dog/undecided/queue/?count=10', None),
+    ('swipe-liked', 'put',
+     lambda context: '/api/dog/{}/liked/'.format(
+         context.random.choice(context.dog_ids)), None),
+    ('swipe-disliked', 'put',
+     lambda context: '/api/dog/{}/disliked/'.format(
+         context.random.choice(context.dog_ids)), None),
+    ('swipe-undecided', 'put',
+     lambda context: '/api/dog/{}/undecided/'.format(
+         context.random.choice(context.dog_ids)), None),
+    ('decisions', 'post', '/api/dog/decisions/',
+     lambda context: [
+         {'dog': dog_id, 'status': context.random.choice(
+             ('liked', 'disliked', 'undecided'))}
+         for dog_id in context.random.sample(
+             context.dog_ids, min(50, len(context.dog_ids)))
+     ]),
+    ('preferences', 'get', '/api/user/preferences/', None),
+    ('preferences-update', 'put', '/api/user/preferences/',
+     lambda context: {
+         'age': context.random.choice(('b,y', 'a,s', 'b,y,a,s')),
+         'gender': 'm,f', 'size': 's,m,l,xl'}),
+    # the rows the listings and feeds read against model instances
+    ('serialize-dog-rows', None, serialize_rows, None),
+    ('serialize-dog-serializer', None, serialize_instances, None),
+]
+
+
+def run_case(client, context, case, repeat):
+    """Issue the request of a case, or call its function, repeat times
+    and return the latency percentiles, the queries per request and the
+    SQL time
+    """
+    name, method, path, data = case
+    latencies, queries, sql_times, statuses = [], [], [], set()
+    for _ in range(repeat):
+        if method is None:
+            with collecting() as stats:
+                started = time.perf_counter()
+                path(context)
+                latencies.append((time.perf_counter() - started) * 1000)
+        else:
+            url = path(context) if callable(path) else path
+            body = data(context) if callable(data) else data
+            with collecting() as stats:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, body, format='json')
+                latencies.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+        queries.append(stats.queries)
+        sql_times.append(stats.sql_time * 1000)
+    result = {
+        'runs': repeat,
+        'statuses': sorted(statuses),
+        'queries': max(queries),
+        'sql_ms': round(sum(sql_times) / repeat, 3),
+    }
+    for percent in PERCENTILES:
+        result['p{}_ms'.format(percent)] = round(
+            percentile(latencies, percent), 3)
+    return result
+
+
+def run(cases=None, repeat=50, warmup=5):
+    """Run the cases against the current database and return a dict of
+    case name to results
+    """
+    context = Context()
+    principal_cache.clear()
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Token ' + context.token.key)
+    results = {}
+    for case in cases or CASES:
+        if warmup:
+            run_case(client, context, case, warmup)
+        results[case[0]] = run_case(client, context, case, repeat)
+    return results
+
+
+def check_budgets(results, budgets):
+    """Return a list of messages, one per result over its budget. Budgets
+    map case names to the limits of any result keys, e.g.
+    {"next-undecided": {"queries": 1, "p95_ms": 20}}.
+    """
+    failures = []
+    for name, limits in sorted(budgets.items()):
+        if name not in results:
+            continue
+        for key, limit in sorted(limits.items()):
+            value = results[name][key]
+            if value > limit:
+                failures.append("{}: {} is {}, over its budget of {}".format(
+                    name, key, value, limit))
+    return failures
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Return a list of messages, one per case that runs more queries
+    than in baseline or whose p95 latency grew by more than tolerance
+    """
+    failures = []
+    for name, result in sorted(results.items()):
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['queries'] > before['queries']:
+            failures.append("{}: {} queries, {} in the baseline".format(
+                name, result['queries'], before['queries']))
+        if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            failures.append("{}: p95 of {}ms, {}ms in the baseline".format(
+                name, result['p95_ms'], before['p95_ms']))
+    return failures
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
@@ -0,0 +1,231 @@
+"""Streaming, batched import of dog catalog feeds.
+
+A feed is a JSON array of dogs or newline delimited JSON, one dog per
+line. It is read incrementally and applied a batch at a time: each batch
+is validated, compared with the dogs already stored under the same key
+and only the new and changed dogs are written, in one upsert per batch
+where the database supports it. Running the same feed twice writes
+nothing the second time.
+"""
+from collections import Counter
+import datetime as dt
+import json
+
+from django.db import transaction
+
+from rest_framework import serializers
+
+from .db import supports_upsert, upsert
+from .models import Dog, estimate_birthday
+from .segments import segment_index
+from .serializers import DogImportSerializer
+
+# fields that identify a dog across imports
+KEYS = ('name', 'image_filename')
+
+# fields that an import stores
+SYNCED_FIELDS = ('name', 'image_filename', 'breed', 'age', 'gender',
+                 'size', 'birthday')
+
+READ_SIZE = 64 * 1024
+
+# characters skipped between the dogs of a feed
+SEPARATORS = frozenset(' \t\r\n,[]')
+
+
+def iter_records(file):
+    """Yield the objects of a JSON array, or of newline delimited JSON,
+    read from a text file READ_SIZE characters at a time. Raises
+    ValueError on malformed JSON.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position, eof = '', 0, False
+    while True:
+        while position < len(buffer) and buffer[position] in SEPARATORS:
+            position += 1
+        if position < len(buffer):
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                # the object may continue past the end of the buffer
+                if eof:
+                    raise
+            else:
+                yield record
+                continue
+        elif eof:
+            return
+        chunk = file.read(READ_SIZE)
+        eof = not chunk
+        buffer, position = buffer[position:] + chunk, 0
+
+
+class CatalogImport(object):
+    """Applies a feed to the Dog table, matching dogs on key.
+
+    stats counts the records that were read, created, updated, unchanged
+    and invalid; errors keeps (record number, errors) of the first
+    MAX_ERRORS invalid records; images holds the image_filename of every
+    created dog and of every dog whose photo changed.
+    """
+    MAX_ERRORS = 100
+
+    def __init__(self, key='name', batch_size=1000, today=None):
+        if key not in KEYS:
+            raise ValueError("key must be one of {}".format(", ".join(KEYS)))
+        self.key = key
+        self.other_key = KEYS[1 - KEYS.index(key)]
+        self.batch_size = batch_size
+        self.today = today or dt.date.today()
+        self.stats = Counter()
+        self.errors = []
+        self.images = set()
+        self.seen = set()
+        self.validator = DogImportSerializer()
+
+    def run(self, records, progress=None):
+        """Import an iterable of records, calling progress(stats) after
+        each batch. Returns stats.
+        """
+        batch = []
+        for record in records:
+            self.stats['read'] += 1
+            batch.append((self.stats['read'], record))
+            if len(batch) == self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if progress is not None:
+                    progress(self.stats)
+        if batch:
+            self.import_batch(batch)
+            if progress is not None:
+                progress(self.stats)
+        return self.stats
+
+    def import_batch(self, batch):
+        """Validate and write a list of (record number, record)"""
+        rows = self.validate(batch)
+        if not rows:
+            return
+        stored = {
+            values[self.key]: values for values in Dog.objects.filter(**{
+                self.key + '__in': list(rows)
+            }).values('pk', 'version', *SYNCED_FIELDS)
+        }
+        self.reject_taken(rows)
+
+        created, changed = [], []
+        for key, (number, data) in rows.items():
+            old = stored.get(key)
+            if not data.get('birthday'):
+                # keep the estimate of an earlier import unless the age
+                # changed, so re-syncing does not move every birthday
+                if old is not None and old['age'] == data['age']:
+                    data['birthday'] = old['birthday']
+                else:
+                    data['birthday'] = estimate_birthday(
+                        data['age'], self.today)
+            if old is None:
+                created.append(data)
+                self.images.add(data['image_filename'])
+            elif any(old[field] != data[field] for field in SYNCED_FIELDS):
+                data['pk'] = old['pk']
+                data['version'] = old['version'] + 1
+                changed.append(data)
+                if old['image_filename'] != data['image_filename']:
+                    self.images.add(data['image_filename'])
+            else:
+                self.stats['unchanged'] += 1
+
+        if created or changed:
+            with transaction.atomic():
+                self.write(created, changed)
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed)
+
+    def validate(self, batch):
+        """Return a dict of key to (record number, validated data) of the
+        valid records, the last one winning when a key repeats
+        """
+        rows = {}
+        for number, record in batch:
+            if isinstance(record, dict) and \
+                    isinstance(record.get(self.key), str):
+                # never prune a known dog over an invalid record
+                self.seen.add(record[self.key])
+            try:
+                data = self.validator.run_validation(record)
+            except serializers.ValidationError as error:
+                self.reject(number, error.detail)
+                continue
+            for field in DogImportSerializer.Meta.fields:
+                data.setdefault(
+                    field, Dog._meta.get_field(field).get_default())
+            rows.pop(data[self.key], None)
+            rows[data[self.key]] = (number, data)
+        return rows
+
+    def reject_taken(self, rows):
+        """Reject the rows whose other unique field repeats an earlier
+        row's or belongs to another stored dog
+        """
+        keys = {}
+        for key, (number, data) in list(rows.items()):
+            value = data[self.other_key]
+            if value in keys:
+                del rows[key]
+                self.reject(number, {self.other_key: [
+                    'Repeats the {} of record {}.'.format(
+                        self.other_key, rows[keys[value]][0])]})
+            else:
+                keys[value] = key
+        taken = Dog.objects.filter(**{
+            self.other_key + '__in': list(keys)
+        }).values_list(self.other_key, self.key)
+        for value, owner in taken:
+            if keys[value] != owner:
+                number, _ = rows.pop(keys[value])
+                self.reject(number, {self.other_key: [
+                    'Belongs to the dog with {} "{}".'.format(
+                        self.key, owner)]})
+
+    def reject(self, number, errors):
+        self.stats['invalid'] += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((number, errors))
+
+    def write(self, created, changed):
+        """Insert the created dogs and update the changed ones"""
+        if supports_upsert():
+            fields = SYNCED_FIELDS + ('version', 'likes_count',
+                                      'dislikes_count', 'joined')
+            rows = [
+                [data[field] for field in SYNCED_FIELDS] +
+                [data.get('version', 1), 0, 0, self.today]
+                for data in created + changed
+            ]
+            upsert(Dog, fields, rows, conflict_fields=[self.key],
+                   update_fields=SYNCED_FIELDS + ('version',))
+        else:
+            Dog.objects.bulk_create([
+                Dog(**dict(data, joined=self.today)) for data in created
+            ], batch_size=self.batch_size)
+            for data in changed:
+                Dog.objects.filter(pk=data.pop('pk')).update(**data)
+        # neither write sends the signals that keep the index up to date
+        segment_index.clear()
+
+    def prune(self):
+        """Delete the dogs that no record of the feed named, and return
+        how many were deleted
+        """
+        missing = [
+            pk for pk, key in Dog.objects.values_list(
+                'pk', self.key).iterator()
+            if key not in self.seen
+        ]
+        for start in range(0, len(missing), self.batch_size):
+            Dog.objects.filter(
+                pk__in=missing[start:start + self.batch_size]).delete()
+        self.stats['deleted'] += len(missing)
+        return len(missing)
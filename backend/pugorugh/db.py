@@ -0,0 +1,109 @@
+import itertools
+import sqlite3
+
+from django.db import DatabaseError, connection
+
+# the first versions whose INSERT understands ON CONFLICT
+SQLITE_UPSERT_VERSION = (3, 24, 0)
+POSTGRESQL_UPSERT_VERSION = 90500
+
+# the largest id a signed 64-bit column holds; larger integers overflow
+# the database drivers instead of matching no row
+MAX_ID = 2 ** 63 - 1
+
+# rows per statement, keeps the bound parameters of a statement below
+# SQLite's default limit of 999
+MAX_PARAMS = 900
+
+
+def supports_upsert():
+    """Return True when the database can run upsert()"""
+    if connection.vendor == 'sqlite':
+        return sqlite3.sqlite_version_info >= SQLITE_UPSERT_VERSION
+    if connection.vendor == 'postgresql':
+        return connection.pg_version >= POSTGRESQL_UPSERT_VERSION
+    return False
+
+
+def estimated_count(model):
+    """Return the number of rows of model's table as last estimated by
+    the database's statistics, without counting them, or None when the
+    database has no estimate (on SQLite, until ANALYZE has run)
+    """
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+        params = [connection.ops.quote_name(table)]
+    elif connection.vendor == 'mysql':
+        sql = ("SELECT table_rows FROM information_schema.tables "
+               "WHERE table_schema = DATABASE() AND table_name = %s")
+        params = [table]
+    elif connection.vendor == 'sqlite':
+        # the first number of the stat of any index is the table's rows
+        sql = "SELECT CAST(stat AS INTEGER) FROM sqlite_stat1 WHERE tbl = %s"
+        params = [table]
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+    except DatabaseError:
+        # no statistics gathered yet
+        return None
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+def insert(model, fields, rows):
+    """Insert rows (tuples of values for fields) into model's table, many
+    rows per statement, and return the number of rows written. No
+    signals are sent and no defaults are applied.
+    """
+    return _insert(model, fields, rows, "")
+
+
+def upsert(model, fields, rows, conflict_fields, update_fields):
+    """Insert rows (tuples of values for fields) into model's table; rows
+    that collide with an existing one on conflict_fields update its
+    update_fields instead. Issues one statement per chunk of rows and
+    returns the number of rows written.
+    """
+    qn = connection.ops.quote_name
+    conflict_columns = [model._meta.get_field(name).column
+                        for name in conflict_fields]
+    update_columns = [model._meta.get_field(name).column
+                      for name in update_fields]
+    if update_columns:
+        action = "DO UPDATE SET {}".format(", ".join(
+            "{0} = excluded.{0}".format(qn(column))
+            for column in update_columns))
+    else:
+        action = "DO NOTHING"
+    return _insert(model, fields, rows, " ON CONFLICT ({}) {}".format(
+        ", ".join(qn(column) for column in conflict_columns), action))
+
+
+def _insert(model, fields, rows, suffix):
+    qn = connection.ops.quote_name
+    columns = [model._meta.get_field(name).column for name in fields]
+    placeholder = "({})".format(", ".join(["%s"] * len(columns)))
+    sql = "INSERT INTO {table} ({columns}) VALUES {{values}}{suffix}".format(
+        table=qn(model._meta.db_table),
+        columns=", ".join(qn(column) for column in columns),
+        suffix=suffix)
+
+    rows = iter(rows)
+    chunk_size = max(1, MAX_PARAMS // len(columns))
+    written = 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return written
+            cursor.execute(
+                sql.format(values=", ".join([placeholder] * len(chunk))),
+                [value for row in chunk for value in row]
+            )
+            written += cursor.rowcount
@@ -0,0 +1,38 @@
+from rest_framework.filters import BaseFilterBackend
+
+from .models import Dog, mask_to_letters
+from .serializers import DogFilterSerializer
+
+
+class DogFilterBackend(BaseFilterBackend):
+    """Filters dog listings by the query parameters of
+    DogFilterSerializer, e.g. ?breed=Pug&size=s,m&min_age=9&max_age=18.
+    Every filter is served by an index leading with its column, which
+    ends with id where the filter is an equality so that keyset pages
+    are read in id order
+    """
+    def filter_queryset(self, request, queryset, view):
+        params = DogFilterSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        filters = {}
+        if 'breed' in data:
+            filters['breed'] = data['breed']
+        for name, choices in (('gender', Dog.GENDER), ('size', Dog.SIZE)):
+            if name not in data:
+                continue
+            values = [value for value, _ in choices]
+            letters = mask_to_letters(data[name], values)
+            # letters admitting every value the column holds add nothing
+            if len(letters) == 1:
+                filters[name] = letters[0]
+            elif len(letters) < len(values):
+                filters[name + '__in'] = letters
+        if 'min_joined' in data:
+            filters['joined__gte'] = data['min_joined']
+        if 'max_joined' in data:
+            filters['joined__lte'] = data['max_joined']
+        if 'min_age' in data or 'max_age' in data:
+            queryset = queryset.aged(data.get('min_age'),
+                                     data.get('max_age'))
+        return queryset.filter(**filters)
@@ -0,0 +1,170 @@
+"""Pre-encoded JSON representations of dogs.
+
+The representation of DogSerializer is built once per dog version, by
+the dog_rows fast path; it is encoded to JSON and split around the likes
+count into two byte strings kept in the DOG_FRAGMENT_CACHE cache under
+the dog's id and version. Rendering a dog
+joins them around its current count, and FragmentJSONRenderer copies
+the resulting Fragments into responses as they are, so lists of dogs
+are concatenated rather than serialized field by field.
+
+Every save bumps the version, so a changed dog is never served from an
+old fragment; the receivers below only free the fragments of saved and
+deleted dogs.
+"""
+from collections.abc import Mapping
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+from . import images
+from .metrics import metrics
+from .models import Dog
+from .serializers import dog_rows
+
+# stands for the likes count while the rest of a dog is encoded
+LIKES_PLACEHOLDER = '\x00likes\x00'
+
+
+class Fragment(Mapping):
+    """JSON bytes of one representation, which read like the decoded
+    dict, e.g. as response.data in tests
+    """
+    __slots__ = ('encoded', '_decoded')
+
+    def __init__(self, encoded):
+        self.encoded = encoded
+        self._decoded = None
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            self._decoded = json.loads(self.encoded.decode('utf-8'))
+        return self._decoded
+
+    def __getitem__(self, key):
+        return self.decoded[key]
+
+    def __iter__(self):
+        return iter(self.decoded)
+
+    def __len__(self):
+        return len(self.decoded)
+
+    def __repr__(self):
+        return 'Fragment({!r})'.format(self.encoded)
+
+
+def encode(data):
+    """Encode data the way JSONRenderer does without indentation"""
+    return json.dumps(
+        data, cls=JSONRenderer.encoder_class,
+        ensure_ascii=JSONRenderer.ensure_ascii,
+        separators=SHORT_SEPARATORS if JSONRenderer.compact
+        else LONG_SEPARATORS
+    ).replace('\u2028', '\\u2028').replace(
+        '\u2029', '\\u2029').encode('utf-8')
+
+
+def _cache():
+    return caches[getattr(settings, 'DOG_FRAGMENT_CACHE', 'default')]
+
+
+def _key(pk, version):
+    return 'pugorugh:dog-json:{}:{}'.format(pk, version)
+
+
+def _split(dog):
+    """Return the encoded representation of dog, a Dog or a row of
+    dog_rows, before and after its likes count"""
+    data = dog_rows.to_representation(dog)
+    data['likes'] = LIKES_PLACEHOLDER
+    prefix, suffix = encode(data).split(encode(LIKES_PLACEHOLDER))
+    return prefix, suffix
+
+
+def render_dogs(dogs):
+    """Return a Fragment per dog, serializing only the dogs whose
+    current version has no cached fragment"""
+    cache = _cache()
+    keys = [_key(dog.pk, dog.version) for dog in dogs]
+    cached = cache.get_many(keys)
+    if len(cached) < len(keys):
+        # fragments live for DOG_FRAGMENT_TTL, so their images must not
+        # come from a manifest read before the version was bumped
+        images.check_manifest()
+    missing = {}
+    fragments = []
+    for key, dog in zip(keys, dogs):
+        parts = cached.get(key)
+        if parts is None:
+            parts = missing[key] = _split(dog)
+        fragments.append(Fragment(
+            parts[0] + str(dog.likes_count).encode('ascii') + parts[1]))
+    metrics.count_cache('dog-fragments', True, len(keys) - len(missing))
+    metrics.count_cache('dog-fragments', False, len(missing))
+    if missing:
+        cache.set_many(missing, getattr(
+            settings, 'DOG_FRAGMENT_TTL', 24 * 60 * 60))
+    return fragments
+
+
+def render_dog(dog):
+    return render_dogs([dog])[0]
+
+
+def _join(data):
+    """Encode data, copying the Fragments in it as they are"""
+    if isinstance(data, Fragment):
+        return data.encoded
+    if isinstance(data, dict):
+        return b'{' + b','.join(
+            encode(str(key)) + b':' + _join(value)
+            for key, value in data.items()) + b'}'
+    if isinstance(data, (list, tuple)):
+        return b'[' + b','.join(_join(item) for item in data) + b']'
+    return encode(data)
+
+
+def _has_fragments(data):
+    if isinstance(data, Fragment):
+        return True
+    if isinstance(data, dict):
+        return any(_has_fragments(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(_has_fragments(item) for item in data)
+    return False
+
+
+class FragmentJSONRenderer(JSONRenderer):
+    """JSONRenderer that joins responses holding Fragments byte by byte,
+    unless an indent is requested, in the accepted media type or the
+    renderer context (as by the browsable API)
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if not indent and _has_fragments(data):
+            return _join(data)
+        return super(FragmentJSONRenderer, self).render(
+            data, accepted_media_type, renderer_context)
+
+
+def forget(dog_ids):
+    """Drop the fragments of the first version of the dogs, e.g. after
+    inserting them with explicit ids that may have been used before"""
+    _cache().delete_many([_key(dog_id, 1) for dog_id in dog_ids])
+
+
+@receiver(post_save, sender=Dog)
+@receiver(post_delete, sender=Dog)
+def drop_fragments(sender, instance, **kwargs):
+    """Listens for saved and deleted dogs and drops the fragments of
+    their current and previous version"""
+    _cache().delete_many([_key(instance.pk, version) for version
+                          in (instance.version, instance.version - 1)])
@@ -0,0 +1,163 @@
+"""Resized, re-encoded variants of the dog photos under content-hashed
+names. The names change whenever the bytes do, so the variants can be
+served with far-future cache headers.
+
+Variants are written next to the originals in DOG_IMAGE_DERIVED_DIR
+together with a manifest.json mapping each original image_filename to
+its variant filenames. Building needs Pillow; reading the manifest
+does not.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+
+SOURCE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'static', 'images', 'dogs')
+DERIVED_DIR = getattr(
+    settings, 'DOG_IMAGE_DERIVED_DIR', os.path.join(SOURCE_DIR, 'derived'))
+DERIVED_URL = getattr(
+    settings, 'DOG_IMAGE_DERIVED_URL',
+    settings.STATIC_URL + 'images/dogs/derived/')
+MANIFEST_NAME = 'manifest.json'
+
+# variant name -> longest side in pixels
+VARIANTS = getattr(settings, 'DOG_IMAGE_VARIANTS', {
+    'thumb': 160,
+    'card': 640,
+})
+JPEG_QUALITY = 80
+
+
+def build_variants(image_filename, source_dir, derived_dir):
+    """Write every variant of one original photo and return a dict of
+    variant name to hashed filename. Variants already on disk are not
+    rewritten.
+    """
+    from PIL import Image
+
+    stem = os.path.splitext(image_filename)[0]
+    variants = {}
+    with Image.open(os.path.join(source_dir, image_filename)) as original:
+        original = original.convert('RGB')
+        for variant, longest_side in sorted(VARIANTS.items()):
+            image = original.copy()
+            image.thumbnail((longest_side, longest_side), Image.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=JPEG_QUALITY,
+                       optimize=True, progressive=True)
+            content = buffer.getvalue()
+            filename = '{}.{}.{}.jpg'.format(
+                stem, variant, hashlib.md5(content).hexdigest()[:12])
+            path = os.path.join(derived_dir, filename)
+            if not os.path.exists(path):
+                with open(path, 'wb') as file:
+                    file.write(content)
+            variants[variant] = filename
+    return variants
+
+
+def build_catalog(image_filenames, processes=None, source_dir=None,
+                  derived_dir=None):
+    """Build the variants of many photos across a pool of processes and
+    merge them into the manifest. Returns a pair of the dict of
+    image_filename to variants that were built and the dict of
+    image_filename to the error that prevented it.
+    """
+    source_dir = source_dir or SOURCE_DIR
+    derived_dir = derived_dir or DERIVED_DIR
+    os.makedirs(derived_dir, exist_ok=True)
+    built, failed = {}, {}
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            image_filename: executor.submit(
+                build_variants, image_filename, source_dir, derived_dir)
+            for image_filename in image_filenames
+        }
+        for image_filename, future in futures.items():
+            try:
+                built[image_filename] = future.result()
+            except Exception as error:
+                failed[image_filename] = error
+    manifest = read_manifest(derived_dir)
+    manifest.update(built)
+    write_manifest(manifest, derived_dir)
+    _manifest_cache.reset()
+    return built, failed
+
+
+def read_manifest(derived_dir=None):
+    try:
+        with open(os.path.join(derived_dir or DERIVED_DIR, MANIFEST_NAME),
+                  encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(manifest, derived_dir=None):
+    """Replace the manifest atomically so readers never see half of it"""
+    path = os.path.join(derived_dir or DERIVED_DIR, MANIFEST_NAME)
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+class _ManifestCache(object):
+    """The manifest as last read, reloaded when the file has changed,
+    which is checked at most every CHECK_INTERVAL seconds unless a check
+    is asked for
+    """
+    CHECK_INTERVAL = 5
+
+    def __init__(self):
+        self.mtime = None
+        self.checked = None
+        self.manifest = {}
+        self.lock = threading.Lock()
+
+    def get(self, check=False):
+        now = time.monotonic()
+        if not check and self.checked is not None and \
+                now - self.checked < self.CHECK_INTERVAL:
+            return self.manifest
+        with self.lock:
+            try:
+                mtime = os.stat(
+                    os.path.join(DERIVED_DIR, MANIFEST_NAME)).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            if mtime != self.mtime:
+                self.manifest = read_manifest() if mtime else {}
+                self.mtime = mtime
+            self.checked = now
+        return self.manifest
+
+    def reset(self):
+        """Check the file again on the next get()"""
+        self.checked = None
+
+
+_manifest_cache = _ManifestCache()
+
+
+def check_manifest():
+    """Reload the manifest now if the file has changed. Builds write it
+    before bumping the versions of the dogs, so representations of a new
+    version read after a check carry its variants.
+    """
+    _manifest_cache.get(check=True)
+
+
+def variant_urls(image_filename):
+    """Return a dict of variant name to url for a photo, empty until its
+    variants have been built
+    """
+    variants = _manifest_cache.get().get(image_filename, {})
+    return {variant: DERIVED_URL + filename
+            for variant, filename in variants.items()}
@@ -0,0 +1,162 @@
+"""Timing of the SQL each request runs, whatever the value of DEBUG.
+
+Every database connection gets its cursors wrapped when it connects, so
+each statement is timed and counted into the QueryStats collectors
+active on the executing thread and passed to the query_observers,
+unless it runs while they are paused. The per-request totals are
+aggregated in process per URL name.
+"""
+from contextlib import contextmanager
+import threading
+import time
+
+from django.db.backends.signals import connection_created
+from django.db.backends.utils import CursorWrapper
+from django.dispatch import receiver
+
+# functions called as observer(connection, sql, params, duration) after
+# every statement
+query_observers = []
+
+_local = threading.local()
+
+
+class QueryStats(object):
+    """Number of statements and seconds spent running them"""
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+
+
+def start_collecting(stats):
+    """Count the statements of this thread into stats until
+    stop_collecting(stats)"""
+    if not hasattr(_local, 'collectors'):
+        _local.collectors = []
+    _local.collectors.append(stats)
+
+
+def stop_collecting(stats):
+    try:
+        _local.collectors.remove(stats)
+    except (AttributeError, ValueError):
+        pass
+
+
+@contextmanager
+def collecting():
+    """Return a QueryStats of the statements run in the block"""
+    stats = QueryStats()
+    start_collecting(stats)
+    try:
+        yield stats
+    finally:
+        stop_collecting(stats)
+
+
+@contextmanager
+def paused():
+    """Neither count nor observe the statements run in the block, e.g.
+    those an observer runs itself"""
+    was_paused = getattr(_local, 'paused', False)
+    _local.paused = True
+    try:
+        yield
+    finally:
+        _local.paused = was_paused
+
+
+def set_view(url_name):
+    """Record the URL name of the request this thread serves, None once
+    it is served"""
+    _local.view = url_name
+
+
+def current_view():
+    return getattr(_local, 'view', None)
+
+
+def record_query(connection, sql, params, duration):
+    if getattr(_local, 'paused', False):
+        return
+    for stats in getattr(_local, 'collectors', ()):
+        stats.queries += 1
+        stats.sql_time += duration
+    for observer in query_observers:
+        observer(connection, sql, params, duration)
+
+
+class InstrumentedCursorWrapper(CursorWrapper):
+    """Wraps the cursor the connection would have used and records the
+    duration of every statement
+    """
+    def execute(self, sql, params=None):
+        started = time.perf_counter()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            record_query(self.db, sql, params,
+                         time.perf_counter() - started)
+
+    def executemany(self, sql, param_list):
+        started = time.perf_counter()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            record_query(self.db, sql, param_list,
+                         time.perf_counter() - started)
+
+
+def _instrumented(make_cursor, connection):
+    def make_instrumented_cursor(cursor):
+        return InstrumentedCursorWrapper(make_cursor(cursor), connection)
+    return make_instrumented_cursor
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    """Listens for new database connections and wraps the cursors they
+    make, with and without query logging, once per connection object
+    """
+    if getattr(connection, 'instrumented', False):
+        return
+    connection.make_cursor = _instrumented(connection.make_cursor, connection)
+    connection.make_debug_cursor = _instrumented(
+        connection.make_debug_cursor, connection)
+    connection.instrumented = True
+
+
+class RequestTotals(object):
+    """Thread-safe running totals of the requests served per URL name"""
+    FIELDS = ('requests', 'total_time', 'view_time', 'queries', 'sql_time',
+              'max_queries')
+
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+
+    def add(self, url_name, total_time, view_time, queries, sql_time):
+        with self._lock:
+            totals = self._totals.get(url_name)
+            if totals is None:
+                totals = self._totals[url_name] = dict.fromkeys(
+                    self.FIELDS, 0)
+            totals['requests'] += 1
+            totals['total_time'] += total_time
+            totals['view_time'] += view_time
+            totals['queries'] += queries
+            totals['sql_time'] += sql_time
+            totals['max_queries'] = max(totals['max_queries'], queries)
+
+    def snapshot(self):
+        """Return a copy of the totals, a dict per URL name"""
+        with self._lock:
+            return {url_name: dict(totals)
+                    for url_name, totals in self._totals.items()}
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+request_totals = RequestTotals()
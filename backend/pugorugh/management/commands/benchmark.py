@@ -0,0 +1,109 @@
+import json
+import os
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from pugorugh import benchmarks, synthetic
+from pugorugh.models import Dog
+
+DEFAULT_BUDGETS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))),
+    'benchmark_budgets.json')
+
+
+class Command(BaseCommand):
+    """Seeds a test database at the chosen scale, times every endpoint in
+    process and fails when a result is over its budget or has regressed
+    from a baseline
+    """
+    help = "Benchmark the API endpoints against a seeded test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale', choices=sorted(benchmarks.SCALES), default='small',
+            help="Size of the seeded dataset")
+        parser.add_argument(
+            '--repeat', type=int, default=50,
+            help="Timed requests per case")
+        parser.add_argument(
+            '--case', action='append', dest='cases', metavar='NAME',
+            help="Only run this case; may be repeated")
+        parser.add_argument(
+            '--output', help="Write the results to this JSON file")
+        parser.add_argument(
+            '--baseline',
+            help="Fail on regressions from the results in this JSON file")
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help="Allowed growth of p95 latency over the baseline")
+        parser.add_argument(
+            '--budgets', default=DEFAULT_BUDGETS,
+            help="JSON file of per-case budgets, '' for none")
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help="Keep the seeded test database for the next run")
+
+    def handle(self, *args, **options):
+        cases = benchmarks.CASES
+        if options['cases']:
+            cases = [case for case in cases if case[0] in options['cases']]
+            unknown = set(options['cases']) - {case[0] for case in cases}
+            if unknown:
+                raise CommandError("Unknown case(s): {}".format(
+                    ", ".join(sorted(unknown))))
+        scale = benchmarks.SCALES[options['scale']]
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            if not Dog.objects.exists():
+                self.stdout.write("Seeding {} dogs, {} users...".format(
+                    scale['dogs'], scale['users']))
+                synthetic.generate(**scale)
+            results = benchmarks.run(cases, repeat=options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'scale': dict(scale, name=options['scale']),
+                    'environment': {
+                        'python': platform.python_version(),
+                        'django': django.get_version(),
+                        'database': connection.vendor,
+                    },
+                    'results': results,
+                }, file, indent=2, sort_keys=True)
+
+        failures = []
+        if options['budgets']:
+            failures += benchmarks.check_budgets(
+                results, benchmarks.load(options['budgets']))
+        if options['baseline']:
+            failures += benchmarks.compare(
+                results, benchmarks.load(options['baseline'])['results'],
+                options['tolerance'])
+        for failure in failures:
+            self.stderr.write(failure)
+        if failures:
+            raise CommandError("{} benchmark(s) failed.".format(
+                len(failures)))
+
+    def report(self, results):
+        columns = ('p50_ms', 'p95_ms', 'p99_ms', 'queries', 'sql_ms')
+        self.stdout.write("{:<26}".format('case') + "".join(
+            "{:>10}".format(column) for column in columns))
+        for name, result in results.items():
+            self.stdout.write("{:<26}".format(name) + "".join(
+                "{:>10}".format(result[column]) for column in columns))
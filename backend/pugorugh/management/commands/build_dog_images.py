@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+
+from pugorugh import images
+from pugorugh.models import Dog
+
+
+class Command(BaseCommand):
+    """Builds the resized, content-hashed variants of the dog photos and
+    bumps the version of the dogs whose photos were built, so clients
+    holding their old representation see a new ETag
+    """
+    help = "Build the resized variants of the dog photos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'image_filenames', nargs='*',
+            help="Only build these photos (default: every dog's photo)")
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help="Number of worker processes (default: one per CPU)")
+
+    def handle(self, *args, **options):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            raise CommandError("Building dog images requires Pillow.")
+
+        image_filenames = options['image_filenames'] or sorted(set(
+            Dog.objects.values_list('image_filename', flat=True)))
+        built, failed = images.build_catalog(
+            image_filenames, processes=options['processes'])
+        Dog.objects.filter(image_filename__in=list(built)).update(
+            version=F('version') + 1)
+
+        for image_filename, error in sorted(failed.items()):
+            self.stderr.write("Could not build {}: {}".format(
+                image_filename, error))
+        self.stdout.write("Built variants of {} photo(s).".format(len(built)))
+        if failed:
+            raise CommandError(
+                "{} photo(s) could not be built.".format(len(failed)))
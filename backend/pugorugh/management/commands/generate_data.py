@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pugorugh import synthetic
+
+
+class Command(BaseCommand):
+    """Fills the database with synthetic users, preferences, dogs and
+    decisions for scale testing. Every user's password is
+    pugorugh.synthetic.PASSWORD.
+    """
+    help = "Generate synthetic users, dogs and decisions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dogs', type=int, default=10000, help="Dogs to generate")
+        parser.add_argument(
+            '--users', type=int, default=1000, help="Users to generate")
+        parser.add_argument(
+            '--decisions', type=int, default=50,
+            help="Mean liked/disliked dogs per user")
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help="Seed of the generator; the same seed gives the same data")
+
+    def handle(self, *args, **options):
+        if min(options['dogs'], options['users'], options['decisions']) < 0:
+            raise CommandError("Counts must not be negative.")
+        started = time.monotonic()
+        counts = synthetic.generate(
+            options['dogs'], options['users'], options['decisions'],
+            seed=options['seed'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            "Generated {dogs} dogs, {users} users and {userdogs} decisions "
+            "in {elapsed:.1f}s ({rate:.0f} rows/s).".format(
+                elapsed=elapsed,
+                rate=sum(counts.values()) / elapsed if elapsed else 0,
+                **counts))
@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from pugorugh.catalog import KEYS, CatalogImport, iter_records
+
+DEFAULT_FEED = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))),
+    'static', 'dog_details.json')
+
+
+class Command(BaseCommand):
+    """Imports a catalog feed of dogs, a JSON array or newline delimited
+    JSON, creating the new dogs and updating the changed ones. Dogs are
+    matched on --key, so the same feed can be imported again and again.
+    """
+    help = "Import or re-sync dogs from a JSON or NDJSON feed"
+
+    # seconds between progress reports
+    PROGRESS_INTERVAL = 5
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_FEED,
+            help="Feed to import, '-' for stdin (default: the bundled "
+                 "dog_details.json)")
+        parser.add_argument(
+            '--key', choices=KEYS, default='name',
+            help="Field that identifies a dog across imports")
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help="Dogs validated and written per batch")
+        parser.add_argument(
+            '--prune', action='store_true',
+            help="Delete the dogs that are not in the feed")
+        parser.add_argument(
+            '--images', action='store_true',
+            help="Build the photo variants of new and changed dogs")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be positive.")
+        catalog = CatalogImport(
+            key=options['key'], batch_size=options['batch_size'])
+        self.started = self.reported = time.monotonic()
+
+        try:
+            if options['path'] == '-':
+                catalog.run(iter_records(sys.stdin), progress=self.progress)
+            else:
+                with open(options['path'], encoding='utf-8') as file:
+                    catalog.run(iter_records(file), progress=self.progress)
+        except (OSError, ValueError) as error:
+            raise CommandError("Could not read {}: {}".format(
+                options['path'], error))
+
+        for number, errors in catalog.errors:
+            self.stderr.write("Record {}: {}".format(number, errors))
+        if options['prune']:
+            catalog.prune()
+        self.report(catalog.stats, final=True)
+
+        if options['images'] and catalog.images:
+            call_command('build_dog_images', *sorted(catalog.images),
+                         stdout=self.stdout, stderr=self.stderr)
+
+    def progress(self, stats):
+        if time.monotonic() - self.reported >= self.PROGRESS_INTERVAL:
+            self.report(stats)
+
+    def report(self, stats, final=False):
+        self.reported = time.monotonic()
+        elapsed = self.reported - self.started
+        counts = ", ".join(
+            "{} {}".format(stats[name], name)
+            for name in ('read', 'created', 'updated', 'unchanged',
+                         'invalid', 'deleted')
+            if stats[name] or name == 'read')
+        self.stdout.write("{}{} in {:.1f}s ({:.0f} dogs/s)".format(
+            "Done: " if final else "", counts, elapsed,
+            stats['read'] / elapsed if elapsed else 0))
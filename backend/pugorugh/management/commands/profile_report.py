@@ -0,0 +1,67 @@
+import pstats
+
+from django.core.management.base import BaseCommand, CommandError
+
+from pugorugh import profiling
+
+SORTS = {
+    'cumulative': lambda row: row[3],
+    'own': lambda row: row[2],
+    'calls': lambda row: row[1],
+}
+
+
+class Command(BaseCommand):
+    """Merges the profiles saved by the ProfilingMiddleware and reports
+    where the time went, per request: summed over SQL, serialization,
+    the ORM, the rest of DRF and Django, the app and the rest, then
+    function by function
+    """
+    help = "Report the top functions of the saved request profiles"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dir', help="Directory of the profiles, PROFILE_DIR by default")
+        parser.add_argument(
+            '--view', help="Only merge the profiles of this URL name")
+        parser.add_argument(
+            '--last', type=int,
+            help="Only merge the latest this many profiles")
+        parser.add_argument(
+            '--sort', choices=sorted(SORTS), default='cumulative',
+            help="Order of the functions")
+        parser.add_argument(
+            '--limit', type=int, default=30,
+            help="Number of functions to list")
+
+    def handle(self, *args, **options):
+        paths = profiling.profile_files(options['dir'], options['view'])
+        if options['last']:
+            paths = paths[-options['last']:]
+        if not paths:
+            raise CommandError("No profiles found.")
+        stats = profiling.merge(paths)
+        requests = len(paths)
+        self.stdout.write("{} profile(s), {:.2f} ms per request".format(
+            requests, stats.total_tt * 1000 / requests))
+
+        self.stdout.write("")
+        self.stdout.write("{:<16}{:>12}{:>8}".format('own time', 'ms', '%'))
+        for category, seconds in profiling.breakdown(stats):
+            self.stdout.write("{:<16}{:>12.2f}{:>8.1f}".format(
+                category, seconds * 1000 / requests,
+                100 * seconds / stats.total_tt if stats.total_tt else 0))
+
+        rows = sorted((
+            (function, calls, own_time, cumulative_time)
+            for function, (_, calls, own_time, cumulative_time, _)
+            in stats.stats.items()
+        ), key=SORTS[options['sort']], reverse=True)[:options['limit']]
+        self.stdout.write("")
+        self.stdout.write("{:>10}{:>12}{:>12}  {}".format(
+            'calls', 'own ms', 'cum ms', 'function'))
+        for function, calls, own_time, cumulative_time in rows:
+            self.stdout.write("{:>10.1f}{:>12.3f}{:>12.3f}  {}".format(
+                calls / requests, own_time * 1000 / requests,
+                cumulative_time * 1000 / requests,
+                pstats.func_std_string(function)))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from pugorugh import profiling
+
+
+class Command(BaseCommand):
+    """Prints a signed value of the X-Profile header, which has requests
+    profiled until it expires after PROFILE_TOKEN_MAX_AGE seconds
+    """
+    help = "Print a token that has requests sending it profiled"
+
+    def handle(self, *args, **options):
+        self.stdout.write(profiling.make_token())
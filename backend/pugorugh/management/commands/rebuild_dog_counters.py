@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from pugorugh.models import Dog
+
+
+class Command(BaseCommand):
+    """Recounts the stored likes_count/dislikes_count of every dog (or of
+    the given dog ids) from the UserDog table
+    """
+    help = "Rebuild the stored like/dislike counters of dogs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dog_ids', nargs='*', type=int,
+            help="Only rebuild the counters of these dogs")
+
+    def handle(self, *args, **options):
+        dog_ids = options['dog_ids'] or None
+        updated = Dog.objects.rebuild_counters(dog_ids)
+        self.stdout.write("Rebuilt counters of {} dog(s).".format(updated))
@@ -0,0 +1,43 @@
+import datetime as dt
+
+from django.core.management.base import BaseCommand
+
+from pugorugh import slowqueries
+
+
+class Command(BaseCommand):
+    """Lists the slow statements logged by all processes, the slowest in
+    total first, with the views that issued them and their query plan
+    """
+    help = "List the logged slow SQL statements"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help="Number of statements to list")
+        parser.add_argument(
+            '--clear', action='store_true',
+            help="Forget the logged statements instead")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            slowqueries.clear()
+            self.stdout.write("Cleared the slow query log.")
+            return
+        entries = slowqueries.load()
+        if not entries:
+            self.stdout.write("No slow queries logged.")
+        for entry in entries[:options['limit']]:
+            self.stdout.write("")
+            self.stdout.write(
+                "{id}  {count} time(s), {total_ms:.1f} ms in total, "
+                "{max_ms:.1f} ms at most, last {last_seen}".format(
+                    **dict(entry, last_seen=dt.datetime.fromtimestamp(
+                        entry['last_seen']).strftime('%Y-%m-%d %H:%M:%S'))))
+            self.stdout.write("  views: " + ", ".join(
+                "{} ({})".format(view, count)
+                for view, count in sorted(entry['views'].items(),
+                                          key=lambda item: -item[1])))
+            self.stdout.write("  " + entry['fingerprint'])
+            for line in entry['plan'] or ():
+                self.stdout.write("    " + line)
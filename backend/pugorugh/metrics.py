@@ -0,0 +1,352 @@
+"""Request, database, cache and swipe metrics shared by all the worker
+processes of a deployment, exposed in the Prometheus text format.
+
+Every process counts into its own file in METRICS_DIR, memory mapped as
+a fixed array of 64-bit integers laid out when the process starts, so
+recording is a handful of additions under an uncontended lock. Reading
+the metrics sums the files of every process. As Prometheus counters only
+ever grow, the files of exited processes are first added to the
+ARCHIVE_NAME file and deleted, so the directory holds one file per live
+process; files laid out for other URL names or buckets, e.g. by an
+earlier release, are skipped, and deleted once their process exited.
+"""
+from array import array
+from bisect import bisect_left
+import fcntl
+import hashlib
+import mmap
+import os
+import threading
+
+from django.conf import settings
+
+# upper bounds in seconds of the request latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# status codes counted separately, the rest are counted as 'other'
+STATUSES = (200, 201, 204, 304, 400, 401, 403, 404, 405, 500)
+
+# caches whose hits and misses are counted
+CACHES = ('principal', 'dog-fragments', 'seen-dogs')
+
+# statuses of the swipes counted
+SWIPES = ('liked', 'disliked', 'undecided')
+
+SLOT_SIZE = array('q').itemsize
+
+# the counters of the exited processes, and the lock of the files
+ARCHIVE_NAME = 'metrics-exited.bin'
+LOCK_NAME = 'metrics.lock'
+
+
+class Layout(object):
+    """Offsets of the counters in a metrics file. Slot 0 holds a
+    signature of the layout; then come, per view and status, the counts
+    of each latency bucket, +Inf included, and the latency sum in
+    microseconds; per view, the queries and the SQL time in
+    microseconds; per cache, hits and misses; and per swipe status, the
+    swipes.
+    """
+    def __init__(self, views):
+        self.views = tuple(views) + ('unresolved', 'other')
+        self.statuses = tuple(str(code) for code in STATUSES) + ('other',)
+        self.view_index = {view: index for index, view
+                           in enumerate(self.views)}
+        self.status_index = {code: index for index, code
+                             in enumerate(STATUSES)}
+        self.request_width = len(BUCKETS) + 2
+        self.requests = 1
+        self.db = self.requests + (len(self.views) * len(self.statuses) *
+                                   self.request_width)
+        self.caches = self.db + len(self.views) * 2
+        self.swipes = self.caches + len(CACHES) * 2
+        self.size = self.swipes + len(SWIPES)
+        self.signature = int(hashlib.md5(repr(
+            (self.views, self.statuses, BUCKETS, CACHES, SWIPES)
+        ).encode('utf-8')).hexdigest()[:15], 16)
+
+    def request_offset(self, view, status):
+        view_index = self.view_index.get(view, len(self.views) - 1)
+        status_index = self.status_index.get(status, len(STATUSES))
+        return self.requests + self.request_width * (
+            view_index * len(self.statuses) + status_index)
+
+
+def url_names():
+    """Return the names of the routes of pugorugh.urls"""
+    from . import urls
+    names = [getattr(pattern, 'name', None) for pattern in urls.urlpatterns]
+    # the format suffix patterns repeat the names
+    return [name for index, name in enumerate(names)
+            if name and name not in names[:index]]
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None) or os.path.join(
+        settings.BASE_DIR, 'metrics')
+
+
+def exited(pid):
+    """Return whether no process runs under pid"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def read_counters(path, layout):
+    """Return the counters of a metrics file, or None when it is missing
+    or laid out otherwise"""
+    counters = array('q')
+    try:
+        with open(path, 'rb') as file:
+            counters.frombytes(file.read())
+    except (OSError, ValueError):
+        return None
+    if len(counters) != layout.size or counters[0] != layout.signature:
+        return None
+    return counters
+
+
+class Metrics(object):
+    """Records into the metrics file of the current process, which is
+    opened on first use and again after a fork
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._slots = None
+        self._layout = None
+
+    @property
+    def layout(self):
+        if self._layout is None:
+            self._layout = Layout(url_names())
+        return self._layout
+
+    def _open(self):
+        layout = self.layout
+        directory = metrics_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, 'metrics-{}.bin'.format(os.getpid()))
+        # a process reusing the pid of an exited one waits for its file
+        # to be archived
+        with open(os.path.join(directory, LOCK_NAME), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != layout.size * SLOT_SIZE:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, layout.size * SLOT_SIZE)
+            buffer = mmap.mmap(fd, layout.size * SLOT_SIZE)
+        finally:
+            os.close(fd)
+        slots = memoryview(buffer).cast('q')
+        if slots[0] != layout.signature:
+            # left behind by another process with this pid and layout
+            slots[:] = array('q', bytes(len(slots) * SLOT_SIZE))
+            slots[0] = layout.signature
+        return slots
+
+    def _process_slots(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._slots = self._open()
+                    self._pid = pid
+        return self._slots
+
+    def observe_request(self, view, status, duration, queries, sql_time):
+        """Count a request to the route named view, its latency and its
+        SQL, the times being in seconds"""
+        layout = self.layout
+        slots = self._process_slots()
+        offset = layout.request_offset(view, status)
+        bucket = offset + bisect_left(BUCKETS, duration)
+        view_index = layout.view_index.get(view, len(layout.views) - 1)
+        db = layout.db + 2 * view_index
+        with self._lock:
+            slots[bucket] += 1
+            slots[offset + len(BUCKETS) + 1] += int(duration * 1e6)
+            slots[db] += queries
+            slots[db + 1] += int(sql_time * 1e6)
+
+    def count_cache(self, cache, hit, count=1):
+        slots = self._process_slots()
+        index = self.layout.caches + 2 * CACHES.index(cache) + (not hit)
+        with self._lock:
+            slots[index] += count
+
+    def count_swipes(self, status, count=1):
+        slots = self._process_slots()
+        index = self.layout.swipes + SWIPES.index(status)
+        with self._lock:
+            slots[index] += count
+
+    def archive_exited(self, directory):
+        """Add the counters of the files of exited processes to the
+        archive file and delete them. Scrapes hold an exclusive lock on
+        the directory meanwhile, so that none adds a file twice.
+        """
+        layout = self.layout
+        with open(os.path.join(directory, LOCK_NAME), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            exited_files = []
+            for filename in os.listdir(directory):
+                pid = filename[len('metrics-'):-len('.bin')]
+                if filename.startswith('metrics-') and \
+                        filename.endswith('.bin') and pid.isdigit() and \
+                        exited(int(pid)):
+                    exited_files.append(os.path.join(directory, filename))
+            if not exited_files:
+                return
+            archive_path = os.path.join(directory, ARCHIVE_NAME)
+            archive = read_counters(archive_path, layout)
+            if archive is None:
+                archive = array('q', bytes(layout.size * SLOT_SIZE))
+                archive[0] = layout.signature
+            for path in exited_files:
+                counters = read_counters(path, layout)
+                if counters is None:
+                    continue
+                for index in range(1, layout.size):
+                    archive[index] += counters[index]
+            with open(archive_path + '.tmp', 'wb') as file:
+                archive.tofile(file)
+            os.replace(archive_path + '.tmp', archive_path)
+            for path in exited_files:
+                os.remove(path)
+
+    def totals(self):
+        """Return the counters summed over the files of all processes"""
+        layout = self.layout
+        totals = array('q', bytes(layout.size * SLOT_SIZE))
+        directory = metrics_dir()
+        if not os.path.isdir(directory):
+            return totals
+        self.archive_exited(directory)
+        for filename in os.listdir(directory):
+            if not filename.startswith('metrics-') or \
+                    not filename.endswith('.bin'):
+                continue
+            counters = read_counters(os.path.join(directory, filename),
+                                     layout)
+            if counters is None:
+                continue
+            for index in range(1, layout.size):
+                totals[index] += counters[index]
+        return totals
+
+    def reset(self):
+        """Forget the open file, e.g. after METRICS_DIR changed"""
+        with self._lock:
+            self._pid = None
+            self._slots = None
+
+
+metrics = Metrics()
+
+
+def _labels(**labels):
+    return '{' + ','.join('{}="{}"'.format(name, value)
+                          for name, value in labels.items()) + '}'
+
+
+def exposition():
+    """Return the metrics of all processes in the Prometheus text
+    exposition format, version 0.0.4"""
+    layout = metrics.layout
+    totals = metrics.totals()
+    lines = [
+        '# HELP pugorugh_http_request_duration_seconds Latency of requests '
+        'by route name and status.',
+        '# TYPE pugorugh_http_request_duration_seconds histogram',
+    ]
+    requests = []
+    for view in layout.views:
+        for status in layout.statuses:
+            offset = layout.request_offset(
+                view, int(status) if status != 'other' else None)
+            counts = totals[offset:offset + len(BUCKETS) + 1]
+            count = sum(counts)
+            if not count:
+                continue
+            requests.append((view, status, count))
+            cumulative = 0
+            for bound, bucket_count in zip(
+                    [str(bound) for bound in BUCKETS] + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(
+                    'pugorugh_http_request_duration_seconds_bucket{} '
+                    '{}'.format(_labels(view=view, status=status, le=bound),
+                                cumulative))
+            lines.append('pugorugh_http_request_duration_seconds_sum{} '
+                         '{}'.format(_labels(view=view, status=status),
+                                     totals[offset + len(BUCKETS) + 1] / 1e6))
+            lines.append('pugorugh_http_request_duration_seconds_count{} '
+                         '{}'.format(_labels(view=view, status=status),
+                                     count))
+
+    lines += [
+        '# HELP pugorugh_http_requests_total Requests by route name and '
+        'status.',
+        '# TYPE pugorugh_http_requests_total counter',
+    ] + ['pugorugh_http_requests_total{} {}'.format(
+        _labels(view=view, status=status), count)
+        for view, status, count in requests]
+
+    lines += [
+        '# HELP pugorugh_db_queries_total SQL statements run by route '
+        'name.',
+        '# TYPE pugorugh_db_queries_total counter',
+    ]
+    durations = [
+        '# HELP pugorugh_db_query_duration_seconds_total Seconds spent '
+        'running SQL by route name.',
+        '# TYPE pugorugh_db_query_duration_seconds_total counter',
+    ]
+    for index, view in enumerate(layout.views):
+        queries = totals[layout.db + 2 * index]
+        if queries:
+            lines.append('pugorugh_db_queries_total{} {}'.format(
+                _labels(view=view), queries))
+            durations.append(
+                'pugorugh_db_query_duration_seconds_total{} {}'.format(
+                    _labels(view=view),
+                    totals[layout.db + 2 * index + 1] / 1e6))
+    lines += durations
+
+    lines += [
+        '# HELP pugorugh_cache_requests_total Cache lookups by cache and '
+        'result.',
+        '# TYPE pugorugh_cache_requests_total counter',
+    ]
+    ratios = [
+        '# HELP pugorugh_cache_hit_ratio Share of the lookups of a cache '
+        'that hit.',
+        '# TYPE pugorugh_cache_hit_ratio gauge',
+    ]
+    for index, cache in enumerate(CACHES):
+        hits = totals[layout.caches + 2 * index]
+        misses = totals[layout.caches + 2 * index + 1]
+        lines.append('pugorugh_cache_requests_total{} {}'.format(
+            _labels(cache=cache, result='hit'), hits))
+        lines.append('pugorugh_cache_requests_total{} {}'.format(
+            _labels(cache=cache, result='miss'), misses))
+        ratios.append('pugorugh_cache_hit_ratio{} {}'.format(
+            _labels(cache=cache),
+            hits / (hits + misses) if hits + misses else 0))
+    lines += ratios
+
+    lines += [
+        '# HELP pugorugh_swipes_total Dogs liked, disliked or reset to '
+        'undecided; rate() gives swipes per second.',
+        '# TYPE pugorugh_swipes_total counter',
+    ] + ['pugorugh_swipes_total{} {}'.format(
+        _labels(status=status), totals[layout.swipes + index])
+        for index, status in enumerate(SWIPES)]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,83 @@
+import cProfile
+import time
+
+from django.conf import settings
+
+from . import instrumentation, profiling
+from .metrics import metrics
+from .slowqueries import slow_query_log
+
+
+class RequestTimingMiddleware(object):
+    """Times each request, the view and the SQL it runs, reports them in
+    a Server-Timing header and adds them to the in-process totals and to
+    the metrics of the URL name the request resolved to.
+
+    The statements run by the view are attributed to that URL name, in
+    the slow query log among others, and the log is saved when the
+    response leaves. Belongs first in MIDDLEWARE_CLASSES so that it times
+    the other middleware too.
+    """
+    def process_request(self, request):
+        request.timing_started = time.perf_counter()
+        request.timing_queries = instrumentation.QueryStats()
+        instrumentation.start_collecting(request.timing_queries)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.timing_view_started = time.perf_counter()
+        instrumentation.set_view(request.resolver_match.url_name)
+
+    def process_response(self, request, response):
+        stats = getattr(request, 'timing_queries', None)
+        if stats is None:
+            # an earlier middleware answered before process_request
+            return response
+        instrumentation.stop_collecting(stats)
+        instrumentation.set_view(None)
+        finished = time.perf_counter()
+        total_time = finished - request.timing_started
+        view_time = finished - getattr(
+            request, 'timing_view_started', finished)
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.url_name if match and match.url_name \
+            else 'unresolved'
+
+        instrumentation.request_totals.add(
+            url_name, total_time, view_time, stats.queries, stats.sql_time)
+        metrics.observe_request(url_name, response.status_code, total_time,
+                                stats.queries, stats.sql_time)
+        slow_query_log.flush()
+        if getattr(settings, 'SERVER_TIMING_HEADER', True):
+            response['Server-Timing'] = (
+                'sql;dur={:.2f};desc="{} queries", view;dur={:.2f}, '
+                'total;dur={:.2f}'.format(
+                    stats.sql_time * 1000, stats.queries,
+                    view_time * 1000, total_time * 1000))
+        return response
+
+
+class ProfilingMiddleware(object):
+    """Runs the view, the serialization and the rendering of requests
+    with a valid X-Profile token, or drawn at PROFILE_SAMPLE_RATE, under
+    cProfile and saves the stats to PROFILE_DIR. Belongs last in
+    MIDDLEWARE_CLASSES so that only the view is profiled.
+    """
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.profile_requested = profiling.requested(request)
+        if request.profile_requested or profiling.sampled():
+            request.profile = cProfile.Profile()
+            request.profile.enable()
+
+    def process_response(self, request, response):
+        profile = getattr(request, 'profile', None)
+        if profile is None:
+            return response
+        profile.disable()
+        del request.profile
+        match = getattr(request, 'resolver_match', None)
+        filename = profiling.save(
+            profile, match.url_name if match and match.url_name
+            else 'unresolved')
+        if request.profile_requested:
+            response['X-Profile-File'] = filename
+        return response
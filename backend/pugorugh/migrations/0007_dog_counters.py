@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0006_auto_20200107_1832'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dog',
+            name='dislikes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='dog',
+            name='likes_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(
+            ["""
+            UPDATE pugorugh_dog SET
+                likes_count = (
+                    SELECT COUNT(*) FROM pugorugh_userdog
+                    WHERE pugorugh_userdog.dog_id = pugorugh_dog.id
+                    AND pugorugh_userdog.status = 'l'),
+                dislikes_count = (
+                    SELECT COUNT(*) FROM pugorugh_userdog
+                    WHERE pugorugh_userdog.dog_id = pugorugh_dog.id
+                    AND pugorugh_userdog.status = 'd')
+            """],
+            migrations.RunSQL.noop,
+        ),
+    ]
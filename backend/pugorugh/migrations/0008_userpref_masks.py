@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:12
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+# copied from UserPref so the migration does not depend on the live model
+PREFERENCES = (
+    ('age', ('b', 'y', 'a', 's')),
+    ('gender', ('m', 'f')),
+    ('size', ('s', 'm', 'l', 'xl')),
+)
+
+
+def strings_to_masks(apps, schema_editor):
+    UserPref = apps.get_model('pugorugh', 'UserPref')
+    for pref in UserPref.objects.all():
+        for name, choices in PREFERENCES:
+            letters = set(getattr(pref, name).split(','))
+            mask = 0
+            for index, letter in enumerate(choices):
+                if letter in letters:
+                    mask |= 1 << index
+            setattr(pref, name + '_mask', mask)
+        pref.save()
+
+
+def masks_to_strings(apps, schema_editor):
+    UserPref = apps.get_model('pugorugh', 'UserPref')
+    for pref in UserPref.objects.all():
+        for name, choices in PREFERENCES:
+            mask = getattr(pref, name + '_mask')
+            setattr(pref, name, ','.join(
+                letter for index, letter in enumerate(choices)
+                if mask & (1 << index)
+            ))
+        pref.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0007_dog_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userpref',
+            name='age_mask',
+            field=models.PositiveSmallIntegerField(default=15),
+        ),
+        migrations.AddField(
+            model_name='userpref',
+            name='gender_mask',
+            field=models.PositiveSmallIntegerField(default=3),
+        ),
+        migrations.AddField(
+            model_name='userpref',
+            name='size_mask',
+            field=models.PositiveSmallIntegerField(default=15),
+        ),
+        migrations.RunPython(strings_to_masks, masks_to_strings),
+        migrations.RemoveField(
+            model_name='userpref',
+            name='age',
+        ),
+        migrations.RemoveField(
+            model_name='userpref',
+            name='gender',
+        ),
+        migrations.RemoveField(
+            model_name='userpref',
+            name='size',
+        ),
+    ]
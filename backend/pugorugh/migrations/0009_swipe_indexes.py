@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:13
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0008_userpref_masks'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='dog',
+            index_together=set([('gender', 'size', 'age_letter', 'id')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='userdog',
+            index_together=set([('user', 'status', 'dog')]),
+        ),
+    ]
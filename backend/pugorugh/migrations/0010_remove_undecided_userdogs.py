@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:16
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0009_swipe_indexes'),
+    ]
+
+    operations = [
+        # "undecided" used to be stored as a 'u' row, which kept the dog
+        # out of the undecided feed for good; undecided now means no row
+        migrations.RunSQL(
+            ["DELETE FROM pugorugh_userdog WHERE status = 'u'"],
+            migrations.RunSQL.noop,
+        ),
+    ]
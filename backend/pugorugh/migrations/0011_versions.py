@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:18
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0010_remove_undecided_userdogs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dog',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='userpref',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:25
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+# days per month, as in pugorugh.models.DAYS_PER_MONTH
+DAYS_PER_MONTH = 28
+
+ESTIMATED_BIRTHDAY = {
+    'sqlite': "date('now', '-' || (age * {days}) || ' days')",
+    'postgresql': "CURRENT_DATE - age * {days}",
+    'mysql': "DATE_SUB(CURDATE(), INTERVAL age * {days} DAY)",
+}
+
+
+def backfill_birthdays(apps, schema_editor):
+    """Estimate the missing birthdays from the ages in one UPDATE"""
+    Dog = apps.get_model('pugorugh', 'Dog')
+    vendor = schema_editor.connection.vendor
+    if vendor in ESTIMATED_BIRTHDAY:
+        schema_editor.execute(
+            "UPDATE {} SET birthday = {} WHERE birthday IS NULL".format(
+                schema_editor.quote_name(Dog._meta.db_table),
+                ESTIMATED_BIRTHDAY[vendor].format(days=DAYS_PER_MONTH)))
+        return
+    import datetime as dt
+    today = dt.date.today()
+    for dog in Dog.objects.filter(birthday__isnull=True).only('age'):
+        Dog.objects.filter(pk=dog.pk).update(
+            birthday=today - dt.timedelta(days=dog.age * DAYS_PER_MONTH))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0011_versions'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_birthdays, migrations.RunPython.noop),
+        migrations.AlterIndexTogether(
+            name='dog',
+            index_together=set([('gender', 'size', 'birthday', 'id')]),
+        ),
+        migrations.RemoveField(
+            model_name='dog',
+            name='age_letter',
+        ),
+    ]
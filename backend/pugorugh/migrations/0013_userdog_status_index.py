@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:39
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0012_birthday_age_buckets'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='userdog',
+            index_together=set([('user', 'status', 'dog'), ('status', 'id')]),
+        ),
+    ]
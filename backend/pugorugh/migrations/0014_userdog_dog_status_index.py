@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 13:58
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0013_userdog_status_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='userdog',
+            index_together=set([('dog', 'status'), ('status', 'id'), ('user', 'status', 'dog')]),
+        ),
+        migrations.AlterField(
+            model_name='userdog',
+            name='dog',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='pugorugh.Dog'),
+        ),
+    ]
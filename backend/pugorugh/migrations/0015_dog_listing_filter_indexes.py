@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.9.9 on 2026-10-17 14:12
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pugorugh', '0014_userdog_dog_status_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='dog',
+            index_together=set([('breed', 'id'), ('birthday', 'id'), ('joined', 'id'), ('size', 'id'), ('gender', 'size', 'birthday', 'id')]),
+        ),
+    ]
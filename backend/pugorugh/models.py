@@ -1,9 +1,211 @@
 import datetime as dt
 from django.contrib.auth.models import User
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
+from .db import supports_upsert, upsert
+
+
+# UserDog status -> Dog counter column it is tallied in
+COUNTER_FIELDS = {
+    'l': 'likes_count',
+    'd': 'dislikes_count',
+}
+
+
+def letters_to_mask(letters, choices):
+    """Return the bitmask of the given letters, bit i standing for
+    choices[i]. Raises ValueError for letters that are not choices.
+    """
+    mask = 0
+    for letter in letters:
+        mask |= 1 << choices.index(letter)
+    return mask
+
+
+def mask_to_letters(mask, choices):
+    """Return the letters of choices whose bit is set in mask, in the
+    order of choices
+    """
+    return [letter for index, letter in enumerate(choices)
+            if mask & (1 << index)]
+
+
+# the estimate of a month used to turn ages into birthdays and back
+DAYS_PER_MONTH = 28
+
+# age category -> (first month, first month of the next category)
+AGE_BUCKETS = (
+    ('b', 0, 9),
+    ('y', 9, 19),
+    ('a', 19, 85),
+    ('s', 85, None),
+)
+
+
+def counter_deltas(old_status, new_status):
+    """Return the change of each counter field when a UserDog row goes
+    from old_status to new_status, None standing for no row
+    """
+    deltas = {}
+    if old_status in COUNTER_FIELDS:
+        deltas[COUNTER_FIELDS[old_status]] = -1
+    if new_status in COUNTER_FIELDS:
+        field = COUNTER_FIELDS[new_status]
+        deltas[field] = deltas.get(field, 0) + 1
+    return {field: delta for field, delta in deltas.items() if delta}
+
+
+def age_to_letter(age):
+    """Return the age category of an age in months"""
+    for letter, _, end in AGE_BUCKETS:
+        if end is None or age < end:
+            return letter
+
+
+def estimate_birthday(age, today=None):
+    """Return the approximate birthday of a dog aged age months"""
+    today = today or dt.date.today()
+    return today - dt.timedelta(days=age * DAYS_PER_MONTH)
+
+
+def birthday_in_ages(letters, today=None):
+    """Return a Q matching the dogs whose birthday puts them in one of
+    the age categories today, as one birthday range per run of adjacent
+    categories, which an index on birthday serves.
+
+    Only DogQuerySet.preferred_by uses it; see there.
+    """
+    runs = []
+    for letter, start, end in AGE_BUCKETS:
+        if letter not in letters:
+            continue
+        if runs and runs[-1][1] == start:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    condition = Q()
+    for start, end in runs:
+        lookups = {}
+        if start:
+            lookups['birthday__lte'] = estimate_birthday(start, today)
+        if end is not None:
+            lookups['birthday__gt'] = estimate_birthday(end, today)
+        condition |= Q(**lookups)
+    return condition
+
+
+class DogQuerySet(models.QuerySet):
+    """QuerySet with helpers for walking the catalog and for maintaining
+    the stored like/dislike counters of Dog instances
+    """
+    def following(self, pk, count=1):
+        """Return up to count dogs of this queryset that come after pk in
+        id order, wrapping around to the lowest ids, as one query.
+
+        The candidates are the first ids above pk plus the first ids
+        overall, each an index range scan with a LIMIT; ordering the few
+        candidates puts those above pk first.
+        """
+        ids = self.order_by('pk').values('pk')
+        return self.model.objects.filter(
+            Q(pk__in=ids.filter(pk__gt=pk)[:count]) | Q(pk__in=ids[:count])
+        ).annotate(
+            wrapped=Case(
+                When(pk__gt=pk, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('wrapped', 'pk')[:count]
+
+    def preferred_by(self, prefs, today=None):
+        """Filter to dogs matching a user's preferences, ages by the
+        birthday ranges they span on today. A preference that admits
+        every value a column can hold adds no predicate.
+
+        The feeds don't call this: they look the preferred dogs up in
+        segments.segment_index, whose admits() must agree with it. It is
+        kept as the reference implementation the tests check the index
+        against, so change both together.
+        """
+        ages = mask_to_letters(prefs.age_mask, UserPref.AGES)
+        queryset = self
+        if set(ages) != set(UserPref.AGES):
+            queryset = queryset.filter(birthday_in_ages(ages, today))
+        filters = {}
+        for lookup, mask, choices, values in (
+            ('gender__in', prefs.gender_mask, UserPref.GENDERS,
+             [value for value, _ in Dog.GENDER]),
+            ('size__in', prefs.size_mask, UserPref.SIZES,
+             [value for value, _ in Dog.SIZE]),
+        ):
+            letters = mask_to_letters(mask, choices)
+            if set(letters) != set(values):
+                filters[lookup] = letters
+        return queryset.filter(**filters)
+
+    def aged(self, min_age=None, max_age=None, today=None):
+        """Filter to dogs aged min_age to max_age months on today, both
+        included, as one birthday range. Either bound may be None.
+        """
+        lookups = {}
+        if min_age is not None:
+            lookups['birthday__lte'] = estimate_birthday(min_age, today)
+        if max_age is not None:
+            lookups['birthday__gt'] = estimate_birthday(max_age + 1, today)
+        return self.filter(**lookups)
+
+    def adjust_counters(self, old_status, new_status):
+        """Move one tally from the counter of old_status to the counter
+        of new_status with a single UPDATE. Either status may be None (no
+        UserDog row) or a status without a counter.
+        """
+        changes = {field: F(field) + delta for field, delta
+                   in counter_deltas(old_status, new_status).items()}
+        if not changes:
+            return 0
+        return self.update(**changes)
+
+    def rebuild_counters(self, dog_ids=None):
+        """Recount the stored counters from UserDog rows with a single
+        correlated UPDATE. Restricted to dog_ids when given, otherwise the
+        whole catalog is rebuilt. Returns the number of dogs updated.
+        """
+        qn = connection.ops.quote_name
+        dog_table = qn(self.model._meta.db_table)
+        userdog_table = qn(UserDog._meta.db_table)
+        count_sql = (
+            "(SELECT COUNT(*) FROM {userdog} WHERE {userdog}.{dog_id} = "
+            "{dog}.{id} AND {userdog}.{status} = %s)"
+        ).format(userdog=userdog_table, dog=dog_table, dog_id=qn('dog_id'),
+                 id=qn('id'), status=qn('status'))
+        sql = "UPDATE {dog} SET {assignments}".format(
+            dog=dog_table,
+            assignments=", ".join(
+                "{} = {}".format(qn(field), count_sql)
+                for field in COUNTER_FIELDS.values()
+            )
+        )
+        params = list(COUNTER_FIELDS.keys())
+        with connection.cursor() as cursor:
+            if dog_ids is None:
+                cursor.execute(sql, params)
+                return cursor.rowcount
+            dog_ids = list(dog_ids)
+            updated = 0
+            # stay well below SQLite's limit on bound parameters
+            for start in range(0, len(dog_ids), 500):
+                chunk = dog_ids[start:start + 500]
+                cursor.execute(
+                    "{} WHERE {} IN ({})".format(
+                        sql, qn('id'), ", ".join(["%s"] * len(chunk))),
+                    params + chunk
+                )
+                updated += cursor.rowcount
+            return updated
+
 
 class Dog(models.Model):
     """Model decribing a dog
@@ -17,8 +219,13 @@ class Dog(models.Model):
         representing gender of dog
         size {string} -- character(s) [(s)mall, (m)edium, (l)arge, (xl)
         extra large, (u)nknown] representing size of dog
-        birthday {date object} -- date of birth
+        birthday {date object} -- date of birth, estimated from age when
+        not given; age categories are derived from it at query time
         joined {date object} -- date of instance creation
+        likes_count {integer} -- number of users that liked the dog
+        dislikes_count {integer} -- number of users that disliked the dog
+        version {integer} -- incremented on every save, validates cached
+        representations together with the counters
     """
     GENDER = (
         ('m', 'male'),
@@ -36,44 +243,171 @@ class Dog(models.Model):
     name = models.CharField(max_length=48, unique=True)
     image_filename = models.CharField(max_length=256, unique=True)
     breed = models.CharField(default='unknown', max_length=48)
-    age_letter = models.CharField(max_length=1, null=True, editable=False)
     age = models.IntegerField()
     gender = models.CharField(max_length=48, choices=GENDER)
     size = models.CharField(max_length=48, choices=SIZE)
     birthday = models.DateField(null=True, blank=True)
     joined = models.DateField(auto_now_add=True)
+    likes_count = models.PositiveIntegerField(default=0, editable=False)
+    dislikes_count = models.PositiveIntegerField(default=0, editable=False)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = DogQuerySet.as_manager()
+
+    class Meta:
+        # the first serves the preference filter of the undecided feed;
+        # gender leads because preferences never admit 'u', so it is
+        # always constrained while size and age may be left out of the
+        # filter, and birthday is last as ages are ranges over it. The
+        # others serve the filters of the dog listing, ending with id so
+        # that an equality reads its keyset pages in id order
+        index_together = [
+            ['gender', 'size', 'birthday', 'id'],
+            ['breed', 'id'],
+            ['size', 'id'],
+            ['birthday', 'id'],
+            ['joined', 'id'],
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super(Dog, self).__init__(*args, **kwargs)
+        self._remember_saved_state()
 
     def __str__(self):
         return self.name
 
+    @property
+    def etag(self):
+        """Return a validator that changes whenever the dog's
+        representation does"""
+        return 'dog-{}-{}-{}'.format(self.pk, self.version, self.likes_count)
+
+    @property
+    def age_letter(self):
+        """Return the age category the dog's birthday puts it in today"""
+        if self.birthday is None:
+            return None
+        return age_to_letter(
+            (dt.date.today() - self.birthday).days / DAYS_PER_MONTH)
+
     @property
     def likes(self):
         """Return number of current likes of Dog instance"""
-        # return UserDog.objects.filter(
-        #     dog=self,
-        #     status="l"
-        # ).count()
-        return self.userdog_set.filter(
-            dog=self,
-            status="l"
-        ).count()
+        return self.likes_count
+
+    def move_counters(self, old_status, new_status):
+        """Apply to this instance the counter change that
+        DogQuerySet.adjust_counters makes in the database"""
+        for field, delta in counter_deltas(old_status, new_status).items():
+            setattr(self, field, getattr(self, field) + delta)
+
+    def _remember_saved_state(self):
+        """Keep the age and birthday as stored in the database so that
+        saves know whether the birthday must follow a new age
+        """
+        self._saved_age, self._saved_birthday = self.age, self.birthday
 
     def save(self, *args, **kwargs):
-        """Overriding derived class method to populate age_letter and
-        birthday fields """
-        # derive age category from age in months
-        if self.age > 84:
-            self.age_letter = 's'
-        elif self.age > 18:
-            self.age_letter = 'a'
-        elif self.age > 8:
-            self.age_letter = 'y'
-        else:
-            self.age_letter = 'b'
-        # derive approximate birthday from age in months
-        if not self.birthday:
-            self.birthday = dt.date.today() - dt.timedelta(weeks=self.age * 4)
+        """Overriding derived class method to estimate the birthday from
+        the age, unless a birthday was given for this age"""
+        if not self.birthday or (self.age != self._saved_age and
+                                 self.birthday == self._saved_birthday):
+            self.birthday = estimate_birthday(self.age)
+        if self.pk is not None:
+            self.version += 1
         super(Dog, self).save(*args, **kwargs)
+        self._remember_saved_state()
+
+
+class UserDogQuerySet(models.QuerySet):
+    """QuerySet with set-based writes of a user's feelings about dogs"""
+    def _delete_rows(self):
+        """Delete the rows in one statement without sending post_delete
+        and return how many were deleted. delete() would send it, and
+        release_userdog_counter would then adjust the counters that the
+        callers move themselves. _raw_delete() is private; checked against
+        the pinned Django 1.9.9, where it takes the alias and returns the
+        row count, recheck it when upgrading.
+        """
+        return self._raw_delete(self.db)
+
+    def set_status(self, user_id, dog_id, status):
+        """Store how a user feels about one dog, a status of None
+        (undecided) removing the UserDog row, and move the dog's counters
+        to match. Every write is a single conditional statement whose
+        row count tells what the row held before, so concurrent swipes
+        neither race on unique_together nor double count. Returns the
+        previous status.
+        """
+        rows = self.filter(user_id=user_id, dog_id=dog_id)
+        with transaction.atomic():
+            if status is None:
+                old_status = next((
+                    counted for counted in COUNTER_FIELDS
+                    if rows.filter(status=counted)._delete_rows()
+                ), None)
+            else:
+                old_status = next((
+                    other for other in COUNTER_FIELDS if other != status
+                    and rows.filter(status=other).update(status=status)
+                ), None)
+                if old_status is None and not self._insert_missing(
+                        user_id, dog_id, status):
+                    # the row already holds this status
+                    old_status = status
+            Dog.objects.filter(pk=dog_id).adjust_counters(old_status, status)
+        return old_status
+
+    def _insert_missing(self, user_id, dog_id, status):
+        """Insert a UserDog row unless the user already has one for the
+        dog. Returns whether a row was inserted.
+        """
+        if supports_upsert():
+            return upsert(self.model, ['user', 'dog', 'status'],
+                          [(user_id, dog_id, status)],
+                          conflict_fields=['user', 'dog'],
+                          update_fields=[])
+        try:
+            with transaction.atomic():
+                self.bulk_create([self.model(
+                    user_id=user_id, dog_id=dog_id, status=status)])
+        except IntegrityError:
+            return False
+        return True
+
+    def apply_decisions(self, user_id, decisions):
+        """Store a user's decisions, a dict of dog id to status, where a
+        status of None (undecided) removes the UserDog row. Writes one
+        upsert and one delete however many decisions there are, then
+        rebuilds the counters of the dogs involved, all in one
+        transaction.
+        """
+        statuses = {dog_id: status for dog_id, status in decisions.items()
+                    if status is not None}
+        undecided = [dog_id for dog_id, status in decisions.items()
+                     if status is None]
+        with transaction.atomic():
+            if undecided:
+                # the counters are rebuilt below
+                self.filter(
+                    user_id=user_id, dog_id__in=undecided
+                )._delete_rows()
+            if statuses and supports_upsert():
+                upsert(
+                    self.model,
+                    ['user', 'dog', 'status'],
+                    [(user_id, dog_id, status)
+                     for dog_id, status in statuses.items()],
+                    conflict_fields=['user', 'dog'],
+                    update_fields=['status'],
+                )
+            else:
+                for dog_id, status in statuses.items():
+                    self.update_or_create(
+                        user_id=user_id, dog_id=dog_id,
+                        defaults={'status': status}
+                    )
+            Dog.objects.rebuild_counters(decisions.keys())
 
 
 class UserDog(models.Model):
@@ -91,11 +425,28 @@ class UserDog(models.Model):
         ('d', 'disliked')
     )
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    dog = models.ForeignKey(Dog, on_delete=models.CASCADE)
+    # indexed by the (dog, status) index
+    dog = models.ForeignKey(Dog, on_delete=models.CASCADE, db_index=False)
     status = models.CharField(max_length=1, choices=FEELINGS)
 
+    objects = UserDogQuerySet.as_manager()
+
     class Meta:
         unique_together = ['user', 'dog']
+        # the first serves the liked/disliked feeds, which look up a
+        # user's dogs of one status in dog order; the second the counts
+        # of a dog's likes and dislikes and the lookups by dog, and must
+        # outrank the third for them, which serves the status filter of
+        # the admin paging through the rows of one status latest first
+        index_together = [
+            ['user', 'status', 'dog'],
+            ['dog', 'status'],
+            ['status', 'id'],
+        ]
+
+    def __init__(self, *args, **kwargs):
+        super(UserDog, self).__init__(*args, **kwargs)
+        self._remember_saved_state()
 
     def __str__(self):
         return "{} {} {}".format(
@@ -104,29 +455,74 @@ class UserDog(models.Model):
             self.dog.name
         )
 
+    def _remember_saved_state(self):
+        """Keep the dog and status as stored in the database so that
+        saves and deletes know which counters to move
+        """
+        if self.pk is None:
+            self._saved_dog_id, self._saved_status = None, None
+        else:
+            self._saved_dog_id, self._saved_status = self.dog_id, self.status
+
+    def save(self, *args, **kwargs):
+        """Overriding derived class method to keep the like/dislike
+        counters of the related dog(s) in step with the saved row"""
+        with transaction.atomic():
+            super(UserDog, self).save(*args, **kwargs)
+            if self._saved_dog_id not in (None, self.dog_id):
+                Dog.objects.filter(pk=self._saved_dog_id).adjust_counters(
+                    self._saved_status, None)
+                Dog.objects.filter(pk=self.dog_id).adjust_counters(
+                    None, self.status)
+            else:
+                Dog.objects.filter(pk=self.dog_id).adjust_counters(
+                    self._saved_status, self.status)
+        self._remember_saved_state()
+
 
 class UserPref(models.Model):
-    """Model representing each user's preferences of dog
+    """Model representing each user's preferences of dog. Each preference
+    is stored as a bitmask over the letters it may contain.
 
     Attributes:
         user {ForeignKey} -- owner (user) of these prefences
-        age {string} -- character [(b)aby, (y)oung, (a)dult, (s)enior]
-        representing preffered age of dog
-        gender {string} -- character [(m)ale, (f)emale] representing
-        preferred gender of dog
-        size {string} -- character(s)
-        [(s)mall, (m)edium, (l)arge, (xl) extra large] representing
-        preferred size of dog
+        age_mask {integer} -- bits of [(b)aby, (y)oung, (a)dult,
+        (s)enior] representing preffered ages of dog
+        gender_mask {integer} -- bits of [(m)ale, (f)emale] representing
+        preferred genders of dog
+        size_mask {integer} -- bits of [(s)mall, (m)edium, (l)arge,
+        (xl) extra large] representing preferred sizes of dog
+        version {integer} -- incremented on every save, validates cached
+        representations
     """
+    AGES = ('b', 'y', 'a', 's')
+    GENDERS = ('m', 'f')
+    SIZES = ('s', 'm', 'l', 'xl')
+
     user = models.OneToOneField(
         User, on_delete=models.CASCADE, related_name='prefs')
-    age = models.CharField(max_length=7, default='b,y,a,s')
-    gender = models.CharField(max_length=3, default='m,f')
-    size = models.CharField(max_length=8, default='s,m,l,xl')
+    age_mask = models.PositiveSmallIntegerField(
+        default=letters_to_mask(AGES, AGES))
+    gender_mask = models.PositiveSmallIntegerField(
+        default=letters_to_mask(GENDERS, GENDERS))
+    size_mask = models.PositiveSmallIntegerField(
+        default=letters_to_mask(SIZES, SIZES))
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     def __str__(self):
         return self.user.username + "'s" + " preferences"
 
+    @property
+    def etag(self):
+        """Return a validator that changes whenever the preferences do"""
+        return 'prefs-{}-{}'.format(self.user_id, self.version)
+
+    def save(self, *args, **kwargs):
+        """Overriding derived class method to bump the version"""
+        if self.pk is not None:
+            self.version += 1
+        super(UserPref, self).save(*args, **kwargs)
+
     @receiver(post_save, sender=User)
     def create_user_pref(sender, instance, created, **kwargs):
         """Listens for the creation of a user instance. If a user has
@@ -135,3 +531,12 @@ class UserPref(models.Model):
         """
         if created:
             UserPref.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=UserDog)
+def release_userdog_counter(sender, instance, **kwargs):
+    """Listens for the deletion of a UserDog instance (including bulk and
+    cascading deletes) and takes its tally off the dog's counter.
+    """
+    Dog.objects.filter(pk=instance._saved_dog_id).adjust_counters(
+        instance._saved_status, None)
@@ -0,0 +1,58 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import binascii
+
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination, _positive_int
+
+from .db import MAX_ID
+
+
+def encode_position(position):
+    """Return an opaque cursor standing for the dog id position"""
+    return urlsafe_b64encode(
+        'p={}'.format(position).encode('ascii')).decode('ascii')
+
+
+def decode_position(encoded):
+    """Return the dog id position of a cursor made by encode_position, or
+    -1 (before the first dog) when there is no cursor. Raises ValueError
+    for malformed cursors and positions no dog id can take.
+    """
+    if encoded is None:
+        return -1
+    try:
+        decoded = urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+    except (binascii.Error, UnicodeError):
+        raise ValueError("invalid cursor {!r}".format(encoded))
+    key, _, position = decoded.partition('=')
+    if key != 'p':
+        raise ValueError("invalid cursor {!r}".format(encoded))
+    position = int(position)
+    if not 0 <= position <= MAX_ID:
+        raise ValueError("invalid cursor {!r}".format(encoded))
+    return position
+
+
+class DogCursorPagination(CursorPagination):
+    """Keyset pagination over the primary key of dogs. Each page is a
+    single `id > cursor ORDER BY id LIMIT n` query, so paging deep into a
+    large catalog costs the same as fetching the first page.
+    """
+    ordering = 'id'
+    page_size = getattr(settings, 'DOG_PAGE_SIZE', 100)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'DOG_MAX_PAGE_SIZE', 500)
+
+    def get_page_size(self, request):
+        """Return the page size requested through page_size_query_param,
+        capped at max_page_size, falling back to the default page size
+        """
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
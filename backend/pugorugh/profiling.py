@@ -0,0 +1,131 @@
+"""Opt-in cProfile capture of single requests.
+
+A request is profiled when it carries a valid X-Profile header, a token
+signed with the SECRET_KEY that make_token() returns, or when it is
+drawn at PROFILE_SAMPLE_RATE. Its view, serialization and rendering run
+under cProfile and the stats are dumped to a .prof file in PROFILE_DIR,
+which keeps the latest PROFILE_KEEP files.
+"""
+import datetime as dt
+import os
+import pstats
+import random
+
+from django.conf import settings
+from django.core import signing
+
+HEADER = 'HTTP_X_PROFILE'
+
+SALT = 'pugorugh.profiling'
+
+# (category, predicate on the filename and name of a function); the
+# own time of a function goes to the first category that matches
+CATEGORIES = (
+    ('sql', lambda filename, function: (
+        filename == '~' and ('sqlite3' in function or
+                             'psycopg2' in function or
+                             'MySQLdb' in function)) or
+        '/sqlite3/' in filename or '/psycopg2/' in filename),
+    ('serialization', lambda filename, function: any(
+        part in filename for part in (
+            'rest_framework/serializers.py', 'rest_framework/fields.py',
+            'rest_framework/relations.py', 'rest_framework/renderers.py',
+            '/json/'))),
+    ('orm', lambda filename, function: 'django/db/' in filename),
+    ('drf', lambda filename, function: 'rest_framework/' in filename),
+    ('django', lambda filename, function: 'django/' in filename),
+    ('pugorugh', lambda filename, function: 'pugorugh/' in filename),
+    ('other', lambda filename, function: True),
+)
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILE_DIR', None) or os.path.join(
+        settings.BASE_DIR, 'profiles')
+
+
+def make_token():
+    """Return a value of the X-Profile header that profiles requests
+    until PROFILE_TOKEN_MAX_AGE seconds from now"""
+    return signing.dumps('profile', salt=SALT)
+
+
+def token_valid(value):
+    try:
+        return signing.loads(
+            value, salt=SALT,
+            max_age=getattr(settings, 'PROFILE_TOKEN_MAX_AGE', 3600)
+        ) == 'profile'
+    except signing.BadSignature:
+        return False
+
+
+def requested(request):
+    """Return whether request asked to be profiled with a valid token"""
+    value = request.META.get(HEADER)
+    return bool(value) and token_valid(value)
+
+
+def sampled():
+    rate = getattr(settings, 'PROFILE_SAMPLE_RATE', 0)
+    return rate > 0 and random.random() < rate
+
+
+def save(profile, url_name):
+    """Dump the stats of profile to a new file in PROFILE_DIR, drop the
+    oldest files over PROFILE_KEEP and return the new file's name"""
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    # names sort in the order the files were written
+    filename = '{:%Y%m%dT%H%M%S%f}-{}-{}.prof'.format(
+        dt.datetime.utcnow(), os.getpid(), url_name)
+    profile.dump_stats(os.path.join(directory, filename))
+    rotate(directory, getattr(settings, 'PROFILE_KEEP', 500))
+    return filename
+
+
+def rotate(directory, keep):
+    filenames = sorted(filename for filename in os.listdir(directory)
+                       if filename.endswith('.prof'))
+    for filename in filenames[:max(0, len(filenames) - keep)]:
+        try:
+            os.remove(os.path.join(directory, filename))
+        except OSError:
+            # removed by another process
+            pass
+
+
+def profile_files(directory=None, view=None):
+    """Return the paths of the .prof files in directory, oldest first,
+    only those of the URL name view when given"""
+    directory = directory or profile_dir()
+    if not os.path.isdir(directory):
+        return []
+    return [os.path.join(directory, filename)
+            for filename in sorted(os.listdir(directory))
+            if filename.endswith('.prof') and (
+                view is None or
+                filename[:-len('.prof')].split('-', 2)[-1] == view)]
+
+
+def merge(paths):
+    """Return the pstats.Stats of all the files of paths"""
+    stats = pstats.Stats(paths[0])
+    for path in paths[1:]:
+        stats.add(path)
+    return stats
+
+
+def breakdown(stats):
+    """Return (category, seconds) of the own time of the functions in
+    stats summed per category of CATEGORIES, in the order of CATEGORIES
+    """
+    totals = dict.fromkeys((category for category, _ in CATEGORIES), 0.0)
+    for (filename, _, function), (_, _, own_time, _, _) in \
+            stats.stats.items():
+        filename = filename.replace(os.sep, '/')
+        for category, matches in CATEGORIES:
+            if matches(filename, function):
+                totals[category] += own_time
+                break
+    return [(category, totals[category]) for category, _ in CATEGORIES]
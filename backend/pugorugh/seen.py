@@ -0,0 +1,201 @@
+"""Per-user sets of the dogs a user has decided on, kept in the
+SEEN_DOGS_CACHE cache so that the undecided feed skips decided dogs
+before fetching candidates, instead of anti-joining the whole catalog
+against UserDog.
+
+The sets are advisory. A set is built from UserDog the first time it is
+needed and then updated in place, without locking: by the swipe views
+after their set-based writes and by the signal receivers below after
+model saves and deletes. Decisions written by other processes with a
+per-process cache, by bulk writes or by racing swipes of one user can be
+missing, so the feed still checks the few candidates it fetches against
+UserDog; a dog decided on and made undecided elsewhere stays hidden
+until SEEN_DOGS_TTL expires.
+"""
+from array import array
+from bisect import bisect_left
+import struct
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .metrics import metrics
+from .models import UserDog
+
+# dog ids per chunk; a chunk is stored as the sorted offsets of its ids
+# while that is smaller than its bitmap
+CHUNK_BITS = 4096
+BITMAP_BYTES = CHUNK_BITS // 8
+MAX_OFFSETS = BITMAP_BYTES // array('H').itemsize - 1
+
+# header of a pickled chunk: its key and its number of offsets, BITMAP
+# for a bitmap
+CHUNK_HEADER = struct.Struct('<IH')
+BITMAP = 0xffff
+
+
+class SeenDogs(object):
+    """Compact set of dog ids, split into chunks of CHUNK_BITS ids held
+    as an array of offsets when sparse and as a bitmap when dense, so a
+    user who decided on a few hundred dogs takes a few KB whatever the
+    size of the catalog
+    """
+    def __init__(self, dog_ids=()):
+        self.chunks = {}
+        for dog_id in dog_ids:
+            self.add(dog_id)
+
+    def __reduce__(self):
+        # one bytes object pickles with far less overhead than a dict of
+        # arrays, and an empty set must unpickle too
+        return (SeenDogs.from_bytes, (self.to_bytes(),))
+
+    def to_bytes(self):
+        packed = bytearray()
+        for key, chunk in sorted(self.chunks.items()):
+            if isinstance(chunk, bytearray):
+                packed += CHUNK_HEADER.pack(key, BITMAP) + chunk
+            else:
+                packed += CHUNK_HEADER.pack(key, len(chunk)) + \
+                    chunk.tobytes()
+        return bytes(packed)
+
+    @classmethod
+    def from_bytes(cls, packed):
+        dogs = cls()
+        position = 0
+        while position < len(packed):
+            key, length = CHUNK_HEADER.unpack_from(packed, position)
+            position += CHUNK_HEADER.size
+            if length == BITMAP:
+                dogs.chunks[key] = bytearray(
+                    packed[position:position + BITMAP_BYTES])
+                position += BITMAP_BYTES
+            else:
+                chunk = dogs.chunks[key] = array('H')
+                chunk.frombytes(
+                    packed[position:position + length * chunk.itemsize])
+                position += length * chunk.itemsize
+        return dogs
+
+    def __contains__(self, dog_id):
+        chunk = self.chunks.get(dog_id // CHUNK_BITS)
+        if chunk is None:
+            return False
+        offset = dog_id % CHUNK_BITS
+        if isinstance(chunk, bytearray):
+            return bool(chunk[offset >> 3] & (1 << (offset & 7)))
+        index = bisect_left(chunk, offset)
+        return index < len(chunk) and chunk[index] == offset
+
+    def __len__(self):
+        return sum(
+            sum(bin(byte).count('1') for byte in chunk)
+            if isinstance(chunk, bytearray) else len(chunk)
+            for chunk in self.chunks.values())
+
+    def add(self, dog_id):
+        key, offset = divmod(dog_id, CHUNK_BITS)
+        chunk = self.chunks.setdefault(key, array('H'))
+        if isinstance(chunk, bytearray):
+            chunk[offset >> 3] |= 1 << (offset & 7)
+            return
+        index = bisect_left(chunk, offset)
+        if index < len(chunk) and chunk[index] == offset:
+            return
+        chunk.insert(index, offset)
+        if len(chunk) > MAX_OFFSETS:
+            bitmap = bytearray(BITMAP_BYTES)
+            for offset in chunk:
+                bitmap[offset >> 3] |= 1 << (offset & 7)
+            self.chunks[key] = bitmap
+
+    def discard(self, dog_id):
+        key, offset = divmod(dog_id, CHUNK_BITS)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return
+        if isinstance(chunk, bytearray):
+            chunk[offset >> 3] &= ~(1 << (offset & 7))
+            return
+        index = bisect_left(chunk, offset)
+        if index < len(chunk) and chunk[index] == offset:
+            del chunk[index]
+            if not chunk:
+                del self.chunks[key]
+
+
+def _cache():
+    return caches[getattr(settings, 'SEEN_DOGS_CACHE', 'default')]
+
+
+def _key(user_id):
+    return 'pugorugh:seen-dogs:{}'.format(user_id)
+
+
+def _store(user_id, seen):
+    _cache().set(_key(user_id), seen,
+                 getattr(settings, 'SEEN_DOGS_TTL', 24 * 60 * 60))
+
+
+def seen_dogs(user_id):
+    """Return the SeenDogs of the user, built from UserDog when it isn't
+    cached"""
+    seen = _cache().get(_key(user_id))
+    metrics.count_cache('seen-dogs', seen is not None)
+    if seen is None:
+        seen = SeenDogs(UserDog.objects.filter(
+            user_id=user_id).values_list('dog_id', flat=True))
+        _store(user_id, seen)
+    return seen
+
+
+def record(user_id, decisions):
+    """Apply decisions, a dict of dog id to status, None standing for
+    undecided, to the cached set of the user, if any. Concurrent records
+    for one user can lose each other's changes, see above."""
+    seen = _cache().get(_key(user_id))
+    if seen is None:
+        return
+    for dog_id, status in decisions.items():
+        if status is None:
+            seen.discard(dog_id)
+        else:
+            seen.add(dog_id)
+    _store(user_id, seen)
+
+
+def forget(user_ids):
+    """Drop the cached sets of the users, e.g. after bulk writes"""
+    _cache().delete_many([_key(user_id) for user_id in user_ids])
+
+
+@receiver(post_save, sender=User)
+def start_new_user(sender, instance, created, **kwargs):
+    """Listens for new users, who have decided on nothing yet"""
+    if created:
+        _store(instance.pk, SeenDogs())
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(sender, instance, **kwargs):
+    forget([instance.pk])
+
+
+@receiver(post_save, sender=UserDog)
+def record_saved_userdog(sender, instance, **kwargs):
+    """Listens for saved UserDog rows, which the set-based writes of
+    UserDogQuerySet don't send, and records the decision"""
+    decisions = {instance.dog_id: instance.status}
+    if instance._saved_dog_id not in (None, instance.dog_id):
+        # the row moved to another dog
+        decisions[instance._saved_dog_id] = None
+    record(instance.user_id, decisions)
+
+
+@receiver(post_delete, sender=UserDog)
+def record_deleted_userdog(sender, instance, **kwargs):
+    record(instance.user_id, {instance.dog_id: None})
@@ -0,0 +1,241 @@
+"""In-process index of the catalog by preference segment.
+
+A segment is an (age category, gender, size) combination and holds the
+sorted ids of its dogs, so the dogs after an id across the segments a
+user's preferences admit are a k-way merge of the lists, each entered by
+binary search. The undecided feed takes its candidates from the index,
+skips those in the user's SeenDogs and only fetches the chosen dogs by
+primary key, leaving out the dogs the user has a UserDog row for and
+checking them against the preferences again, so that an index or a
+seen set that is behind can skip dogs but never serve one the user
+decided on or doesn't prefer.
+
+The index follows the dogs saved and deleted in this process. It is
+rebuilt on the first lookup of a day, as the age categories move with
+the date, and in the background every SEGMENT_INDEX_TTL seconds, to
+pick up the dogs other processes or bulk writes changed; call
+segment_index.clear() after bulk writes.
+"""
+from bisect import bisect_right
+import datetime as dt
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import DAYS_PER_MONTH, Dog, UserPref, age_to_letter, \
+    mask_to_letters
+from .seen import seen_dogs
+from .serializers import dog_rows
+
+logger = logging.getLogger(__name__)
+
+
+def segment_of(gender, size, birthday, today):
+    """Return the segment of a dog, its age category being None when its
+    birthday is unknown"""
+    letter = None
+    if birthday is not None:
+        letter = age_to_letter((today - birthday).days / DAYS_PER_MONTH)
+    return (letter, gender, size)
+
+
+def admits(prefs):
+    """Return a predicate on segments mirroring DogQuerySet.preferred_by:
+    a preference admitting every value of its column admits any value"""
+    allowed = []
+    for mask, choices, values in (
+        (prefs.age_mask, UserPref.AGES, UserPref.AGES),
+        (prefs.gender_mask, UserPref.GENDERS,
+         [value for value, _ in Dog.GENDER]),
+        (prefs.size_mask, UserPref.SIZES, [value for value, _ in Dog.SIZE]),
+    ):
+        letters = set(mask_to_letters(mask, choices))
+        allowed.append(None if letters == set(values) else letters)
+
+    def predicate(segment):
+        return all(letters is None or value in letters
+                   for letters, value in zip(allowed, segment))
+    return predicate
+
+
+class SegmentIndex(object):
+    """Sorted dog ids per segment. Lists are replaced, never modified,
+    so lookups read them without locking.
+
+    One thread at a time builds the index. When the TTL expires, lookups
+    keep reading the stale index while a background thread rebuilds it;
+    on a new day they wait for the rebuild, as the age categories moved.
+    The saves and deletes made during a build are replayed onto the new
+    index, and a clear() during a build discards it.
+    """
+    def __init__(self, ttl):
+        self.ttl = ttl
+        # guards the state, the journal and the generation
+        self._lock = threading.Lock()
+        # held by the thread building the index
+        self._building = threading.Lock()
+        self._state = None
+        # changes made during a build, as (pk, (gender, size, birthday))
+        # or (pk, None) for a removal
+        self._journal = None
+        self._generation = 0
+
+    def _build(self, today):
+        ids, segments = {}, {}
+        for pk, gender, size, birthday in Dog.objects.order_by(
+                'pk').values_list('pk', 'gender', 'size', 'birthday'):
+            segment = segment_of(gender, size, birthday, today)
+            ids.setdefault(segment, []).append(pk)
+            segments[pk] = segment
+        return {'today': today, 'expires': time.monotonic() + self.ttl,
+                'ids': ids, 'segments': segments}
+
+    def _rebuild(self, today):
+        """Build the index of today, swap it in unless cleared meanwhile
+        and return it; the caller holds _building"""
+        with self._lock:
+            self._journal = []
+            generation = self._generation
+        try:
+            state = self._build(today)
+        except Exception:
+            with self._lock:
+                self._journal = None
+            raise
+        with self._lock:
+            for pk, fields in self._journal:
+                self._apply(state, pk, fields)
+            self._journal = None
+            if generation == self._generation:
+                self._state = state
+        return state
+
+    def _rebuild_in_background(self, today):
+        try:
+            self._rebuild(today)
+        except Exception:
+            # the stale index keeps serving, the next lookup retries
+            logger.exception("Rebuilding the segment index failed")
+        finally:
+            self._building.release()
+            connections.close_all()
+
+    def _current(self):
+        state = self._state
+        today = dt.date.today()
+        if state is not None and state['today'] == today:
+            if state['expires'] < time.monotonic() and \
+                    self._building.acquire(blocking=False):
+                threading.Thread(target=self._rebuild_in_background,
+                                 args=(today,), daemon=True).start()
+            return state
+        with self._building:
+            state = self._state
+            if state is None or state['today'] != today:
+                state = self._rebuild(today)
+        return state
+
+    def following(self, prefs, pk):
+        """Iterate over the ids of the dogs admitted by prefs that come
+        after pk, then wrapping around to the lowest ids up to pk"""
+        state = self._current()
+        predicate = admits(prefs)
+        lists = [ids for segment, ids in list(state['ids'].items())
+                 if predicate(segment)]
+        starts = [bisect_right(ids, pk) for ids in lists]
+        return itertools.chain(
+            heapq.merge(*(map(ids.__getitem__, range(start, len(ids)))
+                          for ids, start in zip(lists, starts))),
+            heapq.merge(*(map(ids.__getitem__, range(start))
+                          for ids, start in zip(lists, starts))))
+
+    def update(self, dog):
+        """Move a saved dog to its segment"""
+        self._change(dog.pk, (dog.gender, dog.size, dog.birthday))
+
+    def remove(self, pk):
+        self._change(pk, None)
+
+    def _change(self, pk, fields):
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((pk, fields))
+            if self._state is not None:
+                self._apply(self._state, pk, fields)
+
+    def _apply(self, state, pk, fields):
+        segment = state['segments'].pop(pk, None)
+        if segment is not None:
+            state['ids'][segment] = [
+                other for other in state['ids'][segment] if other != pk]
+        if fields is not None:
+            segment = segment_of(*fields, today=state['today'])
+            ids = list(state['ids'].get(segment, ()))
+            ids.insert(bisect_right(ids, pk), pk)
+            state['ids'][segment] = ids
+            state['segments'][pk] = segment
+
+    def refresh(self):
+        """Rebuild the index now"""
+        with self._building:
+            self._rebuild(dt.date.today())
+
+    def clear(self):
+        """Rebuild the index on the next lookup, discarding any build in
+        progress"""
+        with self._lock:
+            self._state = None
+            self._generation += 1
+
+
+segment_index = SegmentIndex(
+    ttl=getattr(settings, 'SEGMENT_INDEX_TTL', 60))
+
+
+def next_undecided(user, pk, count=1):
+    """Return up to count dogs admitted by the user's preferences and not
+    yet decided by the user that come after pk in id order, wrapping
+    around to the lowest ids, as rows of dog_rows
+    """
+    seen = seen_dogs(user.id)
+    predicate = admits(user.prefs)
+    today = dt.date.today()
+    candidates = (candidate for candidate
+                  in segment_index.following(user.prefs, pk)
+                  if candidate not in seen)
+    dogs = []
+    while len(dogs) < count:
+        batch = list(itertools.islice(candidates, count - len(dogs)))
+        if not batch:
+            break
+        # the seen set is only a pre-filter: decisions it missed, e.g.
+        # those written by other processes, are probed for in UserDog
+        fetched = {dog.pk: dog for dog in dog_rows.rows(
+            Dog.objects.filter(pk__in=batch).exclude(
+                userdog__user_id=user.id))}
+        # dogs decided, deleted or changed since the index and the seen
+        # set saw them are left out
+        dogs += [fetched[candidate] for candidate in batch
+                 if candidate in fetched and predicate(segment_of(
+                     fetched[candidate].gender, fetched[candidate].size,
+                     fetched[candidate].birthday, today))]
+    return dogs
+
+
+@receiver(post_save, sender=Dog)
+def index_saved_dog(sender, instance, **kwargs):
+    """Listens for saved dogs and moves them to their segment"""
+    segment_index.update(instance)
+
+
+@receiver(post_delete, sender=Dog)
+def unindex_deleted_dog(sender, instance, **kwargs):
+    """Listens for deleted dogs and drops them from the index"""
+    segment_index.remove(instance.pk)
@@ -1,8 +1,45 @@
+from collections import OrderedDict, namedtuple
+import copy
+import datetime as dt
+from operator import attrgetter
+
 from django.contrib.auth import get_user_model
+from django.db.models.query import ValuesListIterable
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from .db import MAX_ID
+from .images import variant_urls
+from .models import (Dog, UserPref, UserDog, letters_to_mask,
+                     mask_to_letters)
+
+
+class LetterMaskField(serializers.Field):
+    """Field that exposes a bitmask over choices as the comma separated
+    letters it contains, e.g. 's,m,xl'
+    """
+    default_error_messages = {
+        'blank': 'This field may not be blank.',
+        'invalid_choice': '"{letter}" is not a valid choice.',
+    }
 
-from rest_framework import serializers
+    def __init__(self, choices, **kwargs):
+        self.choices = choices
+        super(LetterMaskField, self).__init__(**kwargs)
 
-from .models import Dog, UserPref, UserDog
+    def to_representation(self, value):
+        return ','.join(mask_to_letters(value, self.choices))
+
+    def to_internal_value(self, data):
+        letters = [letter.strip() for letter in str(data).split(',')
+                   if letter.strip()]
+        if not letters:
+            self.fail('blank')
+        for letter in letters:
+            if letter not in self.choices:
+                self.fail('invalid_choice', letter=letter)
+        return letters_to_mask(letters, self.choices)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -27,6 +64,9 @@ class DogSerializer(serializers.ModelSerializer):
     """Serialzer that encodes and decodes each field of the Dog
     model
     """
+    likes = serializers.IntegerField(source='likes_count', read_only=True)
+    images = serializers.SerializerMethodField()
+
     class Meta:
         model = Dog
         fields = [
@@ -40,7 +80,156 @@ class DogSerializer(serializers.ModelSerializer):
             'birthday',
             'likes',
             'joined',
+            'images',
+        ]
+
+    def get_images(self, dog):
+        """Returns the urls of the resized variants of the dog's photo"""
+        return variant_urls(dog.image_filename)
+
+
+class RowIterable(ValuesListIterable):
+    """Iterable of a values_list() queryset that yields row_class
+    instances instead of plain tuples"""
+    row_class = None
+
+    def __iter__(self):
+        return map(self.row_class._make,
+                   super(RowIterable, self).__iter__())
+
+
+class ValuesPlan(object):
+    """Read-only fast path of a ModelSerializer. The columns its fields
+    read are fetched with values_list() as light named rows, and a plan
+    compiled once from the fields maps a row to the serializer's
+    representation, without model instances or a get_attribute call per
+    field.
+
+    Fields that represent a database value as the value itself copy it,
+    ISO dates are formatted directly and any other field keeps its
+    to_representation; method fields get the whole row. extra names the
+    further columns callers read, e.g. annotated counts, and properties
+    the model properties the rows share.
+    """
+    def __init__(self, serializer_class, extra=(), properties=()):
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        columns = [model._meta.pk.attname]
+        self.plan = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.SerializerMethodField):
+                self.plan.append(
+                    (field.field_name, None, field.to_representation))
+                continue
+            assert '.' not in field.source and field.source != '*', (
+                'ValuesPlan cannot read the source {!r} of {}.{}'.format(
+                    field.source, serializer_class.__name__,
+                    field.field_name))
+            if field.source not in columns:
+                columns.append(field.source)
+            self.plan.append((field.field_name, attrgetter(field.source),
+                              self.converter(field)))
+        columns += [column for column in extra if column not in columns]
+        self.columns = tuple(columns)
+
+        attrs = {'__slots__': (),
+                 'pk': property(attrgetter(model._meta.pk.attname))}
+        attrs.update((name, getattr(model, name)) for name in properties)
+        base = namedtuple(model.__name__ + 'Row', self.columns)
+        self.row_class = type(base.__name__, (base,), attrs)
+        self.iterable_class = type(
+            base.__name__ + 'Iterable', (RowIterable,),
+            {'row_class': self.row_class})
+
+    @staticmethod
+    def converter(field):
+        """Return the function representing a non-null database value of
+        the field, None when the value represents itself"""
+        if isinstance(field, (serializers.CharField,
+                              serializers.IntegerField)):
+            return None
+        if isinstance(field, serializers.ChoiceField) and all(
+                isinstance(choice, str) for choice in field.choices):
+            return None
+        if isinstance(field, serializers.DateField) and getattr(
+                field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+            return dt.date.isoformat
+        return field.to_representation
+
+    def only(self, field_names):
+        """Return a copy of the plan representing only the named fields,
+        in the serializer's order. Raises ValueError for unknown names.
+        """
+        unknown = set(field_names) - {name for name, _, _ in self.plan}
+        if unknown:
+            raise ValueError('unknown fields {}'.format(
+                ', '.join(sorted(unknown))))
+        plan = copy.copy(self)
+        plan.plan = [entry for entry in self.plan if entry[0] in field_names]
+        return plan
+
+    def rows(self, queryset):
+        """Return the queryset yielding rows of the plan's columns instead
+        of model instances"""
+        rows = queryset.values_list(*self.columns)
+        rows._iterable_class = self.iterable_class
+        return rows
+
+    def to_representation(self, row):
+        """Return the serializer's representation of a row, or of a model
+        instance"""
+        ret = OrderedDict()
+        for name, get, convert in self.plan:
+            value = row if get is None else get(row)
+            if value is not None and convert is not None:
+                value = convert(value)
+            ret[name] = value
+        return ret
+
+
+# the dogs read by the feeds and listings; the version and etag serve the
+# fragment cache and conditional requests
+dog_rows = ValuesPlan(DogSerializer, extra=('version',),
+                      properties=('etag',))
+
+
+class DogFilterSerializer(serializers.Serializer):
+    """Serializer that validates the query parameters filtering dog
+    listings. Gender and size take comma separated letters, ages are in
+    months and ranges include both of their bounds
+    """
+    breed = serializers.CharField(required=False)
+    gender = LetterMaskField([value for value, _ in Dog.GENDER],
+                             required=False)
+    size = LetterMaskField([value for value, _ in Dog.SIZE], required=False)
+    min_age = serializers.IntegerField(min_value=0, required=False)
+    max_age = serializers.IntegerField(min_value=0, required=False)
+    min_joined = serializers.DateField(required=False)
+    max_joined = serializers.DateField(required=False)
+
+
+class DogImportSerializer(serializers.ModelSerializer):
+    """Serializer that validates one dog of a catalog feed. The unique
+    fields are not checked against the table, as the import updates the
+    dogs it already knows instead of rejecting them
+    """
+    class Meta:
+        model = Dog
+        fields = [
+            'name',
+            'image_filename',
+            'breed',
+            'age',
+            'gender',
+            'size',
+            'birthday',
         ]
+        extra_kwargs = {
+            'name': {'validators': []},
+            'image_filename': {'validators': []},
+        }
 
 
 class UserDogSerializer(serializers.ModelSerializer):
@@ -56,10 +245,23 @@ class UserDogSerializer(serializers.ModelSerializer):
         ]
 
 
+class DecisionSerializer(serializers.Serializer):
+    """Serializer that validates one decision of a user about a dog in
+    a bulk submission
+    """
+    dog = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+    status = serializers.ChoiceField(
+        choices=['liked', 'disliked', 'undecided'])
+
+
 class UserPrefSerializer(serializers.ModelSerializer):
     """Serializer that encodes and decodes each field of the UserPref
     model
     """
+    age = LetterMaskField(UserPref.AGES, source='age_mask')
+    gender = LetterMaskField(UserPref.GENDERS, source='gender_mask')
+    size = LetterMaskField(UserPref.SIZES, source='size_mask')
+
     class Meta:
         model = UserPref
         fields = [
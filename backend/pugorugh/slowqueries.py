@@ -0,0 +1,210 @@
+"""Log of the statements slower than SLOW_QUERY_THRESHOLD_MS.
+
+Slow statements are grouped by fingerprint, their SQL with the literals
+and parameters replaced by ?, and counted with the URL names of the
+views that issued them. The query plan of the first SELECT seen of a
+fingerprint is captured with EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+the other databases.
+
+Each process keeps the SLOW_QUERY_LOG_SIZE fingerprints seen last and
+saves them to its own file in SLOW_QUERY_DIR at the end of each request,
+at most every SLOW_QUERY_FLUSH_SECONDS outside of requests and on exit,
+so that load() can merge the logs of every process.
+"""
+from collections import Counter, OrderedDict
+import atexit
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+
+from . import instrumentation
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+
+_LITERALS = re.compile(r"""
+    '(?:[^']|'')*'                      # strings
+    | \b\d+(?:\.\d+)?\b                 # numbers
+    | %s | \?                           # parameters
+""", re.VERBOSE)
+
+_LISTS = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+
+
+def fingerprint(sql):
+    """Return sql with its literals, parameters and IN lists replaced by
+    ? and its whitespace collapsed"""
+    sql = _LITERALS.sub('?', sql)
+    sql = _LISTS.sub('(...)', sql)
+    return ' '.join(sql.split())
+
+
+def log_dir():
+    return getattr(settings, 'SLOW_QUERY_DIR', None) or os.path.join(
+        settings.BASE_DIR, 'slow-queries')
+
+
+def explain(connection, sql, params):
+    """Return the lines of the query plan of sql, None when the
+    database can't explain it"""
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None:
+        return None
+    # in a savepoint so that a failed EXPLAIN doesn't break the
+    # transaction of the request on PostgreSQL
+    try:
+        with instrumentation.paused(), \
+                transaction.atomic(using=connection.alias), \
+                connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            rows = cursor.fetchall()
+    except DatabaseError:
+        return None
+    # the detail is the last column on SQLite, the only one on PostgreSQL
+    return [str(row[-1]) if connection.vendor == 'sqlite'
+            else ' '.join(str(column) for column in row) for row in rows]
+
+
+class SlowQueryLog(object):
+    """The slow statements of the current process, by fingerprint, the
+    one seen last at the end
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._dirty = False
+        self._saved = time.time()
+
+    def observe(self, connection, sql, params, duration):
+        """Query observer logging the statements over the threshold"""
+        threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 100)
+        if threshold is None or duration * 1000 < threshold:
+            return
+        key = fingerprint(sql)
+        with self._lock:
+            needs_plan = key not in self._entries
+        plan = None
+        if needs_plan and sql.lstrip()[:6].upper() == 'SELECT':
+            plan = explain(connection, sql, params)
+        self.add(key, sql, instrumentation.current_view(), duration, plan)
+        # requests flush at their end, other statements once in a while
+        interval = getattr(settings, 'SLOW_QUERY_FLUSH_SECONDS', 5)
+        if instrumentation.current_view() is None and \
+                time.time() - self._saved >= interval:
+            self.flush()
+
+    def add(self, key, sql, view, duration, plan=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                entry = {
+                    'id': hashlib.md5(key.encode('utf-8')).hexdigest()[:12],
+                    'fingerprint': key,
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'views': {},
+                    'plan': plan,
+                }
+            self._entries[key] = entry
+            entry['count'] += 1
+            entry['total_ms'] += duration * 1000
+            entry['max_ms'] = max(entry['max_ms'], duration * 1000)
+            entry['last_sql'] = sql
+            entry['last_seen'] = time.time()
+            view = view or '-'
+            entry['views'][view] = entry['views'].get(view, 0) + 1
+            self._dirty = True
+            if entry['plan'] is None:
+                entry['plan'] = plan
+            size = getattr(settings, 'SLOW_QUERY_LOG_SIZE', 100)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+
+    def entries(self):
+        with self._lock:
+            return [dict(entry, views=dict(entry['views']))
+                    for entry in self._entries.values()]
+
+    def flush(self):
+        """Save the entries if they changed since they were saved last"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, False
+        if dirty:
+            self.save()
+
+    def save(self):
+        """Write the entries to the file of this process"""
+        self._saved = time.time()
+        directory = log_dir()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory,
+                            'slow-queries-{}.json'.format(os.getpid()))
+        with open(path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(self.entries(), file)
+        os.replace(path + '.tmp', path)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = False
+
+
+slow_query_log = SlowQueryLog()
+instrumentation.query_observers.append(slow_query_log.observe)
+atexit.register(slow_query_log.flush)
+
+
+def load(directory=None):
+    """Return the entries of the logs of all processes merged by
+    fingerprint, the slowest in total first"""
+    slow_query_log.flush()
+    directory = directory or log_dir()
+    merged = {}
+    filenames = os.listdir(directory) if os.path.isdir(directory) else []
+    for filename in filenames:
+        if not filename.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, filename),
+                      encoding='utf-8') as file:
+                entries = json.load(file)
+        except (OSError, ValueError):
+            continue
+        for entry in entries:
+            total = merged.get(entry['fingerprint'])
+            if total is None:
+                merged[entry['fingerprint']] = dict(
+                    entry, views=Counter(entry['views']))
+                continue
+            total['count'] += entry['count']
+            total['total_ms'] += entry['total_ms']
+            total['max_ms'] = max(total['max_ms'], entry['max_ms'])
+            total['views'].update(entry['views'])
+            total['plan'] = total['plan'] or entry['plan']
+            if entry['last_seen'] > total['last_seen']:
+                total['last_sql'] = entry['last_sql']
+                total['last_seen'] = entry['last_seen']
+    return sorted((dict(entry, views=dict(entry['views']))
+                   for entry in merged.values()),
+                  key=lambda entry: entry['total_ms'], reverse=True)
+
+
+def clear(directory=None):
+    """Forget the slow statements of this process and of the logs of all
+    processes"""
+    slow_query_log.clear()
+    directory = directory or log_dir()
+    if os.path.isdir(directory):
+        for filename in os.listdir(directory):
+            if filename.startswith('slow-queries-'):
+                os.remove(os.path.join(directory, filename))
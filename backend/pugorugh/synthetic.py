@@ -0,0 +1,175 @@
+"""Synthetic users, preferences, dogs and decisions for scale testing.
+
+Rows are inserted with multi-row INSERTs and explicit ids, bypassing
+model saves, signals and password hashing: every user shares one
+password hashed once. The same seed always generates the same data.
+
+The data is skewed the way real usage is: a few breeds make up most of
+the catalog, preferences follow a handful of common mixes, a few users
+make most of the decisions, most users dislike more than they like and
+the dogs early in the catalog collect most of the decisions.
+"""
+import datetime as dt
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import fragments, seen
+from .db import insert
+from .models import (DAYS_PER_MONTH, Dog, UserDog, UserPref,
+                     letters_to_mask)
+from .segments import segment_index
+
+PASSWORD = 'synthetic'
+
+BREEDS = (
+    'Labrador', 'French Bulldog', 'German Shepherd', 'Golden Retriever',
+    'Bulldog', 'Poodle', 'Beagle', 'Rottweiler', 'Dachshund', 'Pug',
+    'Boxer', 'Husky', 'Corgi', 'Chihuahua', 'Shih Tzu', 'Mixed',
+)
+
+NAMES = (
+    'Bella', 'Max', 'Luna', 'Charlie', 'Lucy', 'Cooper', 'Daisy', 'Milo',
+    'Sadie', 'Rocky', 'Molly', 'Bear', 'Zoe', 'Tucker', 'Hank', 'Muffin',
+)
+
+# (weight, ages, genders, sizes) of the common preference mixes
+PREFERENCE_MIXES = (
+    (40, 'byas', 'mf', ('s', 'm', 'l', 'xl')),
+    (20, 'by', 'mf', ('s', 'm', 'l', 'xl')),
+    (15, 'bya', 'mf', ('s', 'm')),
+    (10, 'as', 'mf', ('m', 'l', 'xl')),
+    (10, 'bya', 'f', ('s', 'm', 'l')),
+    (5, 'byas', 'm', ('l', 'xl')),
+)
+
+# (weight, value) of the dog columns
+GENDERS = ((48, 'm'), (48, 'f'), (4, 'u'))
+SIZES = ((30, 's'), (35, 'm'), (25, 'l'), (10, 'xl'))
+
+
+def _weighted(rng, choices):
+    total = sum(weight for weight, _ in choices)
+    point = rng.random() * total
+    for weight, value in choices:
+        point -= weight
+        if point < 0:
+            return value
+    return choices[-1][1]
+
+
+def _next_id(model):
+    return (model.objects.aggregate(Max('pk'))['pk__max'] or 0) + 1
+
+
+def generate_dogs(count, rng, today=None):
+    """Insert count dogs and return their ids"""
+    today = today or dt.date.today()
+    first = _next_id(Dog)
+    # breed popularity falls off with its rank
+    breeds = [(1 / rank, breed) for rank, breed in enumerate(BREEDS, 1)]
+
+    def rows():
+        for pk in range(first, first + count):
+            # most dogs on offer are young
+            age = min(180, int(rng.expovariate(1 / 30)) + 1)
+            yield (pk, '{} {}'.format(rng.choice(NAMES), pk),
+                   'synthetic-{}.jpg'.format(pk), _weighted(rng, breeds),
+                   age, _weighted(rng, GENDERS), _weighted(rng, SIZES),
+                   today - dt.timedelta(days=age * DAYS_PER_MONTH), today,
+                   0, 0, 1)
+
+    insert(Dog, ('id', 'name', 'image_filename', 'breed', 'age', 'gender',
+                 'size', 'birthday', 'joined', 'likes_count',
+                 'dislikes_count', 'version'), rows())
+    return range(first, first + count)
+
+
+def generate_users(count, rng):
+    """Insert count users, all with PASSWORD, and their preferences, and
+    return their ids
+    """
+    first = _next_id(User)
+    password = make_password(PASSWORD)
+    # insert() writes the values as given, prepare the aware datetime the
+    # way a save would (UTC without tzinfo on SQLite)
+    now = User._meta.get_field('date_joined').get_db_prep_value(
+        timezone.now(), connection)
+    insert(User, ('id', 'username', 'password', 'first_name', 'last_name',
+                  'email', 'is_superuser', 'is_staff', 'is_active',
+                  'date_joined'), (
+        (pk, 'synthetic{}'.format(pk), password, '', '', '', False, False,
+         True, now)
+        for pk in range(first, first + count)
+    ))
+    mixes = [(weight, mix) for weight, *mix in PREFERENCE_MIXES]
+
+    def prefs():
+        pk = _next_id(UserPref)
+        for user_id in range(first, first + count):
+            ages, genders, sizes = _weighted(rng, mixes)
+            yield (pk, user_id,
+                   letters_to_mask(ages, UserPref.AGES),
+                   letters_to_mask(genders, UserPref.GENDERS),
+                   letters_to_mask(sizes, UserPref.SIZES), 1)
+            pk += 1
+
+    insert(UserPref, ('id', 'user', 'age_mask', 'gender_mask', 'size_mask',
+                      'version'), prefs())
+    return range(first, first + count)
+
+
+def generate_decisions(user_ids, dog_ids, mean, rng):
+    """Insert about mean UserDog rows per user and return how many were
+    inserted. Activity per user is heavy tailed, the share of likes of
+    each user is drawn around 30% and popular dogs are decided on more.
+    """
+    first = _next_id(UserDog)
+    dog_count = len(dog_ids)
+    # a Pareto distribution with shape 2 has mean 2
+    scale = mean / 2
+
+    def rows():
+        pk = first
+        for user_id in user_ids:
+            decisions = min(dog_count,
+                            max(1, int(rng.paretovariate(2) * scale)))
+            like_share = rng.betavariate(2, 5)
+            decided = set()
+            while len(decided) < decisions:
+                # squaring skews the picks to the start of the catalog
+                decided.add(dog_ids[int(dog_count * rng.random() ** 2)])
+            for dog_id in sorted(decided):
+                yield (pk, user_id, dog_id,
+                       'l' if rng.random() < like_share else 'd')
+                pk += 1
+
+    return insert(UserDog, ('id', 'user', 'dog', 'status'), rows())
+
+
+def generate(dogs, users, decisions, seed=0):
+    """Generate dogs, users with preferences and about decisions UserDog
+    rows per user, then rebuild the dogs' counters. Returns a dict of
+    the number of rows inserted per model name.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        dog_ids = generate_dogs(dogs, rng)
+        user_ids = generate_users(users, rng)
+        userdogs = generate_decisions(
+            user_ids, dog_ids, decisions, rng) if dog_ids else 0
+        Dog.objects.rebuild_counters(dog_ids)
+        # explicit ids leave sequences behind on some databases
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Dog, User, UserPref, UserDog]):
+                cursor.execute(sql)
+    segment_index.clear()
+    seen.forget(user_ids)
+    fragments.forget(dog_ids)
+    return {'dogs': dogs, 'users': users, 'userdogs': userdogs}
@@ -0,0 +1,34 @@
+import os
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Runs the tests with the metrics, the slow query log and the
+    profiles writing their files into a temporary directory, deleted
+    after the run, instead of the directories of the deployment
+    """
+    def setup_test_environment(self, **kwargs):
+        super(TestRunner, self).setup_test_environment(**kwargs)
+        from pugorugh.metrics import metrics
+
+        self.files_dir = tempfile.mkdtemp(prefix='pugorugh-tests-')
+        self.files_settings = override_settings(**{
+            setting: os.path.join(self.files_dir, name)
+            for setting, name in (('METRICS_DIR', 'metrics'),
+                                  ('SLOW_QUERY_DIR', 'slow-queries'),
+                                  ('PROFILE_DIR', 'profiles'))
+        })
+        self.files_settings.enable()
+        metrics.reset()
+
+    def teardown_test_environment(self, **kwargs):
+        from pugorugh.metrics import metrics
+
+        self.files_settings.disable()
+        metrics.reset()
+        shutil.rmtree(self.files_dir, ignore_errors=True)
+        super(TestRunner, self).teardown_test_environment(**kwargs)
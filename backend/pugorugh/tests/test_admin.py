@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from pugorugh.admin import EstimatedCountPaginator
+from pugorugh.models import Dog, UserDog
+
+
+class AdminTestCases(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            'admin', 'admin@email.com', 'password')
+        self.client.force_login(self.admin)
+
+    def create_rows(self, first, count):
+        for number in range(first, first + count):
+            user = User.objects.create(username="user{}".format(number))
+            dog = Dog.objects.create(
+                name="Dog{}".format(number),
+                image_filename="dog{}.jpg".format(number),
+                age=number,
+                gender='f',
+                size='s',
+            )
+            UserDog.objects.create(user=user, dog=dog, status='l')
+
+    def changelist_queries(self, url):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured)
+
+    def assertNoQueriesPerRow(self, url):
+        self.create_rows(0, 2)
+        queries = self.changelist_queries(url)
+        self.create_rows(2, 5)
+        self.assertEqual(self.changelist_queries(url), queries)
+
+    def test_dog_changelist(self):
+        self.assertNoQueriesPerRow('/admin/pugorugh/dog/?gender__exact=f')
+
+    def test_userdog_changelist(self):
+        self.assertNoQueriesPerRow('/admin/pugorugh/userdog/?status__exact=l')
+
+    def test_userpref_changelist(self):
+        self.assertNoQueriesPerRow('/admin/pugorugh/userpref/')
+
+    def test_estimated_count(self):
+        self.create_rows(0, 3)
+        paginator = EstimatedCountPaginator(UserDog.objects.all(), 100)
+        paginator.ESTIMATE_OVER = 0
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            # the estimate stands until the next ANALYZE
+            UserDog.objects.all()[0].delete()
+            self.assertEqual(paginator.count, 3)
+        # filtered changelists are counted
+        self.assertEqual(EstimatedCountPaginator(
+            UserDog.objects.filter(status='l'), 100).count,
+            UserDog.objects.filter(status='l').count())
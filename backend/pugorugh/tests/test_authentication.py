@@ -0,0 +1,114 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pugorugh.authentication import PrincipalCache, principal_cache
+from pugorugh.models import Dog, UserPref
+
+
+class CachedTokenAuthenticationTestCases(TestCase):
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        self.token = Token.objects.create(user=self.user)
+        Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        principal_cache.clear()
+        self.apiclient = APIClient()
+        self.apiclient.credentials(
+            HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def get_next_undecided(self):
+        return self.apiclient.get(
+            '/api/dog/-1/undecided/next/',
+            format='json'
+        )
+
+    def test_token_user_and_prefs_in_one_query(self):
+        # one query for the principal, one for the dog
+        with self.assertNumQueries(2):
+            response = self.get_next_undecided()
+        self.assertEqual(response.status_code, 200)
+
+    def test_cached_principal(self):
+        self.get_next_undecided()
+        with self.assertNumQueries(1):
+            response = self.get_next_undecided()
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_token(self):
+        self.get_next_undecided()
+        self.token.delete()
+        response = self.get_next_undecided()
+        self.assertEqual(response.status_code, 401)
+
+    def test_deactivated_user(self):
+        self.get_next_undecided()
+        self.user.is_active = False
+        self.user.save()
+        response = self.get_next_undecided()
+        self.assertEqual(response.status_code, 401)
+
+    def test_updated_prefs(self):
+        self.assertEqual(self.get_next_undecided().status_code, 200)
+        self.apiclient.put(
+            '/api/user/preferences/',
+            data={"age": "b", "gender": "m", "size": "s"},
+            format='json'
+        )
+        self.assertEqual(self.get_next_undecided().status_code, 404)
+
+    def test_prefs_updated_by_another_process(self):
+        self.assertEqual(self.get_next_undecided().status_code, 200)
+        prefs = UserPref.objects.get(user=self.user)
+        prefs.size_mask = 0b1000
+        prefs.save()
+        # the other process's receiver dropped its own principals only
+        principal_cache.set(self.token.key, (self.user, self.token))
+        self.user.prefs.version = prefs.version - 1
+        self.assertEqual(self.get_next_undecided().status_code, 404)
+        # the reloaded principal is cached again
+        self.assertEqual(
+            principal_cache.get(self.token.key)[0].prefs.version,
+            prefs.version)
+
+
+class PrincipalCacheTestCases(TestCase):
+    def setUp(self):
+        self.users = [User(pk=pk, username=str(pk)) for pk in range(3)]
+
+    def test_least_recently_used_evicted(self):
+        cache = PrincipalCache(maxsize=2, ttl=60)
+        cache.set('a', (self.users[0], None))
+        cache.set('b', (self.users[1], None))
+        cache.get('a')
+        cache.set('c', (self.users[2], None))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a')[0].pk, 0)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_expired(self):
+        cache = PrincipalCache(maxsize=2, ttl=-1)
+        cache.set('a', (self.users[0], None))
+        self.assertIsNone(cache.get('a'))
+
+    def test_discard_user(self):
+        cache = PrincipalCache(maxsize=5, ttl=60)
+        cache.set('a', (self.users[0], None))
+        cache.set('b', (self.users[0], None))
+        cache.set('c', (self.users[1], None))
+        cache.discard_user(0)
+        self.assertIsNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
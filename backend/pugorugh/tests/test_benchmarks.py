@@ -0,0 +1,49 @@
+from django.test import TestCase, TransactionTestCase
+
+from pugorugh import benchmarks, synthetic
+from pugorugh.management.commands.benchmark import DEFAULT_BUDGETS
+
+
+class BenchmarkTestCases(TransactionTestCase):
+    # transactions commit as they do outside tests, so the counts match
+    # those of the benchmark command
+    def setUp(self):
+        synthetic.generate(dogs=60, users=5, decisions=10)
+
+    def test_cases_within_query_budgets(self):
+        results = benchmarks.run(repeat=2, warmup=1)
+        self.assertEqual(set(results),
+                         {case[0] for case in benchmarks.CASES})
+        for name, result in results.items():
+            self.assertTrue(
+                all(200 <= status < 300 for status in result['statuses']),
+                "{} answered {}".format(name, result['statuses']))
+        # latency depends on the machine, query counts do not
+        budgets = {
+            name: {'queries': limits['queries']}
+            for name, limits in benchmarks.load(DEFAULT_BUDGETS).items()
+        }
+        self.assertEqual(benchmarks.check_budgets(results, budgets), [])
+
+
+class BenchmarkCheckTestCases(TestCase):
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmarks.percentile(values, 50), 50)
+        self.assertEqual(benchmarks.percentile(values, 99), 99)
+        self.assertEqual(benchmarks.percentile([7], 95), 7)
+
+    def test_check_budgets(self):
+        results = {'a': {'queries': 3, 'p95_ms': 10.0}}
+        self.assertEqual(
+            benchmarks.check_budgets(results, {'a': {'queries': 3}}), [])
+        self.assertEqual(
+            benchmarks.check_budgets(results, {'a': {'p95_ms': 5}}),
+            ["a: p95_ms is 10.0, over its budget of 5"])
+
+    def test_compare(self):
+        baseline = {'a': {'queries': 2, 'p95_ms': 10.0}}
+        self.assertEqual(benchmarks.compare(
+            {'a': {'queries': 2, 'p95_ms': 11.0}}, baseline), [])
+        self.assertEqual(len(benchmarks.compare(
+            {'a': {'queries': 3, 'p95_ms': 13.0}}, baseline)), 2)
@@ -0,0 +1,108 @@
+import io
+import json
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from pugorugh import catalog
+from pugorugh.catalog import CatalogImport, iter_records
+from pugorugh.models import Dog
+
+FEED = [
+    {"name": "Francesca", "image_filename": "1.jpg", "breed": "Labrador",
+     "age": 72, "gender": "f", "size": "l"},
+    {"name": "Hank", "image_filename": "2.jpg", "breed": "French Bulldog",
+     "age": 14, "gender": "m", "size": "s"},
+    {"name": "Muffin", "image_filename": "3.jpg", "age": 24, "gender": "f",
+     "size": "xl", "birthday": "2018-01-01"},
+]
+
+
+class IterRecordsTestCases(TestCase):
+    def test_json_array(self):
+        with mock.patch.object(catalog, 'READ_SIZE', 7):
+            records = list(iter_records(io.StringIO(json.dumps(FEED))))
+        self.assertEqual(records, FEED)
+
+    def test_ndjson(self):
+        feed = "\n".join(json.dumps(record) for record in FEED) + "\n"
+        with mock.patch.object(catalog, 'READ_SIZE', 5):
+            records = list(iter_records(io.StringIO(feed)))
+        self.assertEqual(records, FEED)
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            list(iter_records(io.StringIO(json.dumps(FEED)[:-10])))
+
+
+class CatalogImportTestCases(TestCase):
+    def run_import(self, feed, **kwargs):
+        importer = CatalogImport(batch_size=2, **kwargs)
+        importer.run(iter(feed))
+        return importer
+
+    def test_creates_dogs(self):
+        importer = self.run_import(FEED)
+        self.assertEqual(importer.stats['created'], 3)
+        hank = Dog.objects.get(name="Hank")
+        self.assertEqual(hank.age_letter, 'y')
+        self.assertIsNotNone(hank.birthday)
+        self.assertEqual(Dog.objects.get(name="Muffin").breed, 'unknown')
+
+    def test_reimport_writes_nothing(self):
+        self.run_import(FEED)
+        with self.assertNumQueries(4):
+            # a select of the stored dogs and of the taken image
+            # filenames per batch
+            importer = self.run_import(FEED)
+        self.assertEqual(importer.stats['unchanged'], 3)
+        self.assertEqual(
+            set(Dog.objects.values_list('version', flat=True)), {1})
+
+    def test_updates_changed_dogs(self):
+        self.run_import(FEED)
+        hank = Dog.objects.get(name="Hank")
+        Dog.objects.filter(pk=hank.pk).update(likes_count=3)
+        feed = [dict(FEED[1], age=30)]
+        importer = self.run_import(feed)
+        self.assertEqual(importer.stats['updated'], 1)
+        hank = Dog.objects.get(name="Hank")
+        self.assertEqual((hank.age, hank.age_letter), (30, 'a'))
+        self.assertEqual(hank.version, 2)
+        self.assertEqual(hank.likes_count, 3)
+
+    def test_invalid_records(self):
+        feed = [
+            FEED[0],
+            dict(FEED[1], gender="x"),
+            dict(FEED[2], image_filename="1.jpg"),
+        ]
+        importer = self.run_import(feed)
+        self.assertEqual(importer.stats['created'], 1)
+        self.assertEqual(importer.stats['invalid'], 2)
+        self.assertEqual([number for number, _ in importer.errors], [2, 3])
+        self.assertIn('image_filename', importer.errors[1][1])
+
+    def test_match_on_image_filename(self):
+        self.run_import(FEED)
+        self.run_import([dict(FEED[0], name="Frankie")],
+                        key='image_filename')
+        self.assertEqual(
+            Dog.objects.get(image_filename="1.jpg").name, "Frankie")
+
+    def test_prune(self):
+        self.run_import(FEED)
+        importer = self.run_import(FEED[:2])
+        importer.prune()
+        self.assertEqual(importer.stats['deleted'], 1)
+        self.assertFalse(Dog.objects.filter(name="Muffin").exists())
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('import_dogs', stdout=out)
+        call_command('import_dogs', stdout=out)
+        count = Dog.objects.count()
+        self.assertTrue(count)
+        self.assertIn("Done: {0} read, {0} unchanged".format(count),
+                      out.getvalue())
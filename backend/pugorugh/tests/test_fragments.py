@@ -0,0 +1,141 @@
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.test import TestCase
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from pugorugh import fragments, images
+from pugorugh.fragments import FragmentJSONRenderer, render_dog, \
+    render_dogs
+from pugorugh.models import Dog
+from pugorugh.segments import segment_index
+from pugorugh.serializers import DogSerializer
+
+
+class FragmentTestCases(TestCase):
+    def setUp(self):
+        fragments._cache().clear()
+        self.dog = Dog.objects.create(
+            name="Zo\u00eb\u2028",
+            image_filename="zoe.jpg",
+            breed="Pug",
+            age=10,
+            gender="f",
+            size="s",
+            likes_count=3,
+        )
+
+    def test_same_bytes_as_json_renderer(self):
+        expected = JSONRenderer().render(DogSerializer(self.dog).data)
+        self.assertEqual(render_dog(self.dog).encoded, expected)
+        # the cached parts give the same bytes
+        self.assertEqual(render_dog(self.dog).encoded, expected)
+
+    def test_reads_like_a_dict(self):
+        fragment = render_dog(self.dog)
+        self.assertEqual(fragment, DogSerializer(self.dog).data)
+        self.assertEqual(fragment['likes'], 3)
+
+    def test_likes_spliced_without_serializing(self):
+        render_dog(self.dog)
+        self.dog.likes_count = 12
+        with mock.patch.object(DogSerializer, 'to_representation') as \
+                to_representation, self.assertNumQueries(0):
+            fragment = render_dog(self.dog)
+        to_representation.assert_not_called()
+        self.assertEqual(fragment['likes'], 12)
+
+    def test_save_and_delete_drop_fragments(self):
+        render_dog(self.dog)
+        self.dog.name = "Zoe"
+        self.dog.save()
+        self.assertEqual(render_dog(self.dog)['name'], "Zoe")
+        key = fragments._key(self.dog.pk, self.dog.version)
+        self.assertIsNotNone(fragments._cache().get(key))
+        self.dog.delete()
+        self.assertIsNone(fragments._cache().get(key))
+
+    def test_new_version_reads_new_manifest(self):
+        derived_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, derived_dir)
+        patcher = mock.patch.object(images, 'DERIVED_DIR', derived_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        images._manifest_cache.reset()
+        self.addCleanup(images._manifest_cache.reset)
+        self.assertEqual(render_dog(self.dog)['images'], {})
+        # what build_dog_images does, well within CHECK_INTERVAL
+        images.write_manifest({'zoe.jpg': {'card': 'zoe-1234.jpg'}})
+        Dog.objects.filter(pk=self.dog.pk).update(version=F('version') + 1)
+        self.dog.refresh_from_db()
+        self.assertEqual(render_dog(self.dog)['images'],
+                         {'card': images.DERIVED_URL + 'zoe-1234.jpg'})
+
+    def test_renderer_joins_fragments(self):
+        other = Dog.objects.create(name="Rex", image_filename="rex.jpg",
+                                   age=40, gender="m", size="l")
+        data = {'next': None, 'results': render_dogs([self.dog, other])}
+        self.assertEqual(
+            FragmentJSONRenderer().render(data),
+            JSONRenderer().render({
+                'next': None,
+                'results': DogSerializer([self.dog, other], many=True).data,
+            }))
+
+    def test_renderer_honors_indent(self):
+        data = {'next': None, 'results': render_dogs([self.dog])}
+        expected = JSONRenderer().render({
+            'next': None,
+            'results': DogSerializer([self.dog], many=True).data,
+        }, 'application/json; indent=2')
+        self.assertIn(b'\n  "results"', expected)
+        self.assertEqual(FragmentJSONRenderer().render(
+            data, 'application/json; indent=2'), expected)
+        self.assertEqual(
+            FragmentJSONRenderer().render(data, None, {'indent': 2}),
+            expected)
+
+
+class FragmentViewTestCases(TestCase):
+    def setUp(self):
+        fragments._cache().clear()
+        self.user = User.objects.create(username="sparky")
+        for number in range(1, 4):
+            Dog.objects.create(
+                name="Dog{}".format(number),
+                image_filename="dog{}.jpg".format(number),
+                age=10,
+                gender="f",
+                size="s",
+            )
+        segment_index.refresh()
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+
+    def test_list_and_queue(self):
+        listed = json.loads(self.apiclient.get('/api/dog/').content.decode())
+        self.assertEqual(
+            listed['results'],
+            json.loads(JSONRenderer().render(DogSerializer(
+                Dog.objects.order_by('pk'), many=True).data).decode()))
+        queue = json.loads(self.apiclient.get(
+            '/api/dog/undecided/queue/').content.decode())
+        self.assertEqual(queue['results'], listed['results'])
+
+    def test_indented_list(self):
+        response = self.apiclient.get(
+            '/api/dog/', HTTP_ACCEPT='application/json; indent=4')
+        self.assertIn(b'\n    "results"', response.content)
+        self.assertEqual(len(json.loads(
+            response.content.decode())['results']), 3)
+
+    def test_swipe_responds_with_new_likes(self):
+        self.apiclient.get('/api/dog/-1/undecided/next/')
+        response = self.apiclient.put('/api/dog/1/liked/')
+        self.assertEqual(json.loads(response.content.decode())['likes'], 1)
@@ -0,0 +1,72 @@
+from io import StringIO
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from pugorugh import images
+from pugorugh.models import Dog
+from pugorugh.serializers import DogSerializer
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@unittest.skipIf(Image is None, "building dog images requires Pillow")
+class BuildDogImagesTestCases(TestCase):
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.derived_dir = os.path.join(self.source_dir, 'derived')
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        Image.new('RGB', (1200, 800), 'brown').save(
+            os.path.join(self.source_dir, 'dog1.jpg'))
+        self.dog = Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        for name, value in [('SOURCE_DIR', self.source_dir),
+                            ('DERIVED_DIR', self.derived_dir)]:
+            patcher = mock.patch.object(images, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(images._manifest_cache.reset)
+
+    def test_build_catalog(self):
+        built, failed = images.build_catalog(
+            ['dog1.jpg', 'missing.jpg'], processes=1)
+        self.assertEqual(set(built['dog1.jpg']), set(images.VARIANTS))
+        self.assertEqual(list(failed), ['missing.jpg'])
+        self.assertEqual(images.read_manifest(), built)
+        for variant, longest_side in images.VARIANTS.items():
+            path = os.path.join(self.derived_dir, built['dog1.jpg'][variant])
+            with Image.open(path) as image:
+                self.assertEqual(max(image.size), longest_side)
+
+    def test_unchanged_photo_keeps_names(self):
+        first, _ = images.build_catalog(['dog1.jpg'], processes=1)
+        second, _ = images.build_catalog(['dog1.jpg'], processes=1)
+        self.assertEqual(first, second)
+
+    def test_command_bumps_version(self):
+        out = StringIO()
+        call_command('build_dog_images', processes=1, stdout=out)
+        self.assertEqual(out.getvalue(), "Built variants of 1 photo(s).\n")
+        self.dog.refresh_from_db()
+        self.assertEqual(self.dog.version, 2)
+
+    def test_serializer_images(self):
+        self.assertEqual(DogSerializer(self.dog).data['images'], {})
+        built, _ = images.build_catalog(['dog1.jpg'], processes=1)
+        self.assertEqual(
+            DogSerializer(self.dog).data['images']['card'],
+            images.DERIVED_URL + built['dog1.jpg']['card'])
@@ -0,0 +1,65 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from pugorugh import instrumentation
+from pugorugh.models import Dog
+from pugorugh.segments import segment_index
+
+
+class InstrumentationTestCases(TestCase):
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        instrumentation.request_totals.clear()
+        # built here so that the requests don't build it
+        segment_index.refresh()
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+
+    def test_collecting_without_debug(self):
+        with instrumentation.collecting() as outer:
+            with instrumentation.collecting() as inner:
+                list(Dog.objects.all())
+            Dog.objects.count()
+        self.assertEqual((inner.queries, outer.queries), (1, 2))
+        self.assertGreater(outer.sql_time, inner.sql_time)
+
+    def test_query_observers(self):
+        seen = []
+        instrumentation.query_observers.append(
+            lambda connection, sql, params, duration: seen.append(sql))
+        self.addCleanup(instrumentation.query_observers.pop)
+        Dog.objects.count()
+        self.assertEqual(len(seen), 1)
+        self.assertIn('COUNT', seen[0])
+
+    def test_server_timing_header(self):
+        response = self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(
+            response['Server-Timing'],
+            r'^sql;dur=[\d.]+;desc="1 queries", view;dur=[\d.]+, '
+            r'total;dur=[\d.]+$')
+
+    def test_request_totals_by_url_name(self):
+        self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.apiclient.get('/api/nowhere/')
+        totals = instrumentation.request_totals.snapshot()
+        self.assertEqual(totals['next-dog']['requests'], 2)
+        self.assertEqual(totals['next-dog']['queries'], 2)
+        self.assertEqual(totals['next-dog']['max_queries'], 1)
+        self.assertEqual(totals['unresolved']['requests'], 1)
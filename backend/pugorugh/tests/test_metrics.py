@@ -0,0 +1,144 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pugorugh.authentication import principal_cache
+from pugorugh.metrics import metrics
+from pugorugh.models import Dog
+from pugorugh.segments import segment_index
+
+
+class MetricsTestCases(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(METRICS_DIR=directory,
+                                     METRICS_TOKEN='secret')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        self.directory = directory
+
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        principal_cache.clear()
+        # built here so that the requests don't build it
+        segment_index.refresh()
+        self.apiclient = APIClient()
+        self.apiclient.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+                user=self.user).key)
+
+    def scrape(self):
+        response = APIClient().get('/api/metrics/',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'],
+                         'text/plain; version=0.0.4')
+        return response.content.decode('utf-8').splitlines()
+
+    def test_request_histograms(self):
+        self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.apiclient.get('/api/dog/-1/liked/next/')
+        lines = self.scrape()
+        self.assertIn('pugorugh_http_requests_total'
+                      '{view="next-dog",status="200"} 1', lines)
+        self.assertIn('pugorugh_http_requests_total'
+                      '{view="next-dog",status="404"} 1', lines)
+        self.assertIn('pugorugh_http_request_duration_seconds_bucket'
+                      '{view="next-dog",status="200",le="+Inf"} 1', lines)
+        self.assertIn('pugorugh_db_queries_total{view="next-dog"} 3', lines)
+
+    def test_cache_and_swipes(self):
+        self.apiclient.put('/api/dog/1/liked/')
+        self.apiclient.post('/api/dog/decisions/',
+                            [{"dog": 1, "status": "disliked"}],
+                            format='json')
+        lines = self.scrape()
+        self.assertIn('pugorugh_cache_requests_total'
+                      '{cache="principal",result="miss"} 1', lines)
+        self.assertIn('pugorugh_cache_requests_total'
+                      '{cache="principal",result="hit"} 1', lines)
+        self.assertIn('pugorugh_cache_hit_ratio{cache="principal"} 0.5',
+                      lines)
+        self.assertIn('pugorugh_swipes_total{status="liked"} 1', lines)
+        self.assertIn('pugorugh_swipes_total{status="disliked"} 1', lines)
+
+    def test_dog_caches(self):
+        self.apiclient.get('/api/dog/')
+        self.apiclient.get('/api/dog/')
+        self.apiclient.get('/api/dog/-1/undecided/next/')
+        lines = self.scrape()
+        self.assertIn('pugorugh_cache_requests_total'
+                      '{cache="dog-fragments",result="hit"} 2', lines)
+        self.assertIn('pugorugh_cache_hit_ratio{cache="dog-fragments"} '
+                      '0.6666666666666666', lines)
+        self.assertIn('pugorugh_cache_requests_total'
+                      '{cache="seen-dogs",result="hit"} 1', lines)
+
+    def test_sums_other_processes(self):
+        metrics.count_swipes('liked', 2)
+        # another worker process's file
+        shutil.copy(
+            os.path.join(self.directory,
+                         'metrics-{}.bin'.format(os.getpid())),
+            os.path.join(self.directory, 'metrics-1.bin'))
+        with open(os.path.join(self.directory, 'metrics-2.bin'), 'wb') as file:
+            file.write(b'not a metrics file')
+        self.assertIn('pugorugh_swipes_total{status="liked"} 4',
+                      self.scrape())
+
+    def test_archives_exited_processes(self):
+        metrics.count_swipes('liked', 2)
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        exited = os.path.join(self.directory,
+                              'metrics-{}.bin'.format(process.pid))
+        shutil.copy(os.path.join(self.directory,
+                                 'metrics-{}.bin'.format(os.getpid())),
+                    exited)
+        for _ in range(2):
+            self.assertIn('pugorugh_swipes_total{status="liked"} 4',
+                          self.scrape())
+        self.assertFalse(os.path.exists(exited))
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if name.endswith('.bin')),
+            ['metrics-{}.bin'.format(os.getpid()), 'metrics-exited.bin'])
+
+    def test_token(self):
+        apiclient = APIClient()
+        self.assertEqual(apiclient.get('/api/metrics/').status_code, 401)
+        response = apiclient.get(
+            '/api/metrics/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_staff_only_without_token(self):
+        apiclient = APIClient()
+        self.assertEqual(apiclient.get('/api/metrics/').status_code, 403)
+        apiclient.force_login(self.user)
+        self.assertEqual(apiclient.get('/api/metrics/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(apiclient.get('/api/metrics/').status_code, 200)
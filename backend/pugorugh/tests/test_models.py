@@ -1,8 +1,14 @@
+import datetime as dt
+from io import StringIO
+from unittest import mock
+
 from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.db import IntegrityError
 from django.test import TestCase
 
-from pugorugh.models import Dog, UserDog, UserPref
+from pugorugh import db
+from pugorugh.models import Dog, UserDog, UserPref, birthday_in_ages
 
 
 class DogTestCases(TestCase):
@@ -66,6 +72,43 @@ class DogTestCases(TestCase):
         dog = Dog.objects.get(id=1)
         self.assertRegex(str(dog.likes), r'\d+')
 
+    def test_dog_likes_property_is_stored(self):
+        dog = Dog.objects.get(id=1)
+        with self.assertNumQueries(0):
+            self.assertEqual(dog.likes, 1)
+
+    def test_counters_follow_userdog_saves(self):
+        self.assertEqual(Dog.objects.get(id=1).likes_count, 1)
+        self.assertEqual(Dog.objects.get(id=2).dislikes_count, 1)
+        userdog = UserDog.objects.get(dog_id=2)
+        userdog.status = "l"
+        userdog.save()
+        dog = Dog.objects.get(id=2)
+        self.assertEqual((dog.likes_count, dog.dislikes_count), (1, 0))
+        userdog.save()
+        dog = Dog.objects.get(id=2)
+        self.assertEqual((dog.likes_count, dog.dislikes_count), (1, 0))
+
+    def test_counters_follow_userdog_deletes(self):
+        UserDog.objects.get(dog_id=1).delete()
+        self.assertEqual(Dog.objects.get(id=1).likes_count, 0)
+        UserDog.objects.all().delete()
+        self.assertEqual(Dog.objects.get(id=2).dislikes_count, 0)
+
+    def test_rebuild_counters(self):
+        Dog.objects.update(likes_count=7, dislikes_count=7)
+        self.assertEqual(Dog.objects.rebuild_counters([1]), 1)
+        dog = Dog.objects.get(id=1)
+        self.assertEqual((dog.likes_count, dog.dislikes_count), (1, 0))
+        out = StringIO()
+        call_command('rebuild_dog_counters', stdout=out)
+        self.assertEqual(out.getvalue(), "Rebuilt counters of 3 dog(s).\n")
+        self.assertEqual(
+            list(Dog.objects.order_by('pk').values_list(
+                'likes_count', 'dislikes_count')),
+            [(1, 0), (0, 1), (0, 0)]
+        )
+
     def test_dog_age_letter_update(self):
         dog = Dog.objects.get(id=1)
         self.assertEqual(dog.age_letter, "y")
@@ -82,6 +125,37 @@ class DogTestCases(TestCase):
         dog.save()
         self.assertEqual(dog.age_letter, "b")
 
+    def test_dog_given_birthday_kept(self):
+        dog = Dog.objects.get(id=1)
+        dog.age = 30
+        dog.birthday = dt.date.today() - dt.timedelta(days=100)
+        dog.save()
+        self.assertEqual(dog.age_letter, "b")
+
+    def test_dogs_age_without_saves(self):
+        prefs = User.objects.get(username="sparky").prefs
+        prefs.age_mask = 2  # young
+        today = dt.date.today()
+        young = Dog.objects.preferred_by(prefs, today=today)
+        self.assertEqual(
+            sorted(young.values_list('name', flat=True)), ["Dog1", "Dog3"])
+        # Dog3, 15 months today, is an adult five months on
+        later = Dog.objects.preferred_by(
+            prefs, today=today + dt.timedelta(days=5 * 28))
+        self.assertEqual(list(later.values_list('name', flat=True)), ["Dog1"])
+        prefs.age_mask = 4  # adult
+        later = Dog.objects.preferred_by(
+            prefs, today=today + dt.timedelta(days=5 * 28))
+        self.assertEqual(
+            sorted(later.values_list('name', flat=True)), ["Dog2", "Dog3"])
+
+    def test_adjacent_ages_one_range(self):
+        today = dt.date(2020, 1, 1)
+        for letters, comparisons in [('by', 1), ('ya', 2), ('bs', 2)]:
+            sql = str(Dog.objects.filter(
+                birthday_in_ages(letters, today)).query)
+            self.assertEqual(sql.count('"birthday" '), comparisons)
+
 
 class UserDogTestCases(TestCase):
     def setUp(self):
@@ -139,6 +213,23 @@ class UserDogTestCases(TestCase):
         with self.assertRaises(IntegrityError):
             duplicate_userdog.save()
 
+    def test_delete_rows_counts_without_signals(self):
+        # guards the private QuerySet._raw_delete() across upgrades
+        self.assertEqual(UserDog.objects.all()._delete_rows(), 2)
+        self.assertEqual(Dog.objects.get(name="Dog1").likes_count, 1)
+
+    def test_set_status_without_upsert(self):
+        # SQLite before 3.24 has no ON CONFLICT clause
+        with mock.patch.object(db.sqlite3, 'sqlite_version_info',
+                               (3, 23, 1)):
+            self.assertFalse(db.supports_upsert())
+            user = User.objects.get(username="sparky")
+            dog = Dog.objects.get(name="Dog3")
+            self.assertIsNone(UserDog.objects.set_status(user.pk, dog.pk, 'l'))
+            self.assertEqual(
+                UserDog.objects.set_status(user.pk, dog.pk, 'l'), 'l')
+        self.assertEqual(Dog.objects.get(pk=dog.pk).likes_count, 1)
+
 
 class UserPrefTestCases(TestCase):
     def setUp(self):
@@ -0,0 +1,81 @@
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pugorugh import profiling
+from pugorugh.models import Dog
+
+
+class ProfilingTestCases(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(PROFILE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.directory = directory
+
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        self.apiclient = APIClient()
+        self.apiclient.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+                user=self.user).key)
+
+    def test_signed_header(self):
+        response = self.apiclient.get('/api/dog/-1/undecided/next/',
+                                      HTTP_X_PROFILE=profiling.make_token())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(os.listdir(self.directory),
+                         [response['X-Profile-File']])
+        self.assertTrue(response['X-Profile-File'].endswith('-next-dog.prof'))
+
+        response = self.apiclient.get('/api/dog/-1/undecided/next/',
+                                      HTTP_X_PROFILE='profile')
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+
+    def test_sampling(self):
+        self.apiclient.get('/api/dog/1/')
+        self.assertEqual(os.listdir(self.directory), [])
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            response = self.apiclient.get('/api/dog/1/')
+        # sampled profiles are not announced to the client
+        self.assertNotIn('X-Profile-File', response)
+        self.assertEqual(len(profiling.profile_files(view='delete-dog')), 1)
+
+    def test_rotation(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1, PROFILE_KEEP=2):
+            for _ in range(3):
+                self.apiclient.get('/api/dog/1/')
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_report(self):
+        with self.settings(PROFILE_SAMPLE_RATE=1):
+            self.apiclient.get('/api/dog/1/')
+            self.apiclient.get('/api/dog/-1/undecided/next/')
+        out = StringIO()
+        call_command('profile_report', view='next-dog', limit=5, stdout=out)
+        report = out.getvalue()
+        self.assertIn('1 profile(s)', report)
+        for category in ('sql', 'serialization', 'orm', 'drf'):
+            self.assertIn('\n' + category + ' ', report)
+        self.assertIn('views.py', report)
@@ -0,0 +1,103 @@
+from itertools import combinations
+import unittest
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from pugorugh.models import Dog, UserDog
+from pugorugh.segments import segment_index
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     "query plans are checked with SQLite's EXPLAIN")
+class QueryPlanTestCases(TestCase):
+    """Runs the swipe endpoints and the filtered dog listings and fails
+    when SQLite plans any of their queries as a full table scan
+    """
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        for number, (gender, size) in enumerate(
+                [('f', 's'), ('m', 'l'), ('f', 'm'), ('m', 'xl')]):
+            Dog.objects.create(
+                name="Dog{}".format(number),
+                image_filename="dog{}.jpg".format(number),
+                age=10 * number,
+                gender=gender,
+                size=size,
+            )
+        UserDog.objects.create(user=self.user, dog_id=1, status="l")
+        UserDog.objects.create(user=self.user, dog_id=2, status="d")
+        # the index is built by a full scan outside of requests
+        segment_index.refresh()
+        self.apiclient = APIClient()
+
+    def assertNoFullScans(self, method, url, data=None):
+        # authenticate with a fresh user so preferences are reloaded
+        self.apiclient.force_authenticate(
+            user=User.objects.get(id=self.user.id))
+        with CaptureQueriesContext(connection) as captured:
+            getattr(self.apiclient, method)(url, data, format='json')
+        selects = [query['sql'] for query in captured.captured_queries
+                   if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        with connection.cursor() as cursor:
+            for sql in selects:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                details = [row[-1] for row in cursor.fetchall()]
+                scans = [detail for detail in details
+                         if detail.startswith('SCAN')]
+                self.assertFalse(
+                    scans, "{}\nis planned as:\n{}".format(
+                        sql, "\n".join(details)))
+
+    def test_next_liked(self):
+        self.assertNoFullScans('get', '/api/dog/-1/liked/next/')
+
+    def test_next_disliked(self):
+        self.assertNoFullScans('get', '/api/dog/2/disliked/next/')
+
+    def test_next_undecided(self):
+        self.assertNoFullScans('get', '/api/dog/-1/undecided/next/')
+
+    def test_next_undecided_narrow_preferences(self):
+        self.apiclient.force_authenticate(user=self.user)
+        self.apiclient.put(
+            '/api/user/preferences/',
+            data={"age": "b,y", "gender": "m", "size": "xl"},
+            format='json'
+        )
+        self.assertNoFullScans('get', '/api/dog/3/undecided/next/')
+
+    def test_dog_list_filters(self):
+        groups = (
+            {'breed': 'unknown'},
+            {'gender': 'f'},
+            {'gender': 'm,f'},
+            {'size': 's'},
+            {'size': 's,m'},
+            {'min_age': 9},
+            {'max_age': 84},
+            {'min_joined': '2020-01-01', 'max_joined': '2030-01-01'},
+        )
+        for length in range(1, len(groups) + 1):
+            for combination in combinations(groups, length):
+                params = {'page_size': 1}
+                for group in combination:
+                    params.update(group)
+                if len(params) != 1 + sum(map(len, combination)):
+                    # both variants of one filter
+                    continue
+                with self.subTest(**params):
+                    self.assertNoFullScans('get', '/api/dog/', params)
+                    # the pages after the first one too
+                    response = self.apiclient.get('/api/dog/', params)
+                    if response.data['next']:
+                        self.assertNoFullScans('get', response.data['next'])
@@ -0,0 +1,102 @@
+import pickle
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from pugorugh import seen
+from pugorugh.models import Dog, UserDog
+from pugorugh.seen import SeenDogs, seen_dogs
+from pugorugh.segments import segment_index
+
+
+class SeenDogsTestCases(TestCase):
+    def test_set_operations(self):
+        dogs = SeenDogs([5, 4100, 5])
+        self.assertEqual(len(dogs), 2)
+        self.assertIn(4100, dogs)
+        self.assertNotIn(4, dogs)
+        dogs.discard(5)
+        self.assertNotIn(5, dogs)
+        self.assertEqual(list(dogs.chunks), [1])
+        self.assertEqual(pickle.loads(pickle.dumps(SeenDogs())).chunks, {})
+
+    def test_dense_chunks_become_bitmaps(self):
+        dogs = SeenDogs(range(0, 2000, 2))
+        self.assertIsInstance(dogs.chunks[0], bytearray)
+        self.assertEqual(len(dogs), 1000)
+        self.assertIn(1998, dogs)
+        self.assertNotIn(1999, dogs)
+        dogs.discard(1998)
+        self.assertNotIn(1998, dogs)
+        self.assertEqual(pickle.loads(pickle.dumps(dogs)).chunks,
+                         dogs.chunks)
+
+    def test_compact(self):
+        # 500 decisions spread over a catalog of a million dogs
+        dogs = SeenDogs(range(7, 1000000, 2000))
+        packed = pickle.dumps(dogs)
+        self.assertLess(len(packed), 4096)
+        self.assertEqual(pickle.loads(packed).chunks, dogs.chunks)
+
+
+class SeenDogsCacheTestCases(TestCase):
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        for number in range(1, 5):
+            Dog.objects.create(
+                name="Dog{}".format(number),
+                image_filename="dog{}.jpg".format(number),
+                age=10,
+                gender="f",
+                size="s",
+            )
+        UserDog.objects.create(user=self.user, dog_id=1, status="l")
+        segment_index.refresh()
+        self.apiclient = APIClient()
+        self.apiclient.force_authenticate(user=self.user)
+
+    def test_built_lazily(self):
+        seen.forget([self.user.id])
+        with self.assertNumQueries(1):
+            self.assertIn(1, seen_dogs(self.user.id))
+        with self.assertNumQueries(0):
+            self.assertNotIn(2, seen_dogs(self.user.id))
+
+    def test_kept_up_to_date(self):
+        self.apiclient.put('/api/dog/2/liked/')
+        self.assertIn(2, seen_dogs(self.user.id))
+        self.apiclient.put('/api/dog/1/undecided/')
+        self.assertNotIn(1, seen_dogs(self.user.id))
+        self.apiclient.post('/api/dog/decisions/', [
+            {"dog": 3, "status": "disliked"},
+            {"dog": 2, "status": "undecided"},
+        ], format='json')
+        self.assertIn(3, seen_dogs(self.user.id))
+        self.assertNotIn(2, seen_dogs(self.user.id))
+        Dog.objects.get(pk=3).delete()
+        self.assertNotIn(3, seen_dogs(self.user.id))
+
+    def test_next_undecided_probes_only_candidates(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.assertEqual(response.data['id'], 2)
+        # UserDog is only checked for the fetched candidates
+        self.assertEqual(len(captured.captured_queries), 1)
+        self.assertIn('"pugorugh_dog"."id" IN (2)',
+                      captured.captured_queries[0]['sql'])
+
+    def test_decisions_missing_from_the_set_are_not_served(self):
+        # as if written by another process with its own cache
+        UserDog.objects.bulk_create(
+            [UserDog(user=self.user, dog_id=2, status="l")])
+        self.assertNotIn(2, seen_dogs(self.user.id))
+        response = self.apiclient.get('/api/dog/-1/undecided/next/')
+        self.assertEqual(response.data['id'], 3)
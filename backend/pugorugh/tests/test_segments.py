@@ -0,0 +1,136 @@
+import datetime as dt
+import itertools
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from pugorugh.models import Dog, UserDog, UserPref, letters_to_mask
+from pugorugh.segments import next_undecided, segment_index
+
+
+class SegmentIndexTestCases(TestCase):
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        for number, (age, gender, size) in enumerate(itertools.product(
+                (5, 12, 40, 100), ('m', 'f', 'u'), ('s', 'xl'))):
+            Dog.objects.create(
+                name="Dog{}".format(number),
+                image_filename="dog{}.jpg".format(number),
+                age=age,
+                gender=gender,
+                size=size,
+            )
+        segment_index.refresh()
+        self.addCleanup(segment_index.clear)
+
+    def set_prefs(self, ages, genders, sizes):
+        prefs = self.user.prefs
+        prefs.age_mask = letters_to_mask(ages, UserPref.AGES)
+        prefs.gender_mask = letters_to_mask(genders, UserPref.GENDERS)
+        prefs.size_mask = letters_to_mask(sizes, UserPref.SIZES)
+        prefs.save()
+
+    def test_follows_preferred_by(self):
+        dog_ids = list(Dog.objects.values_list('pk', flat=True))
+        for ages, genders, sizes in (
+                ('byas', 'mf', ('s', 'm', 'l', 'xl')), ('b', 'f', ('xl',)),
+                ('ya', 'm', ('s', 'm')), ('by', 'mf', ('s', 'm', 'l', 'xl'))):
+            self.set_prefs(ages, genders, sizes)
+            expected = list(Dog.objects.preferred_by(
+                self.user.prefs).order_by('pk').values_list('pk', flat=True))
+            self.assertTrue(expected)
+            for pk in (-1, dog_ids[7], dog_ids[-1]):
+                self.assertEqual(
+                    list(segment_index.following(self.user.prefs, pk)),
+                    [other for other in expected if other > pk] +
+                    [other for other in expected if other <= pk])
+
+    def test_next_undecided(self):
+        self.set_prefs('byas', 'f', ('s', 'm', 'l', 'xl'))
+        females = list(Dog.objects.filter(
+            gender='f').order_by('pk').values_list('pk', flat=True))
+        UserDog.objects.create(user=self.user, dog_id=females[1],
+                               status='l')
+        with self.assertNumQueries(1):
+            dogs = next_undecided(self.user, females[0], count=2)
+        self.assertEqual([dog.pk for dog in dogs], females[2:4])
+        # wraps around to the lowest ids
+        self.assertEqual(
+            [dog.pk for dog in next_undecided(self.user, females[-2], 3)],
+            [females[-1], females[0], females[2]])
+
+    def test_follows_saves_and_deletes(self):
+        self.set_prefs('byas', 'f', ('s', 'm', 'l', 'xl'))
+        dog = Dog.objects.filter(gender='m').first()
+        dog.gender = 'f'
+        dog.save()
+        self.assertIn(dog.pk, segment_index.following(self.user.prefs, -1))
+        dog.delete()
+        self.assertNotIn(dog.pk,
+                         segment_index.following(self.user.prefs, -1))
+
+    def test_never_serves_a_dog_changed_elsewhere(self):
+        self.set_prefs('byas', 'f', ('s', 'm', 'l', 'xl'))
+        females = Dog.objects.filter(gender='f').order_by('pk')
+        first = females[0].pk
+        # updates send no signals, as writes of other processes
+        females.filter(pk=first).update(gender='m')
+        self.assertIn(first, segment_index.following(self.user.prefs, -1))
+        self.assertNotEqual(next_undecided(self.user, -1)[0].pk, first)
+
+    def test_rebuilt_on_a_new_day(self):
+        self.set_prefs('b', 'mf', ('s', 'm', 'l', 'xl'))
+        babies = set(segment_index.following(self.user.prefs, -1))
+        # a day later than the index was built for
+        segment_index._state['today'] -= dt.timedelta(days=1)
+        Dog.objects.filter(pk__in=babies).update(
+            birthday=dt.date.today() - dt.timedelta(days=2000))
+        self.assertFalse(set(segment_index.following(self.user.prefs, -1)))
+
+    def test_expired_index_served_while_rebuilt(self):
+        self.set_prefs('byas', 'mf', ('s', 'm', 'l', 'xl'))
+        stale = segment_index._state
+        stale['expires'] -= segment_index.ttl + 1
+        with mock.patch('pugorugh.segments.threading.Thread') as thread, \
+                self.assertNumQueries(0):
+            segment_index.following(self.user.prefs, -1)
+            segment_index.following(self.user.prefs, -1)
+        # a single rebuild is started, the lookups read the stale index
+        self.assertEqual(thread.call_count, 1)
+        self.assertIs(segment_index._state, stale)
+        # run in this thread, which must keep its connection
+        with mock.patch('pugorugh.segments.connections'):
+            thread.call_args[1]['target'](*thread.call_args[1]['args'])
+        self.assertIsNot(segment_index._state, stale)
+        self.assertFalse(segment_index._building.locked())
+
+    def test_changes_during_a_build_are_kept(self):
+        self.set_prefs('byas', 'mf', ('s', 'm', 'l', 'xl'))
+        dog = Dog.objects.filter(gender='f').first()
+        build = segment_index._build
+
+        def build_then_delete(today):
+            state = build(today)
+            # deleted after the build read the catalog
+            dog.delete()
+            return state
+        with mock.patch.object(segment_index, '_build', build_then_delete):
+            segment_index.refresh()
+        self.assertNotIn(dog.pk,
+                         segment_index.following(self.user.prefs, -1))
+
+    def test_clear_discards_a_build_in_progress(self):
+        build = segment_index._build
+
+        def build_then_clear(today):
+            state = build(today)
+            segment_index.clear()
+            return state
+        with mock.patch.object(segment_index, '_build', build_then_clear):
+            segment_index.refresh()
+        self.assertIsNone(segment_index._state)
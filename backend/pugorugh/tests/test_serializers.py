@@ -1,8 +1,13 @@
 from django.contrib.auth.models import User
+from django.db.models import Count
 from django.test import TestCase
 
-from pugorugh.models import Dog, UserDog
-from pugorugh.serializers import DogSerializer
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from pugorugh.models import Dog, UserDog, UserPref
+from pugorugh.serializers import (DogSerializer, UserPrefSerializer,
+                                  ValuesPlan, dog_rows)
 
 
 class DogSerializerTestCases(TestCase):
@@ -62,5 +67,112 @@ class DogSerializerTestCases(TestCase):
                  'size',
                  'birthday',
                  'likes',
-                 'joined', ]
+                 'joined',
+                 'images', ]
                 ))
+
+    def test_likes_without_queries(self):
+        dogs = list(Dog.objects.order_by('pk'))
+        with self.assertNumQueries(0):
+            data = DogSerializer(dogs, many=True).data
+        self.assertEqual([dog['likes'] for dog in data], [1, 0, 0])
+
+
+class DogRowsTestCases(TestCase):
+    setUp = DogSerializerTestCases.setUp
+
+    def test_parity(self):
+        Dog.objects.filter(name="Dog3").update(
+            breed="Shih Tzu \u00e9\u2028", birthday=None)
+        dogs = list(Dog.objects.order_by('pk'))
+        rows = list(dog_rows.rows(Dog.objects.order_by('pk')))
+        expected = JSONRenderer().render(
+            DogSerializer(dogs, many=True).data)
+        self.assertEqual(JSONRenderer().render(
+            [dog_rows.to_representation(row) for row in rows]), expected)
+        # instances take the same plan
+        self.assertEqual(JSONRenderer().render(
+            [dog_rows.to_representation(dog) for dog in dogs]), expected)
+
+    def test_parity_without_birthday_and_breed(self):
+        # breed is not nullable, a dog created without one has the default
+        dog = Dog.objects.create(name="Dog4", image_filename="dog4.jpg",
+                                 age=30, gender="m", size="xl")
+        Dog.objects.filter(pk=dog.pk).update(birthday=None)
+        dog.refresh_from_db()
+        self.assertIsNone(dog.birthday)
+        row = dog_rows.rows(Dog.objects.filter(pk=dog.pk)).get()
+        self.assertEqual(dog_rows.to_representation(row),
+                         DogSerializer(dog).data)
+        self.assertEqual(dog_rows.to_representation(dog),
+                         DogSerializer(dog).data)
+
+    def test_rows(self):
+        with self.assertNumQueries(1):
+            row = dog_rows.rows(Dog.objects.filter(name="Dog1")).get()
+        dog = Dog.objects.get(name="Dog1")
+        self.assertEqual(row.pk, dog.pk)
+        self.assertEqual(row.etag, dog.etag)
+        self.assertEqual(row.likes_count, 1)
+
+    def test_annotated_counts(self):
+        class DecidedDogSerializer(serializers.ModelSerializer):
+            decisions = serializers.IntegerField(read_only=True)
+
+            class Meta:
+                model = Dog
+                fields = ['id', 'name', 'decisions']
+
+        plan = ValuesPlan(DecidedDogSerializer)
+        dogs = Dog.objects.annotate(decisions=Count('userdog')).order_by(
+            'pk')
+        self.assertEqual(
+            [plan.to_representation(row) for row in plan.rows(dogs)],
+            DecidedDogSerializer(dogs, many=True).data)
+        self.assertEqual(
+            [row.decisions for row in plan.rows(dogs)], [1, 1, 0])
+
+
+class UserPrefSerializerTestCases(TestCase):
+    def setUp(self):
+        # Userpref instance should be automatically created once user is created
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+            password="password123"
+        )
+
+    def test_default_representation(self):
+        data = UserPrefSerializer(UserPref.objects.get(user=self.user)).data
+        self.assertEqual(
+            dict(data),
+            {'age': 'b,y,a,s', 'gender': 'm,f', 'size': 's,m,l,xl'}
+        )
+
+    def test_letters_stored_as_masks(self):
+        prefs = UserPref.objects.get(user=self.user)
+        serializer = UserPrefSerializer(
+            prefs, data={'age': 's,b', 'gender': 'f', 'size': 'xl'})
+        self.assertTrue(serializer.is_valid())
+        serializer.save()
+        prefs = UserPref.objects.get(user=self.user)
+        self.assertEqual(
+            (prefs.age_mask, prefs.gender_mask, prefs.size_mask),
+            (0b1001, 0b10, 0b1000)
+        )
+        self.assertEqual(
+            dict(UserPrefSerializer(prefs).data),
+            {'age': 'b,s', 'gender': 'f', 'size': 'xl'}
+        )
+
+    def test_invalid_letters(self):
+        serializer = UserPrefSerializer(
+            UserPref.objects.get(user=self.user),
+            data={'age': 'b,q', 'gender': '', 'size': 's'}
+        )
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(
+            serializer.errors,
+            {'age': ['"q" is not a valid choice.'],
+             'gender': ['This field may not be blank.']}
+        )
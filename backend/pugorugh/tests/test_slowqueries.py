@@ -0,0 +1,115 @@
+from io import StringIO
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from pugorugh import instrumentation, slowqueries
+from pugorugh.models import Dog
+
+
+class SlowQueryTestCases(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        # every statement counts as slow
+        settings = override_settings(SLOW_QUERY_DIR=directory,
+                                     SLOW_QUERY_THRESHOLD_MS=0)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        slowqueries.clear()
+        self.addCleanup(slowqueries.slow_query_log.clear)
+
+        self.user = User.objects.create(
+            username="sparky",
+            email="sparky@email.com",
+        )
+        Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            breed="pug",
+            age=10,
+            gender="f",
+            size="s",
+        )
+        self.apiclient = APIClient()
+        self.apiclient.credentials(
+            HTTP_AUTHORIZATION='Token ' + Token.objects.create(
+                user=self.user).key)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            slowqueries.fingerprint(
+                "SELECT  *\n FROM t WHERE a = 'it''s' AND b IN (%s, %s, 3) "
+                "AND c > 1.5 LIMIT 21"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) AND c > ? LIMIT ?")
+
+    def test_logs_view_and_plan(self):
+        self.apiclient.get('/api/dog/-1/liked/next/')
+        entries = [entry for entry in slowqueries.load()
+                   if '"pugorugh_userdog"' in entry['fingerprint']]
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entries[0]['views'], {'next-dog': 1})
+        self.assertEqual(entries[0]['count'], 1)
+        self.assertTrue(any('pugorugh_userdog' in line
+                            for line in entries[0]['plan']))
+
+        self.apiclient.get('/api/dog/1/liked/next/')
+        entries = [entry for entry in slowqueries.load()
+                   if '"pugorugh_userdog"' in entry['fingerprint']]
+        self.assertEqual(entries[0]['count'], 2)
+
+    def test_saved_at_the_end_of_requests(self):
+        directory = slowqueries.log_dir()
+        with self.settings(SLOW_QUERY_FLUSH_SECONDS=60):
+            list(Dog.objects.all())
+            self.assertEqual(os.listdir(directory), [])
+            self.apiclient.get('/api/dog/-1/liked/next/')
+        self.assertEqual(os.listdir(directory), [
+            'slow-queries-{}.json'.format(os.getpid())])
+
+    def test_explain_in_savepoint(self):
+        self.assertIsNone(slowqueries.explain(
+            connection, 'SELECT * FROM missing', []))
+        # the transaction is still usable
+        self.assertEqual(Dog.objects.count(), 1)
+
+    def test_explain_not_counted(self):
+        with instrumentation.collecting() as stats:
+            list(Dog.objects.all())
+        self.assertEqual(stats.queries, 1)
+        self.assertEqual(slowqueries.load()[0]['count'], 1)
+
+    def test_bounded(self):
+        with self.settings(SLOW_QUERY_LOG_SIZE=2):
+            for pk in range(3):
+                list(Dog.objects.filter(pk=pk))
+                list(Dog.objects.filter(pk__in=[pk] * (pk + 1)))
+                list(Dog.objects.filter(name='Dog1'))
+        self.assertEqual(len(slowqueries.load()), 2)
+
+    def test_staff_only(self):
+        list(Dog.objects.all())
+        self.assertEqual(
+            self.apiclient.get('/api/slow-queries/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        response = self.apiclient.get('/api/slow-queries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data)
+
+    def test_command(self):
+        list(Dog.objects.all())
+        out = StringIO()
+        call_command('slow_queries', stdout=out)
+        self.assertIn('FROM "pugorugh_dog"', out.getvalue())
+        self.assertIn('  views: -', out.getvalue())
+        call_command('slow_queries', clear=True, stdout=StringIO())
+        self.assertEqual(slowqueries.load(), [])
@@ -0,0 +1,60 @@
+import datetime as dt
+
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from pugorugh import synthetic
+from pugorugh.models import Dog, UserDog, UserPref
+
+
+class SyntheticDataTestCases(TestCase):
+    def test_generate(self):
+        counts = synthetic.generate(dogs=100, users=10, decisions=8)
+        self.assertEqual(Dog.objects.count(), 100)
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(UserPref.objects.count(), 10)
+        self.assertEqual(UserDog.objects.count(), counts['userdogs'])
+        self.assertTrue(UserDog.objects.filter(status='l').exists())
+        user = User.objects.first()
+        self.assertEqual(
+            authenticate(username=user.username,
+                         password=synthetic.PASSWORD), user)
+        self.assertTrue(timezone.is_aware(user.date_joined))
+        self.assertLess(timezone.now() - user.date_joined,
+                        dt.timedelta(minutes=1))
+
+    def test_counters_match_decisions(self):
+        synthetic.generate(dogs=50, users=10, decisions=8)
+        dog = Dog.objects.order_by('pk').first()
+        self.assertEqual(
+            (dog.likes_count, dog.dislikes_count),
+            (UserDog.objects.filter(dog=dog, status='l').count(),
+             UserDog.objects.filter(dog=dog, status='d').count()))
+
+    def test_deterministic(self):
+        def snapshot():
+            return (
+                list(Dog.objects.order_by('pk').values_list(
+                    'breed', 'age', 'gender', 'size')),
+                list(UserPref.objects.order_by('pk').values_list(
+                    'age_mask', 'gender_mask', 'size_mask')),
+                list(UserDog.objects.order_by('pk').values_list(
+                    'dog__breed', 'status')),
+            )
+        synthetic.generate(dogs=40, users=5, decisions=6, seed=3)
+        first = snapshot()
+        for model in (UserDog, UserPref, User, Dog):
+            model.objects.all().delete()
+        synthetic.generate(dogs=40, users=5, decisions=6, seed=3)
+        self.assertEqual(snapshot(), first)
+
+    def test_appends_after_existing_rows(self):
+        synthetic.generate(dogs=10, users=2, decisions=3)
+        synthetic.generate(dogs=10, users=2, decisions=3)
+        self.assertEqual(Dog.objects.count(), 20)
+        self.assertEqual(User.objects.count(), 4)
+        dog = Dog.objects.create(name="Real", image_filename="real.jpg",
+                                 age=5, gender="f", size="s")
+        self.assertEqual(dog.pk, 21)
@@ -1,10 +1,18 @@
+import datetime as dt
+import random
+import threading
+import time
+
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
 
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
 from pugorugh.models import Dog, UserDog, UserPref
+from pugorugh.pagination import encode_position
+from pugorugh.segments import segment_index
 from pugorugh.serializers import DogSerializer, UserPrefSerializer
 
 
@@ -59,6 +67,8 @@ class APIViewTestCases(TestCase):
 
         self.user = User.objects.get(id=1)
         token = Token.objects.get(user=user)
+        # built here so that the requests don't build it
+        segment_index.refresh()
         self.apiclient = APIClient()
         self.apiclient.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
 
@@ -81,7 +91,104 @@ class APIViewTestCases(TestCase):
         expected = []
         for dog in Dog.objects.all():
             expected.append(DogSerializer(dog).data)
-        self.assertJSONEqual(response.content, expected)
+        self.assertJSONEqual(
+            response.content,
+            {"next": None, "previous": None, "results": expected}
+        )
+
+    def test_list_doglistcreateview_pages(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/',
+            {'page_size': 2},
+            format='json'
+        )
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [1, 2])
+        self.assertIsNone(response.data['previous'])
+        response = self.apiclient.get(response.data['next'], format='json')
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [3])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_doglistcreateview_bad_cursor(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/',
+            {'cursor': 'not-a-cursor'},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_doglistcreateview_query_count(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for number in range(20):
+            Dog.objects.create(
+                name="Extra{}".format(number),
+                image_filename="extra{}.jpg".format(number),
+                age=number,
+                gender="m",
+                size="m",
+            )
+        with self.assertNumQueries(1):
+            response = self.apiclient.get('/api/dog/', format='json')
+        self.assertEqual(len(response.data['results']), 23)
+
+    def test_list_doglistcreateview_filters(self):
+        self.apiclient.force_authenticate(user=self.user)
+        today = dt.date.today()
+        for params, ids in (
+            ({'breed': 'husky'}, [2]),
+            ({'gender': 'f'}, [1, 3]),
+            ({'size': 's,m'}, [1, 3]),
+            ({'gender': 'm,f,u', 'size': 's,m,l,xl'}, [1, 2, 3]),
+            ({'min_age': 12, 'max_age': 15}, [3]),
+            ({'max_age': 10}, [1]),
+            ({'min_joined': today.isoformat()}, [1, 2, 3]),
+            ({'max_joined': (today - dt.timedelta(days=1)).isoformat()}, []),
+            ({'gender': 'f', 'size': 'm', 'min_age': 15}, [3]),
+        ):
+            response = self.apiclient.get('/api/dog/', params, format='json')
+            self.assertEqual(
+                [dog['id'] for dog in response.data['results']], ids,
+                params)
+
+    def test_list_doglistcreateview_filtered_pages(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/', {'gender': 'f', 'page_size': 1}, format='json')
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [1])
+        response = self.apiclient.get(response.data['next'], format='json')
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [3])
+        self.assertIsNone(response.data['next'])
+
+    def test_list_doglistcreateview_bad_filters(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for params, field in (
+            ({'size': 's,q'}, 'size'),
+            ({'min_age': -1}, 'min_age'),
+            ({'min_joined': 'yesterday'}, 'min_joined'),
+            ({'fields': 'name,owner'}, 'fields'),
+        ):
+            response = self.apiclient.get('/api/dog/', params, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.data)
+
+    def test_list_doglistcreateview_fields(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/', {'fields': 'likes,id', 'breed': 'pug'},
+            format='json')
+        self.assertEqual(response.content,
+                         b'{"next":null,"previous":null,'
+                         b'"results":[{"id":1,"likes":1}]}')
+        # trimmed and full pages are told apart by their ETags
+        self.assertNotEqual(
+            response['ETag'],
+            self.apiclient.get('/api/dog/', {'breed': 'pug'},
+                               format='json')['ETag'])
 
     def test_create_doglistcreateview(self):
         self.apiclient.force_authenticate(user=self.user)
@@ -233,6 +340,171 @@ class APIViewTestCases(TestCase):
         expected = DogSerializer(Dog.objects.get(id=3))
         self.assertJSONEqual(response.content, expected.data)
 
+    def test_dogretrieveview_next_single_query(self):
+        self.apiclient.force_authenticate(user=self.user)
+        with self.assertNumQueries(1):
+            response = self.apiclient.get(
+                '/api/dog/1/disliked/next/',
+                format='json'
+            )
+        self.assertEqual(response.data['id'], 2)
+
+    def test_dogretrieveview_next_undecided_query_count(self):
+        self.apiclient.force_authenticate(user=self.user)
+        # one query for the user's preferences, one for the dog
+        with self.assertNumQueries(2):
+            response = self.apiclient.get(
+                '/api/dog/3/undecided/next/',
+                format='json'
+            )
+        self.assertEqual(response.data['id'], 3)
+
+    def test_dogretrieveview_next_wraps_around(self):
+        self.apiclient.force_authenticate(user=self.user)
+        UserDog.objects.create(
+            user=self.user,
+            dog=Dog.objects.get(id=3),
+            status="l"
+        )
+        ids = []
+        pk = -1
+        for _ in range(3):
+            response = self.apiclient.get(
+                '/api/dog/{}/liked/next/'.format(pk),
+                format='json'
+            )
+            pk = response.data['id']
+            ids.append(pk)
+        self.assertEqual(ids, [1, 3, 1])
+
+    def test_dogretrieveview_next_none_left(self):
+        self.apiclient.force_authenticate(user=self.user)
+        UserDog.objects.create(
+            user=self.user,
+            dog=Dog.objects.get(id=3),
+            status="d"
+        )
+        # only the preferences are loaded, the segment index and the
+        # seen dogs leave no dog to fetch
+        with self.assertNumQueries(1):
+            response = self.apiclient.get(
+                '/api/dog/-1/undecided/next/',
+                format='json'
+            )
+        self.assertEqual(response.status_code, 404)
+
+    def test_dogretrieveview_next_undecided_preferences(self):
+        self.apiclient.force_authenticate(user=self.user)
+        Dog.objects.create(
+            name="Dog4",
+            image_filename="dog4.jpg",
+            breed="great dane",
+            age=30,
+            gender="m",
+            size="xl",
+        )
+        self.apiclient.put(
+            '/api/user/preferences/',
+            data={"age": "a", "gender": "m", "size": "xl"},
+            format='json'
+        )
+        response = self.apiclient.get(
+            '/api/dog/-1/undecided/next/',
+            format='json'
+        )
+        self.assertEqual(response.data['name'], "Dog4")
+        self.apiclient.put(
+            '/api/user/preferences/',
+            data={"age": "b", "gender": "m", "size": "xl"},
+            format='json'
+        )
+        # drop the preferences cached on the authenticated user
+        self.apiclient.force_authenticate(
+            user=User.objects.get(id=self.user.id))
+        response = self.apiclient.get(
+            '/api/dog/-1/undecided/next/',
+            format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_dogqueueview(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for number in range(4, 8):
+            UserDog.objects.create(
+                user=self.user,
+                dog=Dog.objects.create(
+                    name="Dog{}".format(number),
+                    image_filename="dog{}.jpg".format(number),
+                    age=number,
+                    gender="m",
+                    size="m",
+                ),
+                status="l"
+            )
+        with self.assertNumQueries(1):
+            response = self.apiclient.get(
+                '/api/dog/liked/queue/',
+                {'count': 3},
+                format='json'
+            )
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [1, 4, 5])
+        response = self.apiclient.get(
+            '/api/dog/liked/queue/',
+            {'count': 3, 'cursor': response.data['cursor']},
+            format='json'
+        )
+        # wraps around to the first liked dog like next-dog does
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [6, 7, 1])
+        self.assertEqual(
+            response.data['results'][0],
+            DogSerializer(Dog.objects.get(id=6)).data
+        )
+
+    def test_dogqueueview_fewer_dogs_than_count(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/undecided/queue/',
+            format='json'
+        )
+        self.assertEqual(
+            [dog['id'] for dog in response.data['results']], [3])
+        UserDog.objects.create(
+            user=self.user,
+            dog=Dog.objects.get(id=3),
+            status="d"
+        )
+        response = self.apiclient.get(
+            '/api/dog/undecided/queue/',
+            {'cursor': response.data['cursor']},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'cursor': None, 'results': []})
+
+    def test_dogqueueview_bad_cursor(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get(
+            '/api/dog/liked/queue/',
+            {'cursor': 'bm9wZQ=='},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertJSONEqual(response.content, {"detail": "Invalid cursor"})
+
+    def test_dogqueueview_cursor_out_of_range(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for position in (2 ** 63, -2):
+            response = self.apiclient.get(
+                '/api/dog/liked/queue/',
+                {'cursor': encode_position(position)},
+                format='json'
+            )
+            self.assertEqual(response.status_code, 404)
+            self.assertJSONEqual(response.content,
+                                 {"detail": "Invalid cursor"})
+
     def test_userdogstatusupdateview_liked(self):
         self.apiclient.force_authenticate(user=self.user)
         queryset = UserDog.objects.filter(
@@ -291,6 +563,176 @@ class APIViewTestCases(TestCase):
         self.assertEqual(u_queryset.count(), 0)
         self.assertEqual(all_queryset.count(), 1)
 
+    def test_userdogstatusupdateview_response(self):
+        self.apiclient.force_authenticate(user=self.user)
+        # dog lookup, then update/insert and counters in a savepoint
+        with self.assertNumQueries(5):
+            response = self.apiclient.put(
+                '/api/dog/2/liked/',
+                format='json'
+            )
+        self.assertEqual(
+            response.data, DogSerializer(Dog.objects.get(id=2)).data)
+        self.assertEqual(response.data['likes'], 1)
+        response = self.apiclient.put(
+            '/api/dog/2/undecided/',
+            format='json'
+        )
+        self.assertEqual(response.data['likes'], 0)
+        dog = Dog.objects.get(id=2)
+        self.assertEqual((dog.likes_count, dog.dislikes_count), (0, 0))
+        self.assertFalse(UserDog.objects.filter(dog=dog).exists())
+
+    def test_userdogstatusupdateview_undecided_returns_to_feed(self):
+        self.apiclient.force_authenticate(user=self.user)
+        self.apiclient.put('/api/dog/1/undecided/', format='json')
+        response = self.apiclient.get(
+            '/api/dog/-1/undecided/next/',
+            format='json'
+        )
+        self.assertEqual(response.data['id'], 1)
+
+    def test_userdogstatusupdateview_repeated(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for _ in range(2):
+            response = self.apiclient.put(
+                '/api/dog/1/liked/',
+                format='json'
+            )
+            self.assertEqual(response.data['likes'], 1)
+        self.assertEqual(Dog.objects.get(id=1).likes_count, 1)
+
+    def test_userdogbulkupdateview(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.post(
+            '/api/dog/decisions/',
+            [
+                {"dog": 1, "status": "disliked"},
+                {"dog": 2, "status": "undecided"},
+                {"dog": 3, "status": "liked"},
+                {"dog": 99, "status": "liked"},
+                {"dog": 3, "status": "maybe"},
+            ],
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [decision['dog'] for decision in response.data['succeeded']],
+            [1, 2, 3]
+        )
+        self.assertEqual(
+            response.data['failed'],
+            [{'decision': {"dog": 3, "status": "maybe"},
+              'errors': {'status': ['"maybe" is not a valid choice.']}},
+             {'decision': {"dog": 99, "status": "liked"},
+              'errors': {'dog': ['Not found.']}}]
+        )
+        self.assertEqual(
+            sorted(UserDog.objects.filter(user=self.user).values_list(
+                'dog_id', 'status')),
+            [(1, 'd'), (3, 'l')]
+        )
+        self.assertEqual(
+            list(Dog.objects.order_by('pk').values_list(
+                'likes_count', 'dislikes_count')),
+            [(0, 1), (0, 0), (1, 0)]
+        )
+
+    def test_userdogbulkupdateview_id_out_of_range(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.post(
+            '/api/dog/decisions/',
+            [
+                {"dog": 1, "status": "liked"},
+                {"dog": 100000000000000000000, "status": "liked"},
+            ],
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [decision['dog'] for decision in response.data['succeeded']],
+            [1]
+        )
+        self.assertEqual(len(response.data['failed']), 1)
+        self.assertEqual(
+            list(response.data['failed'][0]['errors']), ['dog'])
+
+    def test_userdogbulkupdateview_query_count(self):
+        self.apiclient.force_authenticate(user=self.user)
+        for number in range(50):
+            Dog.objects.create(
+                name="Extra{}".format(number),
+                image_filename="extra{}.jpg".format(number),
+                age=number,
+                gender="m",
+                size="m",
+            )
+        decisions = [{"dog": dog_id, "status": "liked"}
+                     for dog_id in Dog.objects.values_list('pk', flat=True)]
+        # dog lookup, upsert and counters, plus the savepoint queries of
+        # the transaction inside the test's transaction
+        with self.assertNumQueries(5):
+            response = self.apiclient.post(
+                '/api/dog/decisions/', decisions, format='json')
+        self.assertEqual(len(response.data['succeeded']), 53)
+        self.assertEqual(
+            UserDog.objects.filter(user=self.user, status='l').count(), 53)
+
+    def test_userdogbulkupdateview_not_a_list(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.post(
+            '/api/dog/decisions/',
+            {"dog": 1, "status": "liked"},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_dogretrieveview_not_modified(self):
+        self.apiclient.force_authenticate(user=self.user)
+        response = self.apiclient.get('/api/dog/-1/liked/next/')
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.apiclient.get(
+                '/api/dog/-1/liked/next/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertEqual(response['ETag'], etag)
+        # another user liking the dog changes its representation
+        other = User.objects.create(username="shay")
+        UserDog.objects.create(user=other, dog_id=1, status="l")
+        response = self.apiclient.get(
+            '/api/dog/-1/liked/next/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['likes'], 2)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_doglistcreateview_not_modified(self):
+        self.apiclient.force_authenticate(user=self.user)
+        etag = self.apiclient.get('/api/dog/')['ETag']
+        response = self.apiclient.get('/api/dog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        dog = Dog.objects.get(id=3)
+        dog.breed = "labrador"
+        dog.save()
+        response = self.apiclient.get('/api/dog/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_userprefupdateview_not_modified(self):
+        self.apiclient.force_authenticate(user=self.user)
+        etag = self.apiclient.get('/api/user/preferences/')['ETag']
+        response = self.apiclient.get(
+            '/api/user/preferences/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.apiclient.put(
+            '/api/user/preferences/',
+            data={"age": "b", "gender": "f", "size": "s"},
+            format='json'
+        )
+        response = self.apiclient.get(
+            '/api/user/preferences/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['size'], 's')
+
     def test_userprefupdateview(self):
         self.apiclient.force_authenticate(user=self.user)
         response = self.apiclient.put(
@@ -303,3 +745,77 @@ class APIViewTestCases(TestCase):
             response.content,
             expected.data
         )
+
+
+class ConcurrentSwipeTestCases(TransactionTestCase):
+    """Swipes on the same UserDog row from several threads at once.
+
+    Each thread draws its swipes from its own seeded Random, so a failure
+    replays the same swipes; how the threads interleave is up to the
+    scheduler and the database, which is what the test exercises. SQLite's
+    shared in-memory test database answers "database table is locked"
+    at once instead of waiting for another writer like a database file or
+    PostgreSQL would, so such a swipe is tried again, up to retries
+    times; any other error fails the test.
+    """
+    threads = 8
+    swipes = 25
+    seed = 20240
+    # attempts of a swipe refused by a locked table, 10ms apart
+    retries = 100
+
+    def setUp(self):
+        self.user = User.objects.create(username="sparky")
+        self.dog = Dog.objects.create(
+            name="Dog1",
+            image_filename="dog1.jpg",
+            age=10,
+            gender="f",
+            size="s",
+        )
+
+    def swipe(self, rng, errors):
+        apiclient = APIClient()
+        apiclient.force_authenticate(user=self.user)
+        try:
+            for _ in range(self.swipes):
+                feeling = rng.choice(['liked', 'disliked', 'undecided'])
+                for _ in range(self.retries):
+                    try:
+                        response = apiclient.put(
+                            '/api/dog/{}/{}/'.format(self.dog.pk, feeling),
+                            format='json'
+                        )
+                        break
+                    except OperationalError as error:
+                        if 'locked' not in str(error):
+                            raise
+                        last_error = error
+                        time.sleep(0.01)
+                else:
+                    raise last_error
+                if response.status_code != 200:
+                    errors.append(response.status_code)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connection.close()
+
+    def test_concurrent_swipes(self):
+        errors = []
+        workers = [threading.Thread(
+            target=self.swipe,
+            args=(random.Random(self.seed + number), errors))
+            for number in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual(errors, [])
+        rows = UserDog.objects.filter(user=self.user, dog=self.dog)
+        self.assertLessEqual(rows.count(), 1)
+        dog = Dog.objects.get(pk=self.dog.pk)
+        counters = (dog.likes_count, dog.dislikes_count)
+        Dog.objects.rebuild_counters()
+        dog = Dog.objects.get(pk=self.dog.pk)
+        self.assertEqual(counters, (dog.likes_count, dog.dislikes_count))
@@ -7,7 +7,9 @@ from rest_framework.authtoken.views import obtain_auth_token
 
 from pugorugh.views import (UserRegisterView, DogRetrieveView,
                             UserDogStatusUpdateView, UserPrefUpdateView,
-                            DogListCreateView, DogDeleteView)
+                            DogListCreateView, DogDeleteView, DogQueueView,
+                            UserDogBulkUpdateView, MetricsView,
+                            SlowQueryListView)
 
 
 urlpatterns = format_suffix_patterns([
@@ -16,9 +18,15 @@ urlpatterns = format_suffix_patterns([
     url(r'^api/dog/(?P<pk>-?\d+)/(?P<feeling>(\bliked|\bdisliked|\bundecided))/next/$',
         DogRetrieveView.as_view(),
         name='next-dog'),
+    url(r'^api/dog/(?P<feeling>(\bliked|\bdisliked|\bundecided))/queue/$',
+        DogQueueView.as_view(),
+        name='dog-queue'),
     url(r'^api/dog/(?P<pk>\d+)/(?P<feeling>(\bliked|\bdisliked|\bundecided))/$',
         UserDogStatusUpdateView.as_view(),
         name='userdog-update'),
+    url(r'^api/dog/decisions/$',
+        UserDogBulkUpdateView.as_view(),
+        name='userdog-bulk-update'),
     url(r'^api/dog/$',
         DogListCreateView.as_view(),
         name='list-create-dog'),
@@ -28,6 +36,12 @@ urlpatterns = format_suffix_patterns([
     url(r'^api/user/preferences/$',
         UserPrefUpdateView.as_view(),
         name='userpref-update'),
+    url(r'^api/metrics/$',
+        MetricsView.as_view(),
+        name='metrics'),
+    url(r'^api/slow-queries/$',
+        SlowQueryListView.as_view(),
+        name='slow-queries'),
     url(r'^favicon\.ico$',
         RedirectView.as_view(
             url='/static/icons/favicon.ico',
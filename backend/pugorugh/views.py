@@ -1,15 +1,52 @@
+from collections import Counter, OrderedDict
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.http import HttpResponse
 from django.shortcuts import Http404
+from django.utils.crypto import constant_time_compare
+from django.utils.http import parse_etags, quote_etag
+from django.views.generic import View
 
-from rest_framework import permissions, authentication
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.generics import (CreateAPIView, RetrieveAPIView,
                                      UpdateAPIView, RetrieveUpdateAPIView,
-                                     ListCreateAPIView, DestroyAPIView)
+                                     ListCreateAPIView, DestroyAPIView,
+                                     GenericAPIView)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from . import serializers
+from . import seen, serializers, slowqueries
+from .authentication import CachedTokenAuthentication
+from .filters import DogFilterBackend
+from .fragments import render_dog, render_dogs
+from .metrics import exposition, metrics
 from .models import Dog, UserDog, UserPref
-from .serializers import DogSerializer, UserDogSerializer, UserPrefSerializer
+from .pagination import (DogCursorPagination, decode_position,
+                         encode_position)
+from .segments import next_undecided
+from .serializers import (DogSerializer, UserDogSerializer,
+                          UserPrefSerializer, DecisionSerializer, dog_rows)
+
+
+class ConditionalGetMixin(object):
+    """Answers GET requests whose If-None-Match header holds the ETag of
+    the current representation with 304 Not Modified, before serializing
+    """
+    def conditional_response(self, etag, render):
+        """Returns 304 when the request already has etag, otherwise the
+        response built by render(), both carrying the ETag header
+        """
+        quoted = quote_etag(etag)
+        if_none_match = self.request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and etag in parse_etags(if_none_match):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = render()
+        response['ETag'] = quoted
+        return response
 
 
 class UserRegisterView(CreateAPIView):
@@ -20,12 +57,49 @@ class UserRegisterView(CreateAPIView):
     serializer_class = serializers.UserSerializer
 
 
-class DogListCreateView(ListCreateAPIView):
-    """API endpoint handling the GET and POST requests for dogs
+class DogListCreateView(ConditionalGetMixin, ListCreateAPIView):
+    """API endpoint handling the GET and POST requests for dogs. Listings
+    are filtered by DogFilterBackend, keyset-paginated on id, read as rows
+    of dog_rows, trimmed to the fields named by ?fields=, and carry an
+    ETag derived from the page; creation validates with DogSerializer.
     """
     queryset = Dog.objects.all()
     serializer_class = DogSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = DogCursorPagination
+    filter_backends = [DogFilterBackend]
+
+    def list(self, request, *args, **kwargs):
+        plan = self.get_plan()
+        page = self.paginate_queryset(dog_rows.rows(self.filter_queryset(
+            self.get_queryset())))
+        # the page links and the fields are part of the representation
+        digest = hashlib.md5('|'.join(
+            [dog.etag for dog in page] +
+            [str(self.paginator.get_next_link()),
+             str(self.paginator.get_previous_link()),
+             request.query_params.get('fields', '')]
+        ).encode('utf-8')).hexdigest()
+        return self.conditional_response(
+            'dogs-' + digest,
+            lambda: self.get_paginated_response(
+                render_dogs(page) if plan is None else
+                [plan.to_representation(dog) for dog in page])
+        )
+
+    def get_plan(self):
+        """Return dog_rows trimmed to the comma separated field names of
+        ?fields=, or None for every field, which is served from the
+        cached fragments
+        """
+        requested = self.request.query_params.get('fields')
+        if not requested:
+            return None
+        try:
+            return dog_rows.only([name.strip()
+                                  for name in requested.split(',')])
+        except ValueError as error:
+            raise ValidationError({'fields': [str(error)]})
 
 
 class DogDeleteView(DestroyAPIView):
@@ -36,44 +110,81 @@ class DogDeleteView(DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class DogRetrieveView(RetrieveAPIView):
-    """API endpoint handling GET requests for dogs liked, disliked, or
-    undecided by user.
+class FeelingDogsMixin(object):
+    """Filters dogs by the feeling in the uri (liked, disliked or
+    undecided) of the requesting user
     """
     queryset = Dog.objects.all()
     serializer_class = DogSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        """Takes in kwargs from uri (l, d, or u) and filters/returns Dog
-        queryset
+        """Takes in kwargs from uri (l or d) and filters/returns the Dog
+        queryset of the liked or disliked feed. The undecided feed has
+        no queryset, it is read by next_undecided
         """
-        feeling = self.kwargs.get('feeling')[0]
-        if feeling in ('l', 'd'):
-            feeling_dogs = self.queryset.filter(
-                userdog__status=feeling,
-                userdog__user_id=self.request.user.id,
-            ).order_by('pk')
-        elif feeling == 'u':
-            feeling_dogs = self.queryset.filter(
-                age_letter__in=self.request.user.prefs.age,
-                gender__in=self.request.user.prefs.gender,
-                size__in=self.request.user.prefs.size
-            ).exclude(
-                userdog__user_id=self.request.user.id
-            ).order_by('pk')
-        return feeling_dogs
+        return self.queryset.filter(
+            userdog__status=self.kwargs.get('feeling')[0],
+            userdog__user_id=self.request.user.id,
+        ).order_by('pk')
 
-    def get_object(self):
-        feeling_dogs = self.get_queryset()
-        next_dogs = feeling_dogs.filter(
-            id__gt=self.kwargs.get('pk')
+    def following(self, pk, count=1):
+        """Return up to count dogs of the feed that come after pk as rows
+        of dog_rows, taking the undecided ones from the segment index"""
+        if self.kwargs.get('feeling')[0] == 'u':
+            return next_undecided(self.request.user, pk, count)
+        return list(dog_rows.rows(self.get_queryset().following(pk, count)))
+
+
+class DogRetrieveView(FeelingDogsMixin, ConditionalGetMixin,
+                      RetrieveAPIView):
+    """API endpoint handling GET requests for dogs liked, disliked, or
+    undecided by user.
+    """
+    def retrieve(self, request, *args, **kwargs):
+        dog = self.get_object()
+        return self.conditional_response(
+            dog.etag,
+            lambda: Response(render_dog(dog))
         )
-        if next_dogs.exists():
-            return next_dogs.first()
-        if feeling_dogs.exists():
-            return feeling_dogs.first()
-        raise Http404()
+
+    def get_object(self):
+        """Returns the dog following pk in the feed, wrapping around to
+        the first one, with a single query
+        """
+        dogs = self.following(int(self.kwargs.get('pk')))
+        if not dogs:
+            raise Http404()
+        return dogs[0]
+
+
+class DogQueueView(FeelingDogsMixin, GenericAPIView):
+    """API endpoint handling GET requests for a batch of the next dogs
+    liked, disliked, or undecided by user, so that clients can keep a
+    queue of cards. Follows the same wrap-around order as DogRetrieveView
+    and returns an opaque cursor to request the batch after this one.
+    """
+    def get(self, request, *args, **kwargs):
+        try:
+            position = decode_position(request.query_params.get('cursor'))
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        dogs = self.following(position, self.get_count())
+        return Response(OrderedDict([
+            ('cursor', encode_position(dogs[-1].pk) if dogs else None),
+            ('results', render_dogs(dogs)),
+        ]))
+
+    def get_count(self):
+        """Return the number of dogs requested with ?count=, capped at
+        DOG_MAX_QUEUE_SIZE
+        """
+        try:
+            count = int(self.request.query_params['count'])
+        except (KeyError, ValueError):
+            return getattr(settings, 'DOG_QUEUE_SIZE', 10)
+        limit = getattr(settings, 'DOG_MAX_QUEUE_SIZE', 50)
+        return max(1, min(count, limit))
 
 
 class UserDogStatusUpdateView(UpdateAPIView):
@@ -83,33 +194,119 @@ class UserDogStatusUpdateView(UpdateAPIView):
     queryset = Dog.objects.all()
     serializer_class = DogSerializer
     permission_classes = [permissions.IsAuthenticated]
-    authentication_classes = (authentication.TokenAuthentication,)
-    
-    def put(self, request, *args, **kwargs):
-        feeling = self.kwargs.get('feeling')[0]
-        existing, created = UserDog.objects.get_or_create(
-            user=self.request.user,
-            dog=self.get_object()
-        )
-        instance = existing or created
-        instance.status = feeling
-        instance.save()
-        return self.update(request, *args, **kwargs)
-    
+    authentication_classes = (CachedTokenAuthentication,)
+
     def update(self, request, *args, **kwargs):
-        serializer = DogSerializer(instance=self.get_object())
-        return Response(serializer.data)
+        """Stores the feeling in the uri with one conditional write, an
+        undecided dog having its UserDog row removed, and responds with
+        the dog loaded for the update
+        """
+        dog = self.get_object()
+        feeling = self.kwargs.get('feeling')
+        status = None if feeling == 'undecided' else feeling[0]
+        old_status = UserDog.objects.set_status(
+            request.user.id, dog.pk, status)
+        seen.record(request.user.id, {dog.pk: status})
+        dog.move_counters(old_status, status)
+        metrics.count_swipes(feeling)
+        return Response(render_dog(dog))
+
+
+class UserDogBulkUpdateView(GenericAPIView):
+    """API endpoint for storing many liked, disliked, or undecided
+    decisions of the user at once. Takes a list of {"dog", "status"}
+    objects, applies the valid ones with one set-based write and reports
+    which decisions succeeded and which failed.
+    """
+    serializer_class = DecisionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        if not isinstance(request.data, list):
+            raise ValidationError(
+                {'non_field_errors': ['Expected a list of decisions.']})
+        limit = getattr(settings, 'DOG_MAX_DECISIONS', 500)
+        if len(request.data) > limit:
+            raise ValidationError({'non_field_errors': [
+                'Submit at most {} decisions at once.'.format(limit)]})
 
+        succeeded, failed = [], []
+        valid = []
+        for item in request.data:
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                valid.append(serializer.validated_data)
+            else:
+                failed.append({'decision': item, 'errors': serializer.errors})
+        known = set(Dog.objects.filter(
+            pk__in=[decision['dog'] for decision in valid]
+        ).values_list('pk', flat=True))
 
-class UserPrefUpdateView(RetrieveUpdateAPIView):
+        decisions = {}
+        for decision in valid:
+            if decision['dog'] in known:
+                # later decisions about the same dog win
+                decisions[decision['dog']] = (
+                    None if decision['status'] == 'undecided'
+                    else decision['status'][0])
+                succeeded.append(dict(decision))
+            else:
+                failed.append({'decision': dict(decision),
+                               'errors': {'dog': ['Not found.']}})
+        if decisions:
+            UserDog.objects.apply_decisions(request.user.id, decisions)
+            seen.record(request.user.id, decisions)
+            for feeling, count in Counter(
+                    decision['status'] for decision in succeeded).items():
+                metrics.count_swipes(feeling, count)
+        return Response(
+            OrderedDict([('succeeded', succeeded), ('failed', failed)]))
+
+
+class UserPrefUpdateView(ConditionalGetMixin, RetrieveUpdateAPIView):
     """API endpoint handling the update of User's preference of Dog
     """
     queryset = UserPref.objects.all()
     serializer_class = UserPrefSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    def retrieve(self, request, *args, **kwargs):
+        prefs = self.get_object()
+        return self.conditional_response(
+            prefs.etag,
+            lambda: Response(self.get_serializer(prefs).data)
+        )
+
     def get_object(self):
         userpref = self.get_queryset().filter(
             user=self.request.user
         ).first()
         return userpref
+
+
+class MetricsView(View):
+    """Endpoint exposing the metrics of all worker processes to
+    Prometheus. When METRICS_TOKEN is set, scrapes must send it as a
+    bearer token; otherwise only staff signed in to the admin may read
+    them.
+    """
+    def get(self, request, *args, **kwargs):
+        token = getattr(settings, 'METRICS_TOKEN', None)
+        if token and not constant_time_compare(
+                request.META.get('HTTP_AUTHORIZATION', ''),
+                'Bearer ' + token):
+            return HttpResponse(status=401)
+        if not token and not request.user.is_staff:
+            return HttpResponse(status=403)
+        return HttpResponse(
+            exposition(), content_type='text/plain; version=0.0.4')
+
+
+class SlowQueryListView(APIView):
+    """Staff-only endpoint listing the slow statements logged by all
+    worker processes, the slowest in total first
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response(slowqueries.load())